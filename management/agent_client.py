@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import base64
+import itertools
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from mydotenv import load_env
+load_env()
+
+# Where the Dockerfile puts the agent on the pods
+REMOTE_AGENT_PATH = "/root/.arena_infra/scripts/arena_agent.py"
+LOCAL_AGENT_PATH = Path(__file__).parent.parent / "scripts/arena_agent.py"
+CHUNK_SIZE = 1024 * 1024
+
+
+class AgentError(Exception):
+    pass
+
+
+class AgentConnection:
+    """
+    One long-lived channel to an arena_agent.py process (see scripts/arena_agent.py).
+
+    Requests are written as JSON lines and matched to responses by id, so any
+    number of them can be in flight at once on the same channel.
+    """
+
+    def __init__(self, name, command):
+        self.name = name
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, bufsize=1,
+        )
+        self.pending = {}
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        self.hello = Future()
+        self.reader = threading.Thread(target=self._read_responses, daemon=True)
+        self.reader.start()
+
+    def _read_responses(self):
+        for line in self.process.stdout:
+            message = json.loads(line)
+            if "agent" in message:
+                self.hello.set_result(message)
+                continue
+            with self.lock:
+                future = self.pending.pop(message.get("id"), None)
+            if future is None:
+                continue
+            if message.get("ok"):
+                future.set_result(message["result"])
+            else:
+                future.set_exception(AgentError(message.get("error")))
+
+        # The channel closed: fail everything still waiting on it
+        error = AgentError(f"agent channel closed: {self.process.stderr.read().strip() or 'no error output'}")
+        if not self.hello.done():
+            self.hello.set_exception(error)
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(error)
+
+    def wait_ready(self, timeout=30):
+        return self.hello.result(timeout=timeout)
+
+    def request(self, op, **params):
+        """Send a request and return a Future for its result."""
+        future = Future()
+        with self.lock:
+            request_id = next(self.ids)
+            self.pending[request_id] = future
+            try:
+                self.process.stdin.write(json.dumps({"id": request_id, "op": op, **params}) + "\n")
+                self.process.stdin.flush()
+            except (BrokenPipeError, ValueError) as e:
+                self.pending.pop(request_id, None)
+                future.set_exception(AgentError(f"agent channel closed: {e}"))
+        return future
+
+    def call(self, op, wait=None, **params):
+        """Send a request and wait up to `wait` seconds for its result."""
+        return self.request(op, **params).result(timeout=wait)
+
+    def put_file(self, local_path, remote_path):
+        """Upload a file, with all of its chunks in flight at once."""
+        size = os.path.getsize(local_path)
+        mode = os.stat(local_path).st_mode & 0o7777
+        self.call("put", path=remote_path, data="", truncate=True, mode=mode)
+        futures = []
+        with open(local_path, "rb") as f:
+            for offset in range(0, size, CHUNK_SIZE):
+                data = base64.b64encode(f.read(CHUNK_SIZE)).decode("ascii")
+                futures.append(self.request("put", path=remote_path, data=data, offset=offset))
+        for future in futures:
+            future.result()
+        return size
+
+    def get_file(self, remote_path, local_path):
+        """Download a file, with all of its chunks in flight at once."""
+        size = self.call("stat", path=remote_path)["size"]
+        futures = [(offset, self.request("get", path=remote_path, offset=offset, length=CHUNK_SIZE))
+                   for offset in range(0, size, CHUNK_SIZE)]
+        with open(local_path, "wb") as f:
+            for offset, future in futures:
+                f.seek(offset)
+                f.write(base64.b64decode(future.result()["data"]))
+        return size
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def connect_local(count):
+    """Start `count` agents as local processes, for testing without pods."""
+    return {f"local-{i}": AgentConnection(f"local-{i}", [sys.executable, str(LOCAL_AGENT_PATH), "--stdio"])
+            for i in range(count)}
+
+
+def connect_pods(machine_names=None):
+    """Open one ssh channel to the agent on every reachable pod (optionally only some machines)."""
+    from inventory import get_all_pods
+    from pod_model import parse_pods, filter_pods, sort_pods
+    from pod_utils import ssh_args
+
+    machine_prefix = os.environ["MACHINE_NAME_PREFIX"]
+    pods = sort_pods(filter_pods(parse_pods(get_all_pods()), reachable=True), "name")
+    if machine_names:
+        wanted = {f"{machine_prefix}-{name}" for name in machine_names}
+        pods = [pod for pod in pods if pod.name in wanted]
+    return {pod.name: AgentConnection(pod.name, ssh_args(pod.ssh_ip, pod.ssh_port) + [f"python3 {REMOTE_AGENT_PATH} --stdio"])
+            for pod in pods}
+
+
+def run_on_all(connections, operation):
+    """
+    Run `operation(connection)` for every agent concurrently.
+
+    Returns:
+        dict: name -> (result, error); error is None on success.
+    """
+    def run(item):
+        name, connection = item
+        try:
+            connection.wait_ready(timeout=30)
+            return name, (operation(connection), None)
+        except Exception as e:
+            return name, (None, str(e) or type(e).__name__)
+
+    if not connections:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(connections)) as executor:
+        return dict(executor.map(run, connections.items()))
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024 or unit == "TB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def print_results(command, results):
+    failed = 0
+    for name, (result, error) in sorted(results.items()):
+        if error is not None:
+            failed += 1
+            print(f"[{name}] ERROR: {error}")
+        elif command == "ping":
+            print(f"[{name}] {result * 1000:.1f} ms")
+        elif command == "exec":
+            output = (result["stdout"] + result["stderr"]).rstrip()
+            status = {0: "✓", None: "timed out"}.get(result["returncode"], f"exit {result['returncode']}")
+            # The agent answered, but the command itself failed or timed out on the pod
+            if result["returncode"] != 0:
+                failed += 1
+            print(f"[{name}] {status}")
+            if output:
+                print("\n".join(f"    {line}" for line in output.splitlines()))
+        elif command == "metrics":
+            memory = result["memory"]
+            gpus = ", ".join(f"{g['util_percent']:.0f}% {g['memory_used_mb']:.0f}/{g['memory_total_mb']:.0f}MB"
+                             for g in result["gpus"]) or "no GPU"
+            disk = result["disks"].get("/workspace") or result["disks"].get("/")
+            print(f"[{name}] load {result['load'][0]:.2f}/{result['cpus']}  "
+                  f"mem {format_bytes(memory['used'])}/{format_bytes(memory['total'])}  "
+                  f"disk {format_bytes(disk['used'])}/{format_bytes(disk['total'])}  gpu {gpus}")
+        else:
+            print(f"[{name}] ✓ {format_bytes(result)}")
+    print(f"\n{len(results) - failed}/{len(results)} succeeded")
+    return failed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Send operations to the arena agent on every pod at once, over one ssh channel per pod.")
+    parser.add_argument("--machines", nargs="+", help="Only these machines (e.g. apple autumn)")
+    parser.add_argument("--local", type=int, metavar="N", help="Test against N agents running as local processes")
+    parser.add_argument("--timeout", type=float, help="Seconds to wait for each operation")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ping", help="Measure the round trip over each agent channel")
+    exec_parser = subparsers.add_parser("exec", help="Run a shell command on every pod")
+    exec_parser.add_argument("cmd", help="Command to run (with bash -c)")
+    subparsers.add_parser("metrics", help="Show load, memory, disk and GPU usage")
+    put_parser = subparsers.add_parser("put", help="Upload a file to every pod")
+    put_parser.add_argument("local_path")
+    put_parser.add_argument("remote_path")
+    get_parser = subparsers.add_parser("get", help="Download a file from every pod (saved as <local_dir>/<pod name>)")
+    get_parser.add_argument("remote_path")
+    get_parser.add_argument("local_dir")
+    args = parser.parse_args()
+
+    if args.local:
+        connections = connect_local(args.local)
+    else:
+        connections = connect_pods(args.machines)
+    if not connections:
+        print("No reachable pods found")
+        sys.exit(1)
+
+    def ping(connection):
+        start = time.monotonic()
+        connection.call("ping", wait=args.timeout)
+        return time.monotonic() - start
+
+    operations = {
+        "ping": ping,
+        "exec": lambda c: c.call("exec", cmd=args.cmd, timeout=args.timeout),
+        "metrics": lambda c: c.call("metrics", wait=args.timeout),
+        "put": lambda c: c.put_file(args.local_path, args.remote_path),
+        "get": lambda c: c.get_file(args.remote_path, os.path.join(args.local_dir, c.name)),
+    }
+    if args.command == "get":
+        os.makedirs(args.local_dir, exist_ok=True)
+
+    start = time.monotonic()
+    results = run_on_all(connections, operations[args.command])
+    for connection in connections.values():
+        connection.close()
+    failed = print_results(args.command, results)
+    print(f"Finished in {time.monotonic() - start:.2f}s")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Where the time goes between creating a pod and a participant's first shell.
+
+Every pod records its boot phases in BOOT_LOG (scripts/boot_timeline.sh,
+scripts/motd.sh and .zshrc). This collects them from all pods in parallel,
+adds the create and reachable times create_new_pods.py --wait-ready keeps in
+PROVISION_HISTORY_PATH, and prints a waterfall per pod and the fleet's
+percentiles per step, so the slowest step across the fleet stands out.
+
+Pod and proxy timestamps are compared directly, so the steps across the two
+(the image pull and "port reachable") assume both clocks are NTP-synced.
+"""
+import os
+import sys
+import ast
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from mydotenv import load_env
+load_env()
+
+import provision_history
+from pod_utils import ssh_args, load_pins
+
+BOOT_LOG = "/root/.arena_infra/boot_timeline.log"
+# Phases in boot order. "created" and "ready" come from the provision history, the others from the pod.
+PHASES = ["created", "container_start", "ssh_key_injected", "sshd_listening", "ready",
+          "jupyter_listening", "first_ssh_login", "first_shell"]
+# (step, from phase, to phase)
+STEPS = [
+    ("image pull + container start", "created", "container_start"),
+    ("ssh key injection", "container_start", "ssh_key_injected"),
+    ("sshd start", "ssh_key_injected", "sshd_listening"),
+    ("port reachable", "sshd_listening", "ready"),
+    ("jupyter start", "container_start", "jupyter_listening"),
+    ("waiting for a participant", "ready", "first_ssh_login"),
+    ("login to shell", "first_ssh_login", "first_shell"),
+]
+# Steps that depend on when people log in rather than on the boot
+HUMAN_STEPS = {"waiting for a participant"}
+BAR_WIDTH = 40
+
+
+def fetch_phases(pod, timeout=30):
+    """
+    Read one pod's boot log.
+
+    Returns:
+        (phases, error): {phase: unix time} and None, or None and the error.
+    """
+    try:
+        result = subprocess.run(ssh_args(pod.ssh_ip, pod.ssh_port, connect_timeout=timeout) + [f"cat {BOOT_LOG}"],
+                                capture_output=True, text=True, timeout=timeout * 2)
+    except subprocess.TimeoutExpired:
+        return None, "ssh timed out"
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return None, lines[-1] if lines else f"ssh exited with status {result.returncode}"
+    phases = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) != 2:
+            continue
+        try:
+            # The first time wins, e.g. if two logins race to record first_ssh_login
+            phases.setdefault(parts[0], float(parts[1]))
+        except ValueError:
+            continue
+    return phases, None
+
+
+def merge_history(phases, pod_id, history):
+    """Add "created" and "ready" from the pod's latest provision history entry, if it's for this boot."""
+    entries = [entry for entry in history if entry.get("pod_id") == pod_id]
+    if not entries:
+        return phases
+    entry = entries[-1]
+    container_start = phases.get("container_start")
+    # A restarted pod keeps its id, but the history describes its first boot
+    if container_start is not None and not entry["created_at"] <= container_start <= entry["ready_at"] + 60:
+        return phases
+    return {**phases, "created": entry["created_at"], "ready": entry["ready_at"]}
+
+
+def step_durations(phases):
+    """{step: seconds} for the steps whose two phases were both recorded."""
+    return {step: phases[end] - phases[start] for step, start, end in STEPS
+            if start in phases and end in phases}
+
+
+def format_seconds(seconds):
+    # Most steps on the pod take well under ten seconds
+    return f"{seconds:.1f}s" if abs(seconds) < 10 else provision_history.format_delta(seconds)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def print_waterfall(machine, phases):
+    origin = phases.get("created", phases.get("container_start"))
+    if origin is None:
+        print(f"{machine}: no boot timeline")
+        return
+    ordered = sorted(((phase, phases[phase] - origin) for phase in PHASES if phase in phases),
+                     key=lambda item: item[1])
+    # The login phases can be hours later; scale the bars to the boot itself
+    boot_end = max([offset for phase, offset in ordered if phase not in ("first_ssh_login", "first_shell")]
+                   + [1])
+    print(f"{machine}")
+    previous = 0
+    for phase, offset in ordered:
+        if offset > boot_end:
+            bar = " " * BAR_WIDTH + " »"
+        else:
+            start = int(previous / boot_end * BAR_WIDTH)
+            end = int(offset / boot_end * BAR_WIDTH)
+            bar = " " * start + "█" * max(1 if offset > previous else 0, end - start)
+        print(f"  {phase:<18} {'+' + format_seconds(offset):>9}  {bar}")
+        previous = offset
+
+
+def print_fleet_summary(durations_by_machine):
+    print(f"\n--- Fleet ({len(durations_by_machine)} pods) ---")
+    print(f"{'step':<28} {'pods':>4} {'p50':>8} {'p90':>8} {'max':>8}  slowest")
+    slowest_step = None
+    for step, _, _ in STEPS:
+        values = {machine: durations[step] for machine, durations in durations_by_machine.items()
+                  if step in durations}
+        if not values:
+            continue
+        p90 = percentile(values.values(), 0.9)
+        worst = max(values, key=values.get)
+        print(f"{step:<28} {len(values):>4} {format_seconds(percentile(values.values(), 0.5)):>8} "
+              f"{format_seconds(p90):>8} {format_seconds(values[worst]):>8}  {worst}")
+        if step not in HUMAN_STEPS and (slowest_step is None or p90 > slowest_step[1]):
+            slowest_step = (step, p90)
+    if slowest_step:
+        print(f"\nSlowest boot step at p90: {slowest_step[0]} ({format_seconds(slowest_step[1])})")
+
+
+def collect_timelines(pods_by_machine, parallel=10):
+    """{machine: (phases, error)} for every machine, boot log merged with the provision history."""
+    history = provision_history.load(max_entries=10000)
+
+    def fetch(item):
+        machine, pod = item
+        phases, error = fetch_phases(pod)
+        if error is None:
+            phases = merge_history(phases, pod.id, history)
+        return machine, (phases, error)
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        return dict(executor.map(fetch, pods_by_machine.items()))
+
+
+def get_pods_by_machine(machine_names):
+    """Reachable pods serving the given machines, by machine name."""
+    from distribute import get_target_pods
+    from snapshot import machine_for_pod
+    pins = load_pins()
+    return {machine_for_pod(pod, pins): pod for pod in get_target_pods(machine_names)}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Collect the boot-phase timestamps from all pods and show where the time goes between "
+                    "creating a pod and the first shell: a waterfall per pod and percentiles per step for the fleet.")
+    parser.add_argument("machine_names", nargs="*", help="Machines to profile (default: all of MACHINE_NAME_LIST)")
+    parser.add_argument("--parallel", type=int, default=int(os.getenv("MAX_PARALLEL", "10")),
+                        help="Pods to read at the same time")
+    parser.add_argument("--summary", action="store_true", help="Only print the fleet percentiles")
+    parser.add_argument("--json", action="store_true", help="Print the phases and step durations as JSON")
+    args = parser.parse_args()
+
+    machine_names = args.machine_names or ast.literal_eval(os.environ["MACHINE_NAME_LIST"])
+    timelines = collect_timelines(get_pods_by_machine(machine_names), parallel=args.parallel)
+
+    if args.json:
+        print(json.dumps({machine: {"phases": phases, "steps": step_durations(phases) if phases else None,
+                                    "error": error}
+                          for machine, (phases, error) in sorted(timelines.items())}, indent=2))
+        sys.exit(0)
+
+    durations_by_machine = {}
+    for machine in machine_names:
+        if machine not in timelines:
+            print(f"{machine}: no reachable pod")
+            continue
+        phases, error = timelines[machine]
+        if error is not None:
+            print(f"{machine}: ✗ {error}")
+            continue
+        if not args.summary:
+            print_waterfall(machine, phases)
+        durations_by_machine[machine] = step_durations(phases)
+    if durations_by_machine:
+        print_fleet_summary(durations_by_machine)
+    sys.exit(0 if durations_by_machine else 1)
@@ -6,11 +6,245 @@ import time
 import random
 import string
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # load config.env environment variables
 from mydotenv import load_env
 load_env()
 
+from resilience import retry_call, CircuitOpenError
+from pod_utils import wait_until_reachable, get_ssh_endpoint, load_pins
+import provision_history
+import qualify
+from inventory import get_accounts, get_all_pods, make_graphql_request
+
+# Interruptible (spot) pods aren't supported by runpod.create_pod, so they are rented with GraphQL
+RENT_INTERRUPTIBLE_MUTATION = """
+mutation RentInterruptable($input: PodRentInterruptableInput!) {
+    podRentInterruptable(input: $input) {
+        id
+        name
+        desiredStatus
+        imageName
+        machineId
+        costPerHr
+    }
+}
+"""
+
+MINIMUM_BID_QUERY = """
+query GpuTypes($id: String!, $gpuCount: Int!, $secureCloud: Boolean) {
+    gpuTypes(input: {id: $id}) {
+        lowestPrice(input: {gpuCount: $gpuCount, secureCloud: $secureCloud}) {
+            minimumBidPrice
+        }
+    }
+}
+"""
+
+def find_pod_by_name(pod_name, ignore_pod_ids=()):
+    """Return the existing pod called `pod_name` (skipping `ignore_pod_ids`), or None."""
+    try:
+        pods = runpod.get_pods()
+    except Exception:
+        return None
+    return next((pod for pod in pods if pod["name"] == pod_name and pod["id"] not in ignore_pod_ids), None)
+
+def load_public_key():
+    """Read the shared SSH public key (SHARED_SSH_KEY_PATH + ".pub"), or return "" if unavailable."""
+    ssh_key_path = os.getenv("SHARED_SSH_KEY_PATH")
+    public_key_content = ""
+    if ssh_key_path:
+        try:
+            public_key_file_path = ssh_key_path + ".pub"
+            if ssh_key_path.startswith("~/.ssh/"):
+                public_key_file_path = os.path.expanduser(public_key_file_path)
+            with open(public_key_file_path, 'r') as f:
+                public_key_content = f.read().strip()
+            print(f"Loaded SSH public key from: {public_key_file_path}")
+        except FileNotFoundError:
+            print("--------------------------------")
+            print(f"WARNING: SSH public key file not found at {public_key_file_path}.")
+            print("- It should be in the same directory as the private key. The script may still work if you already added the public key on runpod website.")
+            print("- If you have the private key but not public key, you can regenerate the public key using the following command:")
+            print("  ssh-keygen -y -f ~/.ssh/shared_infra_key_name > ~/.ssh/shared_infra_key_name.pub")
+            print("--------------------------------")
+        except Exception as e:
+            print("--------------------------------")
+            print(f"WARNING: Error reading SSH public key file: {str(e)}")
+            print("--------------------------------")
+    else:
+        print("Warning: SHARED_SSH_KEY_PATH environment variable not set")
+    return public_key_content
+
+def run_graphql(query, variables):
+    """Run a GraphQL request with the current runpod.api_key and return its data."""
+    result = make_graphql_request(query, runpod.api_key, variables)
+    if result.get("errors"):
+        raise RuntimeError("; ".join(error.get("message", str(error)) for error in result["errors"]))
+    return result.get("data") or {}
+
+def get_minimum_bid(gpu_type_id, gpu_count, runpod_cloud_type):
+    """Current minimum interruptible bid per GPU per hour, or None if RunPod doesn't report one."""
+    data = run_graphql(MINIMUM_BID_QUERY, {
+        "id": gpu_type_id,
+        "gpuCount": gpu_count,
+        "secureCloud": runpod_cloud_type == "SECURE",
+    })
+    for gpu_type in data.get("gpuTypes") or []:
+        price = (gpu_type.get("lowestPrice") or {}).get("minimumBidPrice")
+        if price is not None:
+            return float(price)
+    return None
+
+def create_interruptible_pod(pod_name, bid_per_gpu, gpu_type_id, gpu_count, runpod_cloud_type,
+                             disk_space_in_gb, volume_space_in_gb, docker_image, ports,
+                             volume_mount_path, env_vars):
+    """
+    Rent an interruptible pod, which RunPod stops when someone outbids it.
+
+    You pay your bid, so `bid_per_gpu` is both the price and the ceiling:
+    higher bids are preempted less often.
+    """
+    data = run_graphql(RENT_INTERRUPTIBLE_MUTATION, {"input": {
+        "name": pod_name,
+        "imageName": docker_image,
+        "gpuTypeId": gpu_type_id,
+        "gpuCount": gpu_count,
+        "cloudType": runpod_cloud_type,
+        "bidPerGpu": bid_per_gpu,
+        "containerDiskInGb": disk_space_in_gb,
+        "volumeInGb": volume_space_in_gb,
+        "volumeMountPath": volume_mount_path,
+        "ports": ports,
+        "supportPublicIp": True,
+        "startSsh": True,
+        "env": [{"key": key, "value": value} for key, value in env_vars.items()],
+    }})
+    pod = data.get("podRentInterruptable")
+    if not pod:
+        raise RuntimeError("no interruptible pod was returned (there may be no capacity at this bid)")
+    return pod
+
+def resolve_bid(bid_per_gpu, gpu_type_id, gpu_count, runpod_cloud_type):
+    """
+    Check the bid ceiling against the current minimum bid (or use the minimum
+    if no ceiling is set), so an impossible bid fails with a clear message.
+    """
+    minimum_bid = retry_call(get_minimum_bid, gpu_type_id, gpu_count, runpod_cloud_type)
+    if bid_per_gpu is None:
+        if minimum_bid is None:
+            raise RuntimeError(f"RunPod reports no interruptible price for {gpu_type_id}; set RUNPOD_BID_PER_GPU")
+        return minimum_bid
+    if minimum_bid is not None and minimum_bid > bid_per_gpu:
+        raise RuntimeError(f"the current minimum bid for {gpu_type_id} is ${minimum_bid:.3f}/GPU/hr, "
+                           f"above the bid ceiling of ${bid_per_gpu:.3f}")
+    return bid_per_gpu
+
+def machine_name_from_pod_name(pod_name):
+    """Strip MACHINE_NAME_PREFIX from a pod name, e.g. "arena-apple" -> "apple"."""
+    machine_prefix = os.environ.get("MACHINE_NAME_PREFIX", "")
+    if machine_prefix and pod_name.startswith(machine_prefix + "-"):
+        return pod_name[len(machine_prefix + "-"):]
+    return pod_name
+
+def create_pod_for_machine(
+        pod_name: str,
+        gpu_type_id: str = "NVIDIA RTX A4000",
+        gpu_count: int = 1,
+        runpod_cloud_type: str = "COMMUNITY",
+        disk_space_in_gb: int = 100,
+        volume_space_in_gb: int = 0,
+        docker_image: str = "nickypro/arena-env:5.5",
+        ports: str = "8888/http,22/tcp",
+        volume_mount_path: str = "/workspace",
+        public_key_content: str = "",
+        ignore_pod_ids: tuple = (),
+        interruptible: bool = False,
+        bid_per_gpu: float = None,
+    ):
+    """
+    Makes the API call to create a single pod, without checking for existing pods.
+
+    Args:
+        ignore_pod_ids: Ids of pods that already share this name (e.g. the pod
+            being replaced), so they are not mistaken for the new pod on retry.
+        interruptible: Rent an interruptible (spot) pod instead of an on-demand one.
+        bid_per_gpu: Bid ceiling in $/GPU/hr for interruptible pods (default: the
+            current minimum bid).
+
+    Returns:
+        dict: The pod returned by the API (includes its "id").
+    """
+    machine_name = machine_name_from_pod_name(pod_name)
+
+    # Set up environment variables for the pod
+    env_vars = {
+        "MACHINE_NAME": machine_name,
+        "PUBLIC_KEY": public_key_content
+    }
+
+    if env_vars["PUBLIC_KEY"] == "":
+        del env_vars["PUBLIC_KEY"]
+    # Pull-through cache on the proxy for pip/conda/Hugging Face downloads (proxy/pull_cache.py)
+    if os.getenv("ARENA_CACHE_URL"):
+        env_vars["ARENA_CACHE_URL"] = os.environ["ARENA_CACHE_URL"]
+    # Jupyter routed by path on the proxy serves under /<machine>/ (scripts/jupyter_base_url.py)
+    if os.getenv("JUPYTER_PROXY") == "path":
+        env_vars["ARENA_JUPYTER_PROXY"] = "path"
+
+    # Generate a random Jupyter password (though not used in create_pod)
+    jupyter_password = "".join(
+        random.choices(string.ascii_lowercase + string.digits, k=20)
+    )
+
+    if interruptible:
+        bid = resolve_bid(bid_per_gpu, gpu_type_id, gpu_count, runpod_cloud_type)
+        print(f"Making API call to rent interruptible pod (bid ${bid:.3f}/GPU/hr)...")
+        return retry_call(
+            create_interruptible_pod,
+            pod_name, bid, gpu_type_id, gpu_count, runpod_cloud_type,
+            disk_space_in_gb, volume_space_in_gb, docker_image, ports,
+            volume_mount_path, env_vars,
+            before_retry=lambda e: find_pod_by_name(pod_name, ignore_pod_ids),
+        )
+
+    print("Making API call to create pod...")
+    return retry_call(
+        runpod.create_pod,
+        name=pod_name,
+        image_name=docker_image,
+        gpu_count=gpu_count,
+        volume_in_gb=volume_space_in_gb,
+        container_disk_in_gb=disk_space_in_gb,
+        ports=ports,
+        volume_mount_path=volume_mount_path,
+        gpu_type_id=gpu_type_id,
+        cloud_type=runpod_cloud_type,
+        env=env_vars,
+        # A failed response may still have created the pod, so check before retrying
+        before_retry=lambda e: find_pod_by_name(pod_name, ignore_pod_ids),
+    )
+
+def pinned_pods(pod_names):
+    """
+    {pod name: pinned pod id} for the given machine pod names whose machine is
+    pinned (SSH_PROXY_PINS_PATH) to a pod that still exists in any account.
+    """
+    pins = load_pins()
+    if not pins:
+        return {}
+    prefix = f"{os.environ['MACHINE_NAME_PREFIX']}-"
+    live_ids = {pod["id"] for pod in get_all_pods()}
+    served_by = {}
+    for pod_name in pod_names:
+        # Pins are keyed by machine name for the main prefix, by pod name otherwise (see nginx_pods.py)
+        pod_id = pins.get(pod_name[len(prefix):] if pod_name.startswith(prefix) else pod_name)
+        if pod_id in live_ids:
+            served_by[pod_name] = pod_id
+    return served_by
+
 def create_specific_pods(
         pods_to_create: list[str],
         gpu_type_id: str = "NVIDIA RTX A4000",
@@ -21,13 +255,30 @@ def create_specific_pods(
         docker_image: str = "nickypro/arena-env:5.5",
         ports: str = "8888/http,22/tcp",
         volume_mount_path: str = "/workspace",
-        skip_confirm: bool = False
+        skip_confirm: bool = False,
+        wait_ready: bool = False,
+        ready_timeout: int = 900,
+        interruptible: bool = False,
+        bid_per_gpu: float = None,
+        qualify_pods: bool = False,
+        qualify_retries: int = 5,
     ):
     """
     Creates specified RunPod pods if they don't already exist.
 
     Args:
         pods_to_create (list): A list of pod names to attempt to create.
+        wait_ready (bool): Wait until the new pods accept SSH, and record how
+            long that took in the provisioning history (used by vm_scheduler.py
+            to start "ready_by" schedules early enough).
+        interruptible (bool): Rent interruptible (spot) pods, bidding
+            `bid_per_gpu` $/GPU/hr (see create_pod_for_machine).
+        qualify_pods (bool): Once reachable, measure RTT and throughput to
+            each pod (see qualify.py). Pods that miss the thresholds are
+            replaced, with at most `qualify_retries` replacements in total.
+
+    Returns:
+        list: The pods created (as returned by the API).
     """
     # Get API key from environment
     api_key = os.getenv("RUNPOD_API_KEY")
@@ -38,52 +289,36 @@ def create_specific_pods(
     runpod.api_key = api_key
 
     # Read SSH public key once
-    ssh_key_path = os.getenv("SHARED_SSH_KEY_PATH")
-    public_key_content = ""
-    if ssh_key_path:
-        try:
-            public_key_file_path = ssh_key_path + ".pub"
-            if ssh_key_path.startswith("~/.ssh/"):
-                public_key_file_path = os.path.expanduser(public_key_file_path)
-            with open(public_key_file_path, 'r') as f:
-                public_key_content = f.read().strip()
-            print(f"Loaded SSH public key from: {public_key_file_path}")
-        except FileNotFoundError:
-            print("--------------------------------")
-            print(f"WARNING: SSH public key file not found at {public_key_file_path}.")
-            print("- It should be in the same directory as the private key. The script may still work if you already added the public key on runpod website.")
-            print("- If you have the private key but not public key, you can regenerate the public key using the following command:")
-            print("  ssh-keygen -y -f ~/.ssh/shared_infra_key_name > ~/.ssh/shared_infra_key_name.pub")
-            print("--------------------------------")
-        except Exception as e:
-            print("--------------------------------")
-            print(f"WARNING: Error reading SSH public key file: {str(e)}")
-            print("--------------------------------")
-    else:
-        print("Warning: SHARED_SSH_KEY_PATH environment variable not set")
+    public_key_content = load_public_key()
 
     print("Starting pod check process...")
 
     try:
         # --- Check for existing pods ---
         print("Fetching existing pods...")
-        existing_pods = runpod.get_pods()
+        existing_pods = retry_call(runpod.get_pods)
         existing_pod_names = {pod["name"] for pod in existing_pods}
         print(f"Found {len(existing_pod_names)} existing pods.")
+        # A machine swapped onto a standby pod (or replaced by rolling_replace.py) is served by
+        # its pinned pod, which has another name; a new pod would be billed but never routed
+        served_by = pinned_pods(pods_to_create)
         # --- End check ---
 
         # Separate pods into existing and new
-        existing = [p for p in pods_to_create if p in existing_pod_names]
-        to_create = [p for p in pods_to_create if p not in existing_pod_names]
+        existing = [p for p in pods_to_create if p in existing_pod_names or p in served_by]
+        to_create = [p for p in pods_to_create if p not in existing]
 
         if existing:
             print("\nThe following pods already exist:")
             for pod in existing:
-                print(f"  - {pod}")
+                if pod in served_by:
+                    print(f"  - {pod} (served by pinned pod {served_by[pod]})")
+                else:
+                    print(f"  - {pod}")
 
         if not to_create:
             print("\nNo new pods to create.")
-            return
+            return []
 
         print("\nThe following pods will be created:")
         for pod in to_create:
@@ -94,11 +329,25 @@ def create_specific_pods(
             response = input("\nWould you like to proceed with creation? (y/N): ").lower()
             if response != 'y':
                 print("Aborting pod creation.")
-                return
+                return []
 
         print("\nProceeding with pod creation...")
         created_count = 0
         error_count = 0
+        created_pods = []
+        pod_kwargs = dict(
+            gpu_type_id=gpu_type_id,
+            gpu_count=gpu_count,
+            runpod_cloud_type=runpod_cloud_type,
+            disk_space_in_gb=disk_space_in_gb,
+            volume_space_in_gb=volume_space_in_gb,
+            docker_image=docker_image,
+            ports=ports,
+            volume_mount_path=volume_mount_path,
+            public_key_content=public_key_content,
+            interruptible=interruptible,
+            bid_per_gpu=bid_per_gpu,
+        )
 
         for pod_name in to_create:
             try:
@@ -107,49 +356,21 @@ def create_specific_pods(
                 print(f"  GPU Type: {gpu_type_id}")
                 print(f"  GPU Count: {gpu_count}")
 
-                # Extract machine name from pod name (remove prefix)
-                machine_prefix = os.environ.get("MACHINE_NAME_PREFIX", "")
-                if machine_prefix and pod_name.startswith(machine_prefix + "-"):
-                    machine_name = pod_name[len(machine_prefix + "-"):]
-                else:
-                    machine_name = pod_name
-
-                # Set up environment variables for the pod
-                env_vars = {
-                    "MACHINE_NAME": machine_name,
-                    "PUBLIC_KEY": public_key_content
-                }
-
-                if env_vars["PUBLIC_KEY"] == "":
-                    del env_vars["PUBLIC_KEY"]
-
-                # Generate a random Jupyter password (though not used in create_pod)
-                jupyter_password = "".join(
-                    random.choices(string.ascii_lowercase + string.digits, k=20)
-                )
-
-                print("Making API call to create pod...")
-                result = runpod.create_pod(
-                    name=pod_name,
-                    image_name=docker_image,
-                    gpu_count=gpu_count,
-                    volume_in_gb=volume_space_in_gb,
-                    container_disk_in_gb=disk_space_in_gb,
-                    ports=ports,
-                    volume_mount_path=volume_mount_path,
-                    gpu_type_id=gpu_type_id,
-                    cloud_type=runpod_cloud_type,
-                    env=env_vars,
-                )
+                created_at = time.time()
+                result = create_pod_for_machine(pod_name, **pod_kwargs)
+                machine_name = machine_name_from_pod_name(pod_name)
 
                 print(f"✓ Successfully initiated creation for '{pod_name}'")
                 print(f"  Pod Info: {result}")
                 print(f"  Environment variables set: MACHINE_NAME={machine_name}")
                 created_count += 1
+                # The create response has no name (only podRentInterruptable returns it)
+                created_pods.append((pod_name, result, created_at))
 
-                # Wait between creations to potentially avoid rate limiting
-                time.sleep(2)
-
+            except CircuitOpenError as e:
+                print(f"\nRunPod API appears to be down, aborting remaining creations: {str(e)}")
+                error_count += len(to_create) - created_count - error_count
+                break
             except Exception as e:
                 print(f"\nError creating pod '{pod_name}': {str(e)}")
                 error_count += 1
@@ -166,7 +387,74 @@ def create_specific_pods(
     print(f"Pods creation initiated: {created_count}")
     print(f"Errors during creation: {error_count}")
     print("\nPod creation process completed!")
-    print("Note: Pods may take a few minutes to fully start up and become ready.")
+
+    if not (wait_ready or qualify_pods):
+        print("Note: Pods may take a few minutes to fully start up and become ready.")
+        return [result for _, result, _ in created_pods]
+
+    # Replacements for pods that fail qualification come out of one budget for the whole batch
+    budget = {"replacements": qualify_retries}
+    budget_lock = threading.Lock()
+    # Measure a few pods at a time, so they don't compete for this machine's bandwidth
+    measure_slots = threading.Semaphore(4)
+    bad_hosts = qualify.get_bad_hosts() if qualify_pods else {}
+
+    def take_replacement():
+        with budget_lock:
+            if budget["replacements"] <= 0:
+                return False
+            budget["replacements"] -= 1
+            return True
+
+    print(f"\nWaiting for {len(created_pods)} pods to accept SSH...")
+    def wait_one(item):
+        pod_name, result, created_at = item
+        while True:
+            pod = wait_until_reachable(result["id"], timeout=ready_timeout)
+            if pod is None:
+                print(f"✗ {pod_name} not reachable after {ready_timeout}s")
+                return result, False
+            entry = provision_history.record(result["id"], pod_name, gpu_type_id, created_at, time.time())
+            print(f"✓ {pod_name} reachable after {entry['seconds']:.0f}s")
+            if not qualify_pods:
+                return result, True
+
+            ip, port = get_ssh_endpoint(pod)
+            host = pod.get("machineId")
+            with measure_slots:
+                report = qualify.qualify(ip, port, host, pod_name, bad_hosts=bad_hosts)
+            print(f"  {pod_name} (host {host}): {qualify.format_result(report)}")
+            if report["passed"]:
+                return result, True
+            if host:
+                bad_hosts[host] = report
+            if not take_replacement():
+                print(f"✗ {pod_name}: qualification retry budget used up, keeping this pod")
+                return result, False
+
+            # Create the replacement before terminating, so a failed create doesn't lose the machine
+            old_id = result["id"]
+            created_at = time.time()
+            try:
+                result = create_pod_for_machine(pod_name, ignore_pod_ids=(old_id,), **pod_kwargs)
+            except Exception as e:
+                print(f"✗ Could not replace {pod_name}, keeping the slow pod: {str(e)}")
+                return result, False
+            try:
+                retry_call(runpod.terminate_pod, old_id)
+                print(f"  Replaced {pod_name}: terminated {old_id}, created {result['id']}")
+            except Exception as e:
+                # The machine has its new pod either way; the old one only costs money until it is deleted
+                print(f"✗ Replaced {pod_name} with {result['id']}, but could not terminate the slow pod "
+                      f"{old_id} (delete it by hand): {str(e)}")
+
+    with ThreadPoolExecutor(max_workers=max(1, len(created_pods))) as executor:
+        outcomes = list(executor.map(wait_one, created_pods))
+    ready_count = sum(ok for _, ok in outcomes)
+    print(f"Pods {'qualified' if qualify_pods else 'reachable'}: {ready_count}/{len(created_pods)}")
+    if qualify_pods:
+        print(f"Replacements used: {qualify_retries - budget['replacements']}/{qualify_retries}")
+    return [result for result, _ in outcomes]
 
 
 if __name__ == "__main__":
@@ -196,8 +484,20 @@ if __name__ == "__main__":
                       help='Disk space in GB (overrides RUNPOD_DISK_SPACE_IN_GB env var)')
     parser.add_argument('--volume-space-in-gb', type=int,
                       help='Volume space in GB (overrides RUNPOD_VOLUME_SPACE_IN_GB env var)')
+    parser.add_argument('--interruptible', action='store_true',
+                      help='Rent interruptible (spot) pods (overrides RUNPOD_INTERRUPTIBLE env var)')
+    parser.add_argument('--bid-per-gpu', type=float,
+                      help='Bid ceiling in $/GPU/hr for interruptible pods (overrides RUNPOD_BID_PER_GPU env var)')
     parser.add_argument('--yes', '-y', action='store_true',
                       help='Skip confirmation prompts')
+    parser.add_argument('--wait-ready', action='store_true',
+                      help='Wait until the new pods accept SSH and record how long it took')
+    parser.add_argument('--qualify', action='store_true',
+                      help='Measure RTT and throughput to each new pod and replace pods on slow hosts (implies --wait-ready)')
+    parser.add_argument('--qualify-retries', type=int, default=int(os.getenv("QUALIFY_RETRY_BUDGET", "5")),
+                      help='Replacements allowed in total for pods failing qualification (overrides QUALIFY_RETRY_BUDGET env var)')
+    parser.add_argument('--account',
+                      help='Create the pods in this RUNPOD_ACCOUNTS account, using its key and prefix')
 
     # Get environment variables with defaults
     machine_prefix = os.environ["MACHINE_NAME_PREFIX"]
@@ -207,6 +507,14 @@ if __name__ == "__main__":
     # Parse arguments
     args = parser.parse_args()
 
+    if args.account:
+        account = next((a for a in get_accounts() if a["name"] == args.account), None)
+        if account is None:
+            print(f"Error: account '{args.account}' not found in RUNPOD_ACCOUNTS (or its API key is not set)")
+            sys.exit(1)
+        os.environ["RUNPOD_API_KEY"] = account["api_key"]
+        os.environ["MACHINE_NAME_PREFIX"] = machine_prefix = account["prefix"]
+
     # Set configuration, preferring command line arguments over environment variables
     gpu_type_id = args.gpu_type or os.environ["RUNPOD_GPU_TYPE"]
     gpu_count = args.gpu_count or int(os.environ["RUNPOD_NUM_GPUS"])
@@ -214,6 +522,8 @@ if __name__ == "__main__":
     docker_image = args.docker_image or os.environ["RUNPOD_DOCKER_IMAGE"]
     disk_space_in_gb = args.disk_space_in_gb or int(os.environ["RUNPOD_DISK_SPACE_IN_GB"])
     volume_space_in_gb = args.volume_space_in_gb or int(os.environ["RUNPOD_VOLUME_SPACE_IN_GB"])
+    interruptible = args.interruptible or os.getenv("RUNPOD_INTERRUPTIBLE", "false").lower() == "true"
+    bid_per_gpu = args.bid_per_gpu or (float(os.environ["RUNPOD_BID_PER_GPU"]) if os.getenv("RUNPOD_BID_PER_GPU") else None)
 
     # Determine which machines to create
     if args.machine_names:
@@ -242,7 +552,7 @@ if __name__ == "__main__":
 
         try:
             print("Checking existing pods to determine which machines to add...")
-            existing_pods = runpod.get_pods()
+            existing_pods = retry_call(runpod.get_pods)
             existing_pod_names = {pod["name"] for pod in existing_pods}
 
             # Find which machine names are already used
@@ -278,6 +588,8 @@ if __name__ == "__main__":
     print(f"  GPU Type: {gpu_type_id}")
     print(f"  GPU Count: {gpu_count}")
     print(f"  Cloud Type: {runpod_cloud_type}")
+    if interruptible:
+        print(f"  Interruptible: yes (bid ceiling: {bid_per_gpu if bid_per_gpu is not None else 'minimum bid'})")
 
     pods_to_create = [f"{machine_prefix}-{name}" for name in machine_name_list]
     create_specific_pods(
@@ -288,5 +600,10 @@ if __name__ == "__main__":
         disk_space_in_gb,
         volume_space_in_gb,
         docker_image,
-        skip_confirm=args.yes
+        skip_confirm=args.yes,
+        wait_ready=args.wait_ready,
+        interruptible=interruptible,
+        bid_per_gpu=bid_per_gpu,
+        qualify_pods=args.qualify,
+        qualify_retries=args.qualify_retries,
     )
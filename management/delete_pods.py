@@ -1,29 +1,28 @@
 #!/usr/bin/env python3
 import runpod
-import os
 import sys
-import time
 
 from mydotenv import load_env
 load_env()
 
+from resilience import retry_call, CircuitOpenError
+from inventory import get_accounts, get_all_pods, use_account_of
+
 def delete_stopped_pods(include_list, exclude_list, skip_confirm=False):
     """
     Finds all stopped RunPod pods (excluding those in exclude_list)
     and prompts the user for confirmation before deleting them.
     """
-    # Get API key from environment
-    api_key = os.getenv("RUNPOD_API_KEY")
-    if not api_key:
+    # Get API keys from environment (RUNPOD_ACCOUNTS, or just RUNPOD_API_KEY)
+    accounts = get_accounts()
+    if not accounts:
         print("Error: RUNPOD_API_KEY environment variable not set")
         sys.exit(1)
 
-    runpod.api_key = api_key
-
     try:
         # Get all pods
         print("Fetching all pods...")
-        pods = runpod.get_pods()
+        pods = get_all_pods(accounts)
 
         if not pods:
             print("No pods found.")
@@ -74,11 +73,16 @@ def delete_stopped_pods(include_list, exclude_list, skip_confirm=False):
         for pod in pods_to_delete:
             try:
                 print(f"Deleting {pod['name']} (ID: {pod['id']})...", end=" ")
+                # Route the call to the account that owns the pod
+                use_account_of(pod, accounts)
                 # Use terminate_pod to delete
-                runpod.terminate_pod(pod["id"])
+                retry_call(runpod.terminate_pod, pod["id"])
                 print("✓")
                 deleted_count += 1
-                time.sleep(1)  # Small delay between deletions
+            except CircuitOpenError as e:
+                print(f"\nRunPod API appears to be down, aborting remaining deletions: {str(e)}")
+                error_count += len(pods_to_delete) - deleted_count - error_count
+                break
             except Exception as e:
                 print(f"\nError deleting pod {pod['name']} (ID: {pod['id']}): {str(e)}")
                 error_count += 1
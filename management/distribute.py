@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import hashlib
+import tarfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from mydotenv import load_env
+load_env()
+
+from inventory import get_all_pods
+from pod_model import parse_pods, filter_pods
+from pod_utils import ssh_args, load_pins
+
+# Chunks are staged under this directory (relative to the home directory) on the pods and locally
+STAGE_ROOT = ".arena_dist"
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class ChunkWriter:
+    """File-like object that splits what is written into numbered, hashed chunk files."""
+
+    def __init__(self, directory, chunk_size):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.size = 0
+        self.total_hash = hashlib.sha256()
+        self._file = None
+        self._hash = None
+        self._written = 0
+
+    def _roll(self):
+        self._close_chunk()
+        self._file = open(os.path.join(self.directory, f"chunk-{len(self.chunks):05d}"), "wb")
+        self._hash = hashlib.sha256()
+        self._written = 0
+
+    def _close_chunk(self):
+        if self._file is not None:
+            self._file.close()
+            self.chunks.append(self._hash.hexdigest())
+            self._file = None
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self._file is None or self._written == self.chunk_size:
+                self._roll()
+            part = view[:self.chunk_size - self._written]
+            self._file.write(part)
+            self._hash.update(part)
+            self.total_hash.update(part)
+            self._written += len(part)
+            self.size += len(part)
+            view = view[len(part):]
+        return len(data)
+
+    def close(self):
+        self._close_chunk()
+
+
+def pack(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Split a file (as is) or a directory (as a tar) into chunks under the local stage.
+
+    The stage directory is named after the content hash, so packing the same
+    content again reuses the same staging directories locally and on the pods.
+
+    Returns:
+        tuple: (local stage directory, manifest dict)
+    """
+    stage_root = os.path.expanduser(f"~/{STAGE_ROOT}")
+    tmp_dir = os.path.join(stage_root, f"tmp-{os.getpid()}")
+    os.makedirs(tmp_dir, exist_ok=True)
+    writer = ChunkWriter(tmp_dir, chunk_size)
+
+    if os.path.isdir(source):
+        kind = "tar"
+        # Sorted entries make the tar (and so its hash) the same on every run
+        with tarfile.open(fileobj=writer, mode="w|") as tar:
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    tar.add(path, arcname=os.path.relpath(path, source))
+    else:
+        kind = "file"
+        with open(source, "rb") as f:
+            while True:
+                data = f.read(1024 * 1024)
+                if not data:
+                    break
+                writer.write(data)
+    writer.close()
+
+    manifest = {
+        "name": os.path.basename(os.path.normpath(source)),
+        "kind": kind,
+        "size": writer.size,
+        "chunk_size": chunk_size,
+        "sha256": writer.total_hash.hexdigest(),
+        "chunks": writer.chunks,
+    }
+    manifest["id"] = manifest["sha256"][:16]
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    stage = os.path.join(stage_root, manifest["id"])
+    shutil.rmtree(stage, ignore_errors=True)
+    os.replace(tmp_dir, stage)
+    return stage, manifest
+
+
+def get_remote_key_path():
+    """
+    Path of the shared key on the pods (copied there by setup_em.sh), used for
+    pod-to-pod relays. A leading ~ is resolved for SSH_USER, since the path is
+    quoted in the relay command.
+    """
+    key_path = os.getenv("GIT_SSH_KEY_REMOTE") or os.getenv("SHARED_SSH_KEY_PATH", "~/.ssh/id_ed25519")
+    if key_path.startswith("~/"):
+        user = os.getenv("SSH_USER", "root")
+        home = "/root" if user == "root" else f"/home/{user}"
+        key_path = home + key_path[1:]
+    return key_path
+
+
+def remote_stage(manifest):
+    return f"{STAGE_ROOT}/{manifest['id']}"
+
+
+def missing_chunks(pod, manifest):
+    """Names of the chunks a pod does not have yet, or has with the wrong hash."""
+    stage = remote_stage(manifest)
+    result = subprocess.run(
+        ssh_args(pod.ssh_ip, pod.ssh_port) + [f"cd {stage} 2>/dev/null && sha256sum chunk-* 2>/dev/null; true"],
+        capture_output=True, text=True, timeout=600,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"could not check chunks: {result.stderr.strip()}")
+    present = {}
+    for line in result.stdout.splitlines():
+        digest, _, name = line.partition("  ")
+        present[name.strip()] = digest
+    return [f"chunk-{i:05d}" for i, digest in enumerate(manifest["chunks"])
+            if present.get(f"chunk-{i:05d}") != digest]
+
+
+def receive_command(manifest):
+    stage = remote_stage(manifest)
+    return f"mkdir -p {stage} && tar -xf - -C {stage}"
+
+
+def send_from_local(local_stage, target, manifest, chunks):
+    """Stream chunks from the admin host to a pod over one ssh connection."""
+    tar = subprocess.Popen(["tar", "-cf", "-", "-C", local_stage, "manifest.json"] + chunks,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    receive = subprocess.run(ssh_args(target.ssh_ip, target.ssh_port) + [receive_command(manifest)],
+                             stdin=tar.stdout, capture_output=True, text=True)
+    tar.stdout.close()
+    tar.wait()
+    if tar.returncode != 0 or receive.returncode != 0:
+        raise RuntimeError(f"upload failed: {receive.stderr.strip() or tar.stderr.read().decode().strip()}")
+
+
+def send_from_pod(source, target, manifest, chunks):
+    """Have the source pod stream chunks straight to the target pod; the admin host only orchestrates."""
+    stage = remote_stage(manifest)
+    inner_ssh = shlex.join(ssh_args(target.ssh_ip, target.ssh_port, key_path=get_remote_key_path())
+                           + [receive_command(manifest)])
+    relay = f"cd {stage} && tar -cf - manifest.json {' '.join(chunks)} | {inner_ssh}"
+    result = subprocess.run(ssh_args(source.ssh_ip, source.ssh_port) + [relay], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"relay from {source.name} failed: {result.stderr.strip()}")
+
+
+def assemble(pod, manifest, dest):
+    """Join the verified chunks into the destination file, or extract them into the destination directory."""
+    stage = remote_stage(manifest)
+    if manifest["kind"] == "tar":
+        command = f"mkdir -p {shlex.quote(dest)} && cat {stage}/chunk-* | tar -xf - -C {shlex.quote(dest)}"
+    else:
+        if dest.endswith("/"):
+            dest = dest + manifest["name"]
+        tmp = shlex.quote(dest + ".part")
+        command = (f"mkdir -p {shlex.quote(os.path.dirname(dest) or '.')} && "
+                   f"cat {stage}/chunk-* > {tmp} && mv {tmp} {shlex.quote(dest)}")
+    result = subprocess.run(ssh_args(pod.ssh_ip, pod.ssh_port) + [command], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"assembling failed: {result.stderr.strip()}")
+
+
+def transfer(source, target, local_stage, manifest, dest):
+    """
+    Bring `target` up to date from `source` (None for the admin host): send
+    only the chunks it is missing, verify them and assemble the content.
+    """
+    start = time.monotonic()
+    chunks = missing_chunks(target, manifest)
+    if chunks:
+        if source is None:
+            send_from_local(local_stage, target, manifest, chunks)
+        else:
+            send_from_pod(source, target, manifest, chunks)
+        still_missing = missing_chunks(target, manifest)
+        if still_missing:
+            raise RuntimeError(f"{len(still_missing)} chunks failed verification")
+    assemble(target, manifest, dest)
+    return len(chunks), time.monotonic() - start
+
+
+def get_target_pods(machine_names):
+    """Reachable pods serving the given machines (pinned pods first, like nginx_pods.py)."""
+    machine_prefix = os.environ["MACHINE_NAME_PREFIX"]
+    pods = filter_pods(parse_pods(get_all_pods()), reachable=True)
+    pods_by_id = {pod.id: pod for pod in pods}
+    pods_by_name = {pod.name: pod for pod in pods}
+    pins = load_pins()
+    targets = []
+    for machine_name in machine_names:
+        pod = pods_by_id.get(pins.get(machine_name)) or pods_by_name.get(f"{machine_prefix}-{machine_name}")
+        if pod is None:
+            print(f"- {machine_name}: no reachable pod, skipping")
+            continue
+        targets.append(pod)
+    return targets
+
+
+def distribute(local_stage, manifest, targets, dest, seeds=3, fanout=2, max_attempts=3):
+    """
+    Spread the content over a growing tree: the admin host uploads to `seeds`
+    pods, and every pod that has the complete content then serves up to
+    `fanout` others, so the number of sources roughly doubles each round.
+
+    Returns:
+        dict: pod name -> error message for pods that could not be served.
+    """
+    pending = list(targets)
+    # None is the admin host; each entry is one free upload slot
+    free_slots = [None] * max(1, seeds)
+    attempts = {pod.id: 0 for pod in targets}
+    failed = {}
+    running = {}
+    done = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, seeds) + fanout * len(targets)) as executor:
+        while pending or running:
+            while pending and free_slots:
+                source = free_slots.pop(0)
+                target = pending.pop(0)
+                attempts[target.id] += 1
+                future = executor.submit(transfer, source, target, local_stage, manifest, dest)
+                running[future] = (source, target)
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source, target = running.pop(future)
+                source_name = "admin" if source is None else source.name
+                try:
+                    sent, seconds = future.result()
+                except Exception as e:
+                    print(f"[{target.name}] ✗ from {source_name}: {str(e)}")
+                    if attempts[target.id] < max_attempts:
+                        pending.append(target)
+                    else:
+                        failed[target.name] = str(e)
+                    # A pod whose relay failed may be the problem, so only the admin host keeps its slot
+                    if source is None:
+                        free_slots.append(source)
+                    continue
+                done += 1
+                print(f"[{target.name}] ✓ from {source_name}: {sent}/{len(manifest['chunks'])} chunks "
+                      f"in {seconds:.0f}s ({done}/{len(targets)} done)")
+                free_slots.append(source)
+                free_slots.extend([target] * fanout)
+    return failed
+
+
+def cleanup(pods, manifest):
+    """Remove the staged chunks from the pods."""
+    def remove(pod):
+        subprocess.run(ssh_args(pod.ssh_ip, pod.ssh_port) + [f"rm -rf {remote_stage(manifest)}"],
+                       capture_output=True, timeout=60)
+    with ThreadPoolExecutor(max_workers=max(1, len(pods))) as executor:
+        list(executor.map(remove, pods))
+
+
+if __name__ == "__main__":
+    import argparse
+    import ast
+    parser = argparse.ArgumentParser(
+        description="Copy a file or directory to every pod, relaying it pod-to-pod in a tree. "
+                    "Pods need the shared key (copied by setup_em.sh) to relay to each other.")
+    parser.add_argument("source", help="Local file or directory to distribute")
+    parser.add_argument("dest", help="Destination on the pods (a directory for directories; "
+                                     "a file path, or a directory ending in / for files)")
+    parser.add_argument("--machines", nargs="+", help="Only these machines (default: MACHINE_NAME_LIST)")
+    parser.add_argument("--seeds", type=int, default=3, help="Pods the admin host uploads to directly")
+    parser.add_argument("--fanout", type=int, default=2, help="Pods each pod relays to at the same time")
+    parser.add_argument("--chunk-size-mb", type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                        help="Chunk size; interrupted runs resume from the last complete chunk")
+    parser.add_argument("--keep-chunks", action="store_true", help="Leave the staged chunks on the pods")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"Error: {args.source} does not exist")
+        sys.exit(1)
+
+    machine_names = args.machines or ast.literal_eval(os.environ["MACHINE_NAME_LIST"])
+    targets = get_target_pods(machine_names)
+    if not targets:
+        print("No reachable pods found")
+        sys.exit(1)
+
+    print(f"Packing {args.source}...")
+    local_stage, manifest = pack(args.source, args.chunk_size_mb * 1024 * 1024)
+    print(f"{manifest['size'] / 1e6:.1f} MB in {len(manifest['chunks'])} chunks (sha256 {manifest['sha256'][:16]}), "
+          f"sending to {len(targets)} pods via {args.seeds} seeds with fanout {args.fanout}")
+
+    start = time.monotonic()
+    failed = distribute(local_stage, manifest, targets, args.dest, seeds=args.seeds, fanout=args.fanout)
+    elapsed = time.monotonic() - start
+
+    succeeded = [pod for pod in targets if pod.name not in failed]
+    # After a failure the chunks stay everywhere, so a re-run only sends what is still missing
+    if not args.keep_chunks and not failed:
+        cleanup(succeeded, manifest)
+        shutil.rmtree(local_stage, ignore_errors=True)
+
+    print("\n--- Distribution Summary ---")
+    print(f"Delivered: {len(succeeded)}/{len(targets)} pods in {elapsed:.0f}s")
+    for name, error in failed.items():
+        print(f"  - {name}: {error}")
+    if failed:
+        print("Re-run the same command to resume; chunks already delivered are not sent again "
+              "(the staged chunks are kept until a run succeeds on every pod).")
+        sys.exit(1)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Collect the participants' ARENA work into a bare git mirror on the proxy and
+push it to GitHub in one go, instead of every pod pushing its own branch
+(sync_git.sh).
+
+For each machine, the participant's uncommitted work is committed on the pod
+without touching their branch, index or working tree (through a temporary
+index), and the proxy fetches that commit over ssh into GIT_MIRROR_PATH as
+<prefix>-<label>-autocommit-<machine>. Pods whose work is the same tree as
+the mirror already has are skipped after a single ssh call. The new branches
+are then pushed to GitHub with a single push, retried with backoff, and
+branches whose push failed are pushed again on the next run.
+"""
+import os
+import sys
+import ast
+import time
+import shlex
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from mydotenv import load_env
+load_env()
+
+from pod_utils import ssh_args, load_pins
+
+REMOTE_GIT_DIR = "ARENA_3.0"  # under $HOME on the pods
+POD_REF = "refs/arena-mirror/autocommit"
+# Skip gc and FETCH_HEAD, as many fetches run into the mirror at the same time
+MIRROR_GIT_OPTIONS = ["-c", "gc.auto=0", "-c", "maintenance.auto=false"]
+
+# Runs on the pod with the tree the mirror has for it ("" if none) and the commit message.
+# Starting from a copy of the real index keeps the stat cache, so unchanged files aren't re-read.
+POD_COMMIT_SCRIPT = f"""
+set -e
+cd "$HOME/{REMOTE_GIT_DIR}"
+index=$(mktemp)
+trap 'rm -f "$index"' EXIT
+cp "$(git rev-parse --git-path index)" "$index" 2>/dev/null || true
+export GIT_INDEX_FILE="$index"
+git add -A
+tree=$(git write-tree)
+if [ "$tree" = "$1" ]; then
+    echo "unchanged $tree"
+    exit 0
+fi
+# Nothing of the participant's: no edits, and no commits that aren't on the remote already
+if [ "$tree" = "$(git rev-parse 'HEAD^{{tree}}')" ] && [ "$(git rev-list --count HEAD --not --remotes)" = 0 ]; then
+    echo "unchanged $tree"
+    exit 0
+fi
+commit=$(git -c user.name='Arena Autocommit' -c user.email='autocommit@arena.education' \\
+    commit-tree "$tree" -p HEAD -m "$2")
+git update-ref {POD_REF} "$commit"
+echo "commit $commit"
+"""
+
+
+def get_mirror_path():
+    return os.path.expanduser(os.getenv("GIT_MIRROR_PATH", "~/arena_git_mirror.git"))
+
+
+def get_remote_url():
+    return os.getenv("GIT_MIRROR_REMOTE") or \
+        f"git@github.com:{os.environ['ARENA_REPO_OWNER']}/{os.environ['ARENA_REPO_NAME']}.git"
+
+
+def branch_name(machine, label):
+    return f"{os.environ['MACHINE_NAME_PREFIX']}-{label}-autocommit-{machine}"
+
+
+def git_ssh_command():
+    """
+    ssh command for git, i.e. ssh_args without the host and port. It uses the
+    shared key, which reaches the pods and is the deploy key of the fork.
+    """
+    args = ssh_args("", 0)[:-1]
+    port_index = args.index("-p")
+    return shlex.join(args[:port_index] + args[port_index + 2:])
+
+
+def mirror_git(mirror, *args, timeout=None):
+    return subprocess.run(["git", *MIRROR_GIT_OPTIONS, "-C", mirror, *args], capture_output=True, text=True,
+                          env=dict(os.environ, GIT_SSH_COMMAND=git_ssh_command()), timeout=timeout)
+
+
+def init_mirror(mirror, remote_url, default_branch):
+    """Create the bare mirror if needed, and fetch the default branch so pods only send their own commits."""
+    if not os.path.isdir(mirror):
+        subprocess.run(["git", "init", "--bare", "--quiet", mirror], check=True)
+        mirror_git(mirror, "remote", "add", "origin", remote_url)
+    else:
+        mirror_git(mirror, "remote", "set-url", "origin", remote_url)
+    result = mirror_git(mirror, "fetch", "--quiet", "--no-tags", "origin",
+                        f"+refs/heads/{default_branch}:refs/remotes/origin/{default_branch}", timeout=600)
+    if result.returncode != 0:
+        # Not fatal: the pods then send the whole history once
+        print(f"Warning: could not fetch {default_branch} from {remote_url}: {result.stderr.strip()}")
+
+
+def error_line(result):
+    """The most telling line of a failed command's stderr (git's own "fatal:"/"error:" line if there is one)."""
+    lines = result.stderr.strip().splitlines()
+    for line in lines:
+        if line.startswith(("fatal:", "error:")):
+            return line
+    return lines[-1] if lines else f"exited with status {result.returncode}"
+
+
+def rev_parse(mirror, rev):
+    result = mirror_git(mirror, "rev-parse", "--verify", "--quiet", rev)
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def collect(pod, machine, branch, mirror, message):
+    """
+    Commit one pod's work and fetch it into the mirror as `branch`.
+
+    Returns:
+        (status, detail): ("updated", commit), ("unchanged", tree) or ("failed", error)
+    """
+    known_tree = rev_parse(mirror, f"refs/heads/{branch}^{{tree}}")
+    command = f"bash -s -- {shlex.quote(known_tree)} {shlex.quote(message)}"
+    try:
+        result = subprocess.run(ssh_args(pod.ssh_ip, pod.ssh_port, connect_timeout=30) + [command],
+                                input=POD_COMMIT_SCRIPT, capture_output=True, text=True, timeout=300)
+    except subprocess.TimeoutExpired:
+        return "failed", "committing on the pod timed out"
+    if result.returncode != 0:
+        return "failed", error_line(result)
+    status, _, value = result.stdout.strip().splitlines()[-1].partition(" ")
+    if status == "unchanged":
+        return "unchanged", value
+
+    user = os.getenv("SSH_USER", "root")
+    url = f"ssh://{user}@{pod.ssh_ip}:{pod.ssh_port}/~/{REMOTE_GIT_DIR}"
+    try:
+        fetch = mirror_git(mirror, "fetch", "--quiet", "--no-tags", "--no-write-fetch-head", url,
+                           f"+{POD_REF}:refs/heads/{branch}", timeout=600)
+    except subprocess.TimeoutExpired:
+        return "failed", "fetching into the mirror timed out"
+    if fetch.returncode != 0:
+        return "failed", f"fetch failed: {error_line(fetch)}"
+    return "updated", value
+
+
+def pending_branches(mirror, pattern):
+    """Mirror branches matching `pattern` that GitHub doesn't have yet (new, or an earlier push failed)."""
+    result = mirror_git(mirror, "for-each-ref", "--format=%(refname:short) %(objectname)", f"refs/heads/{pattern}")
+    pending = []
+    for line in result.stdout.splitlines():
+        branch, commit = line.split()
+        if rev_parse(mirror, f"refs/remotes/origin/{branch}") != commit:
+            pending.append(branch)
+    return pending
+
+
+def push_branches(mirror, branches, retries=4, backoff=5):
+    """
+    Push the branches to origin in one push, retrying the ones that failed.
+
+    Returns:
+        dict: branch -> None if pushed, else the error message.
+    """
+    results = {branch: "not pushed" for branch in branches}
+    remaining = list(branches)
+    for attempt in range(retries + 1):
+        if not remaining:
+            break
+        if attempt:
+            delay = backoff * 2 ** (attempt - 1)
+            print(f"Retrying the push of {len(remaining)} branches in {delay}s...")
+            time.sleep(delay)
+        # Branches belong to this script, so a new snapshot simply replaces the old one
+        refspecs = [f"+refs/heads/{branch}:refs/heads/{branch}" for branch in remaining]
+        try:
+            result = mirror_git(mirror, "push", "--porcelain", "origin", *refspecs, timeout=900)
+        except subprocess.TimeoutExpired:
+            for branch in remaining:
+                results[branch] = "push timed out"
+            continue
+        reported = set()
+        for line in result.stdout.splitlines():
+            parts = line.split("\t")
+            if len(parts) < 3 or ":" not in parts[1]:
+                continue
+            branch = parts[1].split(":")[1][len("refs/heads/"):]
+            if branch not in results:
+                continue
+            reported.add(branch)
+            if parts[0] == "!":
+                results[branch] = f"rejected: {parts[2]}"
+            else:
+                results[branch] = None
+                # Remember what GitHub has, so the branch isn't pushed again until it changes
+                mirror_git(mirror, "update-ref", f"refs/remotes/origin/{branch}", f"refs/heads/{branch}")
+        if result.returncode != 0 and not reported:
+            # Nothing got through (network, authentication or rate limit)
+            for branch in remaining:
+                results[branch] = error_line(result)
+        remaining = [branch for branch in remaining if results[branch] is not None]
+    return results
+
+
+def sync(pods_by_machine, label, parallel=10, push=True, retries=4):
+    """
+    Collect every machine's work into the mirror and push the new branches.
+
+    Returns:
+        dict: machine -> (status, detail), status being "pushed", "unchanged",
+        "collected" (push=False), "push failed" or "failed".
+    """
+    mirror = get_mirror_path()
+    remote_url = get_remote_url()
+    init_mirror(mirror, remote_url, os.getenv("DEFAULT_BRANCH", "main"))
+    message = f"auto commit {label}"
+
+    def run(item):
+        machine, pod = item
+        status, detail = collect(pod, machine, branch_name(machine, label), mirror, message)
+        print(f"[{machine}] {'✗' if status == 'failed' else '✓'} {status}: {detail[:12] if status != 'failed' else detail}")
+        return machine, (status, detail)
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        results = dict(executor.map(run, pods_by_machine.items()))
+    if not push:
+        return {machine: ("collected", detail) if status == "updated" else (status, detail)
+                for machine, (status, detail) in results.items()}
+
+    branches = pending_branches(mirror, branch_name("*", label))
+    print(f"\nPushing {len(branches)} branches to {remote_url}...")
+    push_results = push_branches(mirror, branches, retries=retries) if branches else {}
+    machine_of_branch = {branch_name(machine, label): machine for machine in pods_by_machine}
+    for branch, error in push_results.items():
+        machine = machine_of_branch.get(branch)
+        if machine is None or results[machine][0] == "failed":
+            continue
+        results[machine] = ("pushed", branch) if error is None else ("push failed", error)
+    return results
+
+
+def get_pods_by_machine(machine_names):
+    """Reachable pods serving the given machines, by machine name."""
+    from distribute import get_target_pods
+    from snapshot import machine_for_pod
+    pins = load_pins()
+    return {machine_for_pod(pod, pins): pod for pod in get_target_pods(machine_names)}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Commit the participants' ARENA work on every pod, collect it in a git mirror on this "
+                    "machine (GIT_MIRROR_PATH) and push all the branches to GitHub at once. Run it on the proxy.")
+    parser.add_argument("machine_names", nargs="*", help="Machines to sync (default: all of MACHINE_NAME_LIST)")
+    parser.add_argument("--label", default=datetime.now().strftime("%Y-%m-%d"),
+                        help="Day label in the branch names, e.g. w4d2 (default: today's date)")
+    parser.add_argument("--parallel", type=int, default=int(os.getenv("MAX_PARALLEL", "10")),
+                        help="Pods to collect from at the same time")
+    parser.add_argument("--no-push", action="store_true", help="Only collect into the mirror, don't push to GitHub")
+    parser.add_argument("--retries", type=int, default=4, help="Times to retry a failed push (with backoff)")
+    args = parser.parse_args()
+
+    machine_names = args.machine_names or ast.literal_eval(os.environ["MACHINE_NAME_LIST"])
+    pods_by_machine = get_pods_by_machine(machine_names)
+    start = time.monotonic()
+    results = sync(pods_by_machine, args.label, parallel=args.parallel, push=not args.no_push, retries=args.retries)
+
+    print("\n--- Summary ---")
+    for machine in machine_names:
+        status, detail = results.get(machine, ("failed", "no reachable pod"))
+        print(f"{machine:<16} {status:<12} {detail}")
+    counts = {}
+    for machine in machine_names:
+        status = results.get(machine, ("failed",))[0]
+        counts[status] = counts.get(status, 0) + 1
+    print(", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+          + f" in {time.monotonic() - start:.0f}s")
+    sys.exit(1 if any(status in ("failed", "push failed") for status in counts) else 0)
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Stop machines by how they are used rather than only by the clock. Run it on
+the proxy machine, usually from vm_scheduler.py.
+
+A machine's last activity is now if it has an established session on its
+proxy port (proxy/session_gauge.py), otherwise the end of its last SSH
+session in the proxy's access log (ssh_access.log, written by the stream
+config of nginx_pods.py), or the time its pod started if that is later.
+With the Jupyter proxy (JUPYTER_PROXY), its last request through the proxy
+(jupyter_access.log, nginx_pods.py --jupyter) counts as well; an open
+notebook tab keeps polling, so it keeps its machine running.
+
+    idle_policy.py              stop machines idle for more than IDLE_STOP_MINUTES
+    idle_policy.py --at-close   stop every machine except those active in the
+                                last IDLE_ACTIVE_MINUTES (for the evening stop;
+                                the ones kept are stopped by the idle rule later)
+
+Every decision is printed and appended to IDLE_POLICY_LOG_PATH.
+"""
+import os
+import re
+import sys
+import json
+import subprocess
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from mydotenv import load_env
+load_env()
+
+from inventory import get_accounts, get_all_pods
+from pod_model import PodStatus, Pod
+from snapshot import take_snapshots
+from stop_pods import stop_pods
+
+SESSION_GAUGE = Path(__file__).parent.parent / "proxy" / "session_gauge.py"
+# `upstream <machine> { server <ip>:<port>; }` lines written by nginx_pods.py
+UPSTREAM_RE = re.compile(r"upstream\s+([\w.-]+)\s*\{\s*server\s+([\d.]+:\d+)\s*;")
+# '$remote_addr [$time_local] $protocol $status $bytes_sent $bytes_received $session_time "$upstream_addr"'
+ACCESS_LOG_RE = re.compile(r'^\S+ \[([^\]]+)\] \S+ (\d+) (\d+) (\d+) ([\d.]+) "([^"]*)"')
+# Shorter sessions are port scanners and health checks, not participants
+MIN_SESSION_SECONDS = 5
+# '$proxy_host [$time_local] "$request" $status $request_time', $proxy_host being the Jupyter upstream
+JUPYTER_LOG_RE = re.compile(r'^(\S+) \[([^\]]+)\]')
+# Only the end of the access log is read, which covers far more than a day
+LOG_TAIL_BYTES = 16 * 1024 * 1024
+# The Jupyter log has a line per request (open tabs poll), so it needs a longer tail for a few hours
+JUPYTER_LOG_TAIL_BYTES = 128 * 1024 * 1024
+
+
+def get_decision_log_path():
+    return os.path.expanduser(os.getenv("IDLE_POLICY_LOG_PATH", "~/.arena_idle_decisions.jsonl"))
+
+
+def load_upstreams(config_path=None):
+    """Map each proxied pod endpoint "ip:port" to its machine (upstream) name."""
+    config_path = os.path.expanduser(config_path or os.getenv("SSH_PROXY_NGINX_CONFIG_PATH", "~/proxy.conf"))
+    with open(config_path) as f:
+        return {address: machine for machine, address in UPSTREAM_RE.findall(f.read())}
+
+
+def get_sessions(config_path=None):
+    """Established sessions per machine, from session_gauge.py --json."""
+    command = [sys.executable, str(SESSION_GAUGE), "--json"]
+    if config_path:
+        command += ["--config", config_path]
+    result = subprocess.run(command, capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(f"session_gauge.py failed: {result.stderr.strip()}")
+    return {machine: m["sessions"] for machine, m in json.loads(result.stdout)["machines"].items()}
+
+
+def read_log_tail(path, tail_bytes=LOG_TAIL_BYTES):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - tail_bytes))
+        return f.read().decode(errors="replace").splitlines()
+
+
+def read_last_sessions(log_path, upstreams):
+    """
+    End time of the last real SSH session per machine in the access log (and
+    the previous one, in case logrotate just ran). Entries are written when a
+    session closes, so $time_local is its end.
+    """
+    last = {}
+    lines = []
+    if os.path.exists(f"{log_path}.1"):
+        lines += read_log_tail(f"{log_path}.1")
+    try:
+        lines += read_log_tail(log_path)
+    except OSError as e:
+        print(f"Warning: could not read {log_path}: {e}")
+    for line in lines:
+        match = ACCESS_LOG_RE.match(line)
+        if not match or float(match.group(5)) < MIN_SESSION_SECONDS:
+            continue
+        # With retries nginx logs every upstream it tried; the session ran on the last one
+        machine = upstreams.get(match.group(6).split(",")[-1].strip())
+        if machine is None:
+            continue
+        try:
+            ended = datetime.strptime(match.group(1), "%d/%b/%Y:%H:%M:%S %z")
+        except ValueError:
+            continue
+        if machine not in last or ended > last[machine]:
+            last[machine] = ended
+    return last
+
+
+def read_last_jupyter_requests(log_path, machines):
+    """Time of the last request through the Jupyter proxy per machine (and in the previous log)."""
+    # Upstream names as nginx_pods.jupyter_upstream_name writes them
+    machine_of_upstream = {f"jupyter_{machine}".replace("-", "_"): machine for machine in machines}
+    last = {}
+    lines = []
+    if os.path.exists(f"{log_path}.1"):
+        lines += read_log_tail(f"{log_path}.1", JUPYTER_LOG_TAIL_BYTES)
+    try:
+        lines += read_log_tail(log_path, JUPYTER_LOG_TAIL_BYTES)
+    except OSError as e:
+        print(f"Warning: could not read {log_path}: {e}")
+    for line in lines:
+        match = JUPYTER_LOG_RE.match(line)
+        machine = machine_of_upstream.get(match.group(1)) if match else None
+        if machine is None:
+            continue
+        try:
+            requested = datetime.strptime(match.group(2), "%d/%b/%Y:%H:%M:%S %z")
+        except ValueError:
+            continue
+        if machine not in last or requested > last[machine]:
+            last[machine] = requested
+    return last
+
+
+def decide(machine, pod, sessions, last_session, now, idle_limit, at_close=False, active_limit=None):
+    """
+    Whether to stop one machine.
+
+    Returns:
+        dict: {"machine", "pod_id", "action" ("stop" or "keep"), "reason",
+        "sessions", "last_activity" (iso or None), "idle_minutes"}
+    """
+    started = now - timedelta(seconds=pod.uptime_seconds) if pod.uptime_seconds is not None else None
+    candidates = [t for t in (last_session, started) if t is not None]
+    last_activity = now if sessions else (max(candidates) if candidates else None)
+    idle = (now - last_activity) if last_activity else None
+    decision = {
+        "machine": machine,
+        "pod_id": pod.id,
+        "sessions": sessions,
+        "last_activity": last_activity.isoformat() if last_activity else None,
+        "idle_minutes": round(idle.total_seconds() / 60, 1) if idle is not None else None,
+    }
+
+    def result(action, reason):
+        return {**decision, "action": action, "reason": reason}
+
+    if sessions:
+        return result("keep", f"{sessions} open session{'s' if sessions > 1 else ''}")
+    if idle is None:
+        return result("keep", "no activity data (no sessions or Jupyter requests logged and unknown uptime)")
+    limit = active_limit if at_close else idle_limit
+    idle_text = f"idle {decision['idle_minutes']:g} min"
+    if idle <= limit:
+        return result("keep", f"{idle_text}, active within {limit.total_seconds() / 60:g} min")
+    return result("stop", f"{idle_text} > {limit.total_seconds() / 60:g} min")
+
+
+def log_decision(decision, dry_run=False):
+    print(f"[{decision['machine']}] {decision['action'].upper()}: {decision['reason']}")
+    if dry_run:
+        return
+    with open(get_decision_log_path(), "a") as f:
+        f.write(json.dumps({"time": datetime.now(timezone.utc).isoformat(), **decision}) + "\n")
+
+
+def run_policy(idle_minutes, at_close=False, active_minutes=15, config_path=None, log_path=None,
+               jupyter_log_path=None, snapshot=False, parallel=10, dry_run=False):
+    accounts = get_accounts()
+    if not accounts:
+        print("Error: RUNPOD_API_KEY environment variable not set")
+        return 1
+    upstreams = load_upstreams(config_path)
+    # Without live session counts nobody can be known to be idle, so nothing is stopped
+    sessions = get_sessions(config_path)
+    last_sessions = read_last_sessions(log_path or os.getenv("IDLE_POLICY_ACCESS_LOG", "/var/log/nginx/ssh_access.log"),
+                                       upstreams)
+    if os.getenv("JUPYTER_PROXY"):
+        jupyter_log_path = jupyter_log_path or os.getenv("IDLE_POLICY_JUPYTER_LOG", "/var/log/nginx/jupyter_access.log")
+        for machine, requested in read_last_jupyter_requests(jupyter_log_path, upstreams.values()).items():
+            if machine not in last_sessions or requested > last_sessions[machine]:
+                last_sessions[machine] = requested
+    api_pods = {pod["id"]: pod for pod in get_all_pods(accounts)}
+    pods_by_address = {f"{pod.ssh_ip}:{pod.ssh_port}": pod
+                       for pod in map(Pod.from_api, api_pods.values()) if pod.reachable}
+
+    now = datetime.now(timezone.utc)
+    mode = f"at close (keep if active within {active_minutes:g} min)" if at_close else f"idle > {idle_minutes:g} min"
+    print(f"Idle policy at {now.strftime('%H:%M')} UTC, {mode}, {len(upstreams)} routed machines")
+    to_stop = []
+    for address, machine in sorted(upstreams.items(), key=lambda item: item[1]):
+        pod = pods_by_address.get(address)
+        if pod is None or pod.status != PodStatus.RUNNING:
+            continue
+        decision = decide(machine, pod, sessions.get(machine, 0), last_sessions.get(machine), now,
+                          timedelta(minutes=idle_minutes), at_close, timedelta(minutes=active_minutes))
+        log_decision(decision, dry_run)
+        if decision["action"] == "stop":
+            to_stop.append(pod)
+
+    if not to_stop:
+        print("No machines to stop")
+        return 0
+    if dry_run:
+        print(f"[DRY RUN] Would stop {len(to_stop)} machines")
+        return 0
+    if snapshot:
+        results = take_snapshots(to_stop, parallel=parallel)
+        failed = {name for name, (_, error) in results.items() if error is not None}
+        if failed:
+            print(f"Not stopping {len(failed)} pods whose snapshot failed: {', '.join(sorted(failed))}")
+        to_stop = [pod for pod in to_stop if pod.name not in failed]
+    stopped = stop_pods([api_pods[pod.id] for pod in to_stop], accounts)
+    print(f"Stopped {len(stopped)}/{len(to_stop)} idle machines")
+    return 0 if len(stopped) == len(to_stop) else 1
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Stop machines nobody is using, judged by their sessions through the proxy. "
+                    "Run it on the proxy machine (e.g. from vm_scheduler.py).")
+    parser.add_argument("--idle-minutes", type=float, default=float(os.getenv("IDLE_STOP_MINUTES", "60")),
+                        help="Stop machines without activity for this long (overrides IDLE_STOP_MINUTES env var)")
+    parser.add_argument("--at-close", action="store_true",
+                        help="Scheduled stop: stop all machines except the ones still in active use")
+    parser.add_argument("--active-minutes", type=float, default=float(os.getenv("IDLE_ACTIVE_MINUTES", "15")),
+                        help="With --at-close, keep machines active within this long "
+                             "(overrides IDLE_ACTIVE_MINUTES env var)")
+    parser.add_argument("--config", help="Stream config generated by nginx_pods.py (default: SSH_PROXY_NGINX_CONFIG_PATH)")
+    parser.add_argument("--access-log", help="nginx SSH access log (default: IDLE_POLICY_ACCESS_LOG or "
+                                             "/var/log/nginx/ssh_access.log)")
+    parser.add_argument("--jupyter-log", help="nginx Jupyter access log, read when JUPYTER_PROXY is set "
+                                              "(default: IDLE_POLICY_JUPYTER_LOG or /var/log/nginx/jupyter_access.log)")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Snapshot each workspace to SNAPSHOT_STORE_PATH before stopping (see snapshot.py)")
+    parser.add_argument("--parallel", type=int, default=int(os.getenv("MAX_PARALLEL", "10")),
+                        help="Number of pods to snapshot at the same time")
+    parser.add_argument("--dry-run", action="store_true", help="Print the decisions without stopping anything")
+    args = parser.parse_args()
+
+    try:
+        sys.exit(run_policy(args.idle_minutes, at_close=args.at_close, active_minutes=args.active_minutes,
+                            config_path=args.config, log_path=args.access_log,
+                            jupyter_log_path=args.jupyter_log, snapshot=args.snapshot,
+                            parallel=args.parallel, dry_run=args.dry_run))
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
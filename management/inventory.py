@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Pod inventory across one or more RunPod accounts.
+
+Accounts come from RUNPOD_ACCOUNTS in config.env, one entry per account/pool:
+
+    "<account name>:<env var holding its API key>:<machine name prefix>:<proxy starting port>"
+
+The prefix and starting port are optional and default to MACHINE_NAME_PREFIX
+and SSH_PROXY_STARTING_PORT. Without RUNPOD_ACCOUNTS there is a single
+"default" account using RUNPOD_API_KEY.
+
+Pods are fetched from all accounts concurrently with plain GraphQL requests
+(so this works without the runpod library, e.g. on the proxy) and returned in
+the same shape as runpod.get_pods(), with an extra "account" key. An identical
+copy lives in management/ and proxy/, like mydotenv.py.
+"""
+import os
+import sys
+import ast
+import json
+import urllib.request
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from resilience import retry_call
+
+PODS_QUERY = """
+query Pods {
+    myself {
+        pods {
+            id
+            name
+            desiredStatus
+            costPerHr
+            lastStatusChange
+            gpuCount
+            podType
+            imageName
+            machineId
+            machine {
+                gpuDisplayName
+            }
+            runtime {
+                uptimeInSeconds
+                ports {
+                    ip
+                    isIpPublic
+                    privatePort
+                    publicPort
+                    type
+                }
+            }
+        }
+    }
+}
+"""
+
+
+def make_graphql_request(query, api_key, variables=None):
+    """Make a GraphQL request to RunPod API"""
+    # URL encode the API key to handle special characters
+    encoded_api_key = urllib.parse.quote(api_key, safe='')
+    url = f"https://api.runpod.io/graphql?api_key={encoded_api_key}"
+
+    payload = {"query": query}
+    if variables is not None:
+        payload["variables"] = variables
+    data = json.dumps(payload).encode('utf-8')
+    headers = {
+        'Content-Type': 'application/json',
+        'Content-Length': str(len(data)),
+        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'application/json',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Cache-Control': 'no-cache',
+        'Pragma': 'no-cache'
+    }
+
+    request = urllib.request.Request(url, data=data, headers=headers, method='POST')
+
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        error_body = e.read().decode('utf-8')
+        if 'error code: 1010' in error_body:
+            print("Cloudflare is blocking the request. This might be due to:", file=sys.stderr)
+            print("1. Invalid API key", file=sys.stderr)
+            print("2. API key needs to be URL encoded if it contains special characters", file=sys.stderr)
+            print("3. RunPod API might require specific headers or authentication method", file=sys.stderr)
+            print(file=sys.stderr)
+            print("Debug info:", file=sys.stderr)
+            print(f"URL: {url[:50]}...", file=sys.stderr)  # Show partial URL for security
+            print(f"API Key length: {len(api_key)}", file=sys.stderr)
+        print(f"HTTP Error {e.code}: {error_body}", file=sys.stderr)
+        raise
+    except Exception as e:
+        print(f"Error making request: {str(e)}", file=sys.stderr)
+        raise
+
+
+def get_accounts(require_key=True):
+    """
+    Parse RUNPOD_ACCOUNTS into a list of account dicts.
+
+    Returns:
+        list: [{"name", "api_key", "prefix", "starting_port"}, ...]. Unless
+        require_key is False, accounts whose API key variable is not set are
+        skipped with a warning.
+    """
+    default_prefix = os.getenv("MACHINE_NAME_PREFIX", "")
+    default_port = int(os.getenv("SSH_PROXY_STARTING_PORT", "12000"))
+    entries = ast.literal_eval(os.getenv("RUNPOD_ACCOUNTS", "[]") or "[]")
+    if not entries:
+        entries = ["default:RUNPOD_API_KEY"]
+
+    accounts = []
+    for entry in entries:
+        parts = entry.split(":")
+        name, key_var = parts[0], parts[1] if len(parts) > 1 else "RUNPOD_API_KEY"
+        api_key = os.getenv(key_var)
+        if not api_key and require_key:
+            print(f"Warning: {key_var} is not set, skipping account '{name}'", file=sys.stderr)
+            continue
+        accounts.append({
+            "name": name,
+            "api_key": api_key,
+            "prefix": parts[2] if len(parts) > 2 and parts[2] else default_prefix,
+            "starting_port": int(parts[3]) if len(parts) > 3 and parts[3] else default_port,
+        })
+    return accounts
+
+
+def get_pools(accounts=None):
+    """Distinct (prefix, starting_port) pools; several accounts may share one pool."""
+    pools = []
+    for account in accounts if accounts is not None else get_accounts(require_key=False):
+        pool = (account["prefix"], account["starting_port"])
+        if pool not in pools:
+            pools.append(pool)
+    return pools
+
+
+def get_account_pods(account, query=PODS_QUERY):
+    """Get all pods of one account, tagged with the account name."""
+    result = retry_call(make_graphql_request, query, account["api_key"])
+    if 'errors' in result:
+        raise RuntimeError(f"GraphQL Errors: {result['errors']}")
+    pods = (result.get('data') or {}).get('myself', {}).get('pods') or []
+    for pod in pods:
+        pod["account"] = account["name"]
+    return pods
+
+
+def get_all_pods(accounts=None, strict=False):
+    """
+    Fetch pods from every account concurrently and merge them.
+
+    An account that fails is reported on stderr and left out, so one bad key
+    does not hide the other accounts' pods. With strict=True a failed account
+    raises instead, for callers that must not mistake a partial list for the
+    whole fleet (nginx_pods.py would drop the missing pods' routes).
+    """
+    if accounts is None:
+        accounts = get_accounts()
+    if not accounts:
+        return []
+    failed = []
+
+    def fetch(account):
+        try:
+            return get_account_pods(account)
+        except Exception as e:
+            print(f"Error fetching pods for account '{account['name']}': {str(e)}", file=sys.stderr)
+            failed.append(account["name"])
+            return []
+
+    with ThreadPoolExecutor(max_workers=len(accounts)) as executor:
+        results = list(executor.map(fetch, accounts))
+    if strict and failed:
+        raise RuntimeError(f"could not fetch the pods of account(s) {', '.join(sorted(failed))}")
+    return [pod for pods in results for pod in pods]
+
+
+def api_key_for(pod, accounts=None):
+    """API key of the account a pod belongs to (for routing stop/terminate calls)."""
+    for account in accounts if accounts is not None else get_accounts():
+        if account["name"] == pod.get("account"):
+            return account["api_key"]
+    return os.getenv("RUNPOD_API_KEY")
+
+
+def use_account_of(pod, accounts=None):
+    """Point the runpod library at the account owning `pod` before acting on it."""
+    import runpod
+    runpod.api_key = api_key_for(pod, accounts)
@@ -1,59 +1,40 @@
 #!/usr/bin/env python3
-import runpod
-import os
-from datetime import datetime
-
 from mydotenv import load_env
 load_env()
 
+from inventory import get_accounts, get_all_pods
+from pod_model import parse_pods, sort_pods
+
 def list_pods():
-    # Get API key from environment
-    api_key = os.getenv("RUNPOD_API_KEY")
-    if not api_key:
+    # Get API keys from environment (RUNPOD_ACCOUNTS, or just RUNPOD_API_KEY)
+    accounts = get_accounts()
+    if not accounts:
         print("Error: RUNPOD_API_KEY environment variable not set")
         return
-    runpod.api_key = api_key
 
     try:
-        # Get all pods
-        print("Fetching pods...")
-        pods = runpod.get_pods()
+        # Get all pods, from all accounts
+        print(f"Fetching pods from {len(accounts)} account(s)...")
+        pods = get_all_pods(accounts)
 
         if not pods:
             print("No pods found")
             return
 
         # Sort pods by name
-        pods = sorted(pods, key=lambda x: x['name'])
+        pods = sort_pods(parse_pods(pods), "name")
 
         # Print header
         print("\n" + "="*120)
-        print(f"{'IP':<16} {'SSH Port':<10} {'Cost/hr':<10} {'Last Status Change'} {'Name':<15} {'Status':<12} {'GPU':<8} ")
+        print(f"{'IP':<16} {'SSH Port':<10} {'Cost/hr':<10} {'Last Status Change':<24} {'Name':<15} {'Status':<16} {'GPU':<8} {'Account'}")
         print("="*120)
 
         # Print each pod's information
         for pod in pods:
-            try:
-                # Get the public IP and port for SSH (type 'tcp')
-                ssh_port = next((str(p['publicPort']) for p in pod['runtime']['ports']
-                               if p['type'] == 'tcp' and p['isIpPublic']), 'N/A')
-                public_ip = next((p['ip'] for p in pod['runtime']['ports']
-                                if p['type'] == 'tcp' and p['isIpPublic']), 'N/A')
-
-                # Format the status time
-                status_time = pod['lastStatusChange']
-                if ': ' in status_time:
-                    status_time = status_time.split(': ')[1].split(' GMT')[0]
-
-                # Get the status (first part before the colon)
-                status = pod['lastStatusChange'].split(': ')[0] if ': ' in pod['lastStatusChange'] else pod['lastStatusChange']
-
-                # Format cost with dollar sign
-                cost = f"${pod['costPerHr']}"
-
-                print(f"{public_ip:<16} {ssh_port:<10} {cost:<10} {status_time} {pod['name']:<15} {status:<12} {pod['machine']['gpuDisplayName']:<8}")
-            except:
-                print(pod)
+            public_ip = pod.ssh_ip or 'N/A'
+            ssh_port = str(pod.ssh_port or 'N/A')
+            cost = f"${pod.cost_per_hr}"
+            print(f"{public_ip:<16} {ssh_port:<10} {cost:<10} {pod.format_status_time():<24} {pod.name:<15} {pod.status_reason or pod.status.value:<16} {pod.gpu_name or 'N/A':<8} {pod.account}")
 
         print("="*120 + "\n")
 
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+import os
+import sys
+import ast
+import shlex
+import time
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import runpod
+
+from mydotenv import load_env
+load_env()
+
+from resilience import retry_call, CircuitOpenError
+from pod_utils import get_ssh_endpoint, check_ssh_banner, ssh_args, update_pins
+from create_new_pods import load_public_key
+from rolling_replace import create_replacement, terminate, stop, use_first_account, find_current_pods
+from vm_scheduler import update_nginx
+
+# Written at the end of the image build (see Dockerfile); files older than this came with the image
+IMAGE_BASELINE_MARKER = "/root/.arena_infra/.image_baseline"
+RELAY_BUFFER_SIZE = 1024 * 1024
+
+
+def has_command(ip, port, command):
+    result = subprocess.run(ssh_args(ip, port) + [f"command -v {command}"], capture_output=True, timeout=30)
+    return result.returncode == 0
+
+
+def pick_compressor(source, target):
+    """Use zstd when both pods have it (much faster at similar ratio), otherwise gzip."""
+    if has_command(*source, "zstd") and has_command(*target, "zstd"):
+        return "zstd -T0 -3 -c", "zstd -d -c"
+    return "gzip -1 -c", "gzip -d -c"
+
+
+def build_pack_command(paths, compress):
+    """
+    Remote command that tars every file under `paths` changed since the image
+    baseline and writes the compressed stream to stdout. It fails if tar or the
+    compressor does, so an incomplete copy is never taken for a finished one.
+    """
+    quoted_paths = " ".join(shlex.quote(p.lstrip("/")) for p in paths)
+    # Files vanish on a live pod: find may then exit 1 and tar exits 1 ("some files differ"),
+    # but only tar's 2 (fatal) means the archive is broken
+    script = (
+        f"cd / && NEWER='' && [ -e {IMAGE_BASELINE_MARKER} ] && NEWER='-newer {IMAGE_BASELINE_MARKER}'; "
+        f"{{ find {quoted_paths} -name __pycache__ -prune -o \\( -type f -o -type l \\) $NEWER -print0 2>/dev/null || true; }} "
+        f"| {{ tar --null --no-recursion --ignore-failed-read -T - -cf - || [ $? -eq 1 ]; }} | {compress}"
+    )
+    return f"bash -o pipefail -c {shlex.quote(script)}"
+
+
+def build_unpack_command(decompress):
+    return f"bash -o pipefail -c {shlex.quote(f'{decompress} | tar -C / -xpf -')}"
+
+
+def drain(stream):
+    """Read a pipe to the end in a thread, so the process writing it never blocks on a full pipe."""
+    output = []
+    thread = threading.Thread(target=lambda: output.append(stream.read()), daemon=True)
+    thread.start()
+
+    def result():
+        thread.join()
+        return b"".join(output).decode(errors="replace").strip()
+    return result
+
+
+def stream_workspace(source, target, paths):
+    """
+    Relay a compressed tar stream from the source pod to the target pod.
+
+    Data flows source ssh -> this process -> target ssh through a small buffer,
+    so nothing is staged on the admin host's disk.
+
+    Returns:
+        int: Number of compressed bytes relayed.
+    """
+    compress, decompress = pick_compressor(source, target)
+    pack = subprocess.Popen(
+        ssh_args(*source) + [build_pack_command(paths, compress)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    unpack = subprocess.Popen(
+        ssh_args(*target) + [build_unpack_command(decompress)],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    pack_errors = drain(pack.stderr)
+    unpack_errors = drain(unpack.stderr)
+    relayed = 0
+    target_gone = False
+    try:
+        while True:
+            chunk = pack.stdout.read1(RELAY_BUFFER_SIZE)
+            if not chunk:
+                break
+            unpack.stdin.write(chunk)
+            relayed += len(chunk)
+    except OSError:
+        # The target went away (BrokenPipeError); nobody reads the source any more
+        target_gone = True
+        pack.kill()
+    except BaseException:
+        pack.kill()
+        unpack.kill()
+        raise
+    finally:
+        try:
+            unpack.stdin.close()
+        except OSError:
+            pass
+        pack.stdout.close()
+        pack.wait()
+        unpack.wait()
+
+    if target_gone or (unpack.returncode != 0 and pack.returncode == 0):
+        raise RuntimeError(f"unpacking on target failed: {unpack_errors() or f'exit status {unpack.returncode}'}")
+    if pack.returncode != 0:
+        raise RuntimeError(f"packing on source failed: {pack_errors() or f'exit status {pack.returncode}'}")
+    return relayed
+
+
+def migrate_machine(machine_name, old_pod, pod_config, public_key_content, paths, ready_timeout):
+    """
+    Create a new pod for `machine_name`, copy the old pod's changed files into
+    it, and return an outcome dict for the swap step.
+    """
+    start = time.monotonic()
+    old_endpoint = get_ssh_endpoint(old_pod)
+    if not (old_endpoint[0] and check_ssh_banner(*old_endpoint)):
+        return {"machine": machine_name, "old_id": old_pod["id"], "new_id": None,
+                "error": "old pod is not reachable over SSH", "bytes": 0, "seconds": 0}
+
+    outcome = create_replacement(machine_name, old_pod, pod_config, public_key_content, ready_timeout)
+    outcome["bytes"] = 0
+    if outcome["error"] is not None:
+        return outcome
+
+    try:
+        new_endpoint = get_ssh_endpoint(retry_call(runpod.get_pod, outcome["new_id"]))
+        print(f"[{machine_name}] Streaming {', '.join(paths)} from {old_endpoint[0]} to {new_endpoint[0]}...")
+        copy_start = time.monotonic()
+        outcome["bytes"] = stream_workspace(old_endpoint, new_endpoint, paths)
+        copy_seconds = time.monotonic() - copy_start
+        rate = outcome["bytes"] / max(copy_seconds, 1e-6) / 1e6
+        print(f"[{machine_name}] Copied {outcome['bytes'] / 1e6:.1f} MB (compressed) in {copy_seconds:.0f}s ({rate:.1f} MB/s)")
+    except Exception as e:
+        outcome["error"] = f"copy failed: {str(e)}"
+    outcome["seconds"] = time.monotonic() - start
+    return outcome
+
+
+def migrate(machine_names, pod_config, paths, parallel=5, keep_old=False, ready_timeout=900, skip_confirm=False):
+    accounts = use_first_account()
+    plan = find_current_pods(machine_names, accounts)
+    old_pods = {old_pod["id"]: old_pod for _, old_pod in plan}
+    if not plan:
+        print("No machines to migrate.")
+        return
+
+    print(f"\nMigrating {len(plan)} machines ({', '.join(paths)}) onto new pods:")
+    for machine_name, old_pod in plan:
+        print(f"- {machine_name} (old pod: {old_pod['id']})")
+    if not skip_confirm:
+        confirmation = input("\nProceed with migration? (y/N): ")
+        if confirmation.lower() != "y":
+            print("Operation cancelled")
+            return
+
+    public_key_content = load_public_key()
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            outcomes = list(executor.map(
+                lambda item: migrate_machine(item[0], item[1], pod_config, public_key_content, paths, ready_timeout),
+                plan,
+            ))
+    except CircuitOpenError as e:
+        print(f"\nRunPod API appears to be down, aborting: {str(e)}")
+        print("Check list_pods.py for new pods that may have been created.")
+        sys.exit(1)
+
+    migrated = [o for o in outcomes if o["error"] is None]
+    failed = [o for o in outcomes if o["error"] is not None]
+    for o in failed:
+        print(f"[{o['machine']}] Migration failed: {o['error']} (old pod kept)")
+        if o["new_id"]:
+            terminate(o["new_id"], o["machine"])
+
+    if migrated:
+        update_pins({o["machine"]: o["new_id"] for o in migrated})
+        if update_nginx(dry_run=False, reload=True):
+            for o in migrated:
+                if keep_old:
+                    stop(o["old_id"], o["machine"], pod=old_pods[o["old_id"]], accounts=accounts)
+                else:
+                    terminate(o["old_id"], o["machine"], pod=old_pods[o["old_id"]], accounts=accounts)
+        else:
+            print("Error: could not update the proxy. Old pods were kept; re-run nginx_pods.py to apply the pins.")
+
+    total_bytes = sum(o["bytes"] for o in migrated)
+    elapsed = time.monotonic() - start
+    print("\n--- Migration Summary ---")
+    print(f"Migrated: {len(migrated)}/{len(plan)}")
+    print(f"Data relayed: {total_bytes / 1e6:.1f} MB (compressed) in {elapsed:.0f}s")
+    for o in failed:
+        print(f"  - {o['machine']}: {o['error']}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Move machines onto new pods, streaming their work pod-to-pod. "
+                    "Run this on the proxy machine, as it updates the nginx config.")
+    parser.add_argument("machine_names", nargs="+", help="Machines to migrate (e.g. apple autumn)")
+    parser.add_argument("--paths", nargs="+",
+                        help="Directories to copy (overrides MIGRATE_PATHS env var)")
+    parser.add_argument("--parallel", type=int, default=int(os.getenv("MAX_PARALLEL", "10")),
+                        help="Number of machines to migrate at the same time")
+    parser.add_argument("--keep-old", action="store_true", help="Stop the old pods instead of terminating them")
+    parser.add_argument("--gpu-type", help="GPU type for the new pods (overrides RUNPOD_GPU_TYPE env var)")
+    parser.add_argument("--docker-image", help="Docker image for the new pods (overrides RUNPOD_DOCKER_IMAGE env var)")
+    parser.add_argument("--ready-timeout", type=int, default=900, help="Seconds to wait for a new pod to accept SSH")
+    parser.add_argument("--yes", "-y", action="store_true", help="Skip confirmation prompts")
+    args = parser.parse_args()
+
+    paths = args.paths or ast.literal_eval(os.getenv("MIGRATE_PATHS", "['/root/ARENA_3.0', '/workspace']"))
+    pod_config = {
+        "gpu_type_id": args.gpu_type or os.environ["RUNPOD_GPU_TYPE"],
+        "gpu_count": int(os.environ["RUNPOD_NUM_GPUS"]),
+        "runpod_cloud_type": os.environ["RUNPOD_CLOUD_TYPE"],
+        "docker_image": args.docker_image or os.environ["RUNPOD_DOCKER_IMAGE"],
+        "disk_space_in_gb": int(os.environ["RUNPOD_DISK_SPACE_IN_GB"]),
+        "volume_space_in_gb": int(os.environ["RUNPOD_VOLUME_SPACE_IN_GB"]),
+    }
+    migrate(args.machine_names, pod_config, paths, parallel=args.parallel,
+            keep_old=args.keep_old, ready_timeout=args.ready_timeout, skip_confirm=args.yes)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import socket
+
+import runpod
+
+from resilience import retry_call
+from pod_model import Pod
+
+
+def get_ssh_endpoint(pod):
+    """
+    Get the public SSH (ip, port) of a pod from its runtime ports, picked the
+    same way as everywhere else (Pod.from_api): the public TCP port for 22,
+    never Jupyter's.
+
+    Returns:
+        tuple: (ip, port) or (None, None) if the pod has no public SSH port yet.
+    """
+    parsed = Pod.from_api(pod)
+    return parsed.ssh_ip, parsed.ssh_port
+
+
+def check_ssh_banner(ip, port, timeout=5):
+    """Return True if something at ip:port answers with an SSH banner."""
+    try:
+        with socket.create_connection((ip, port), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            return sock.recv(64).startswith(b"SSH-")
+    except OSError:
+        return False
+
+
+def wait_until_reachable(pod_id, timeout=900, poll_interval=10):
+    """
+    Poll a pod until it has a public SSH port that answers with an SSH banner.
+
+    Returns:
+        dict: The pod (as returned by runpod.get_pod) once reachable, or None on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pod = retry_call(runpod.get_pod, pod_id)
+        if pod:
+            ip, port = get_ssh_endpoint(pod)
+            if ip and port and check_ssh_banner(ip, port):
+                return pod
+        time.sleep(poll_interval)
+    return None
+
+
+def ssh_args(ip, port, connect_timeout=10, key_path=None):
+    """
+    Base ssh command for connecting straight to a pod's public endpoint with the shared key.
+
+    Pass key_path to use a key at another path, e.g. the copy of the shared
+    key on a pod when one pod connects to another.
+    """
+    if key_path is None:
+        key_path = os.path.expanduser(os.getenv("SHARED_SSH_KEY_PATH", "~/.ssh/id_ed25519"))
+    user = os.getenv("SSH_USER", "root")
+    return [
+        "ssh",
+        "-i", key_path,
+        "-p", str(port),
+        "-o", "BatchMode=yes",
+        "-o", f"ConnectTimeout={connect_timeout}",
+        "-o", "StrictHostKeyChecking=no",
+        "-o", "UserKnownHostsFile=/dev/null",
+        "-o", "LogLevel=ERROR",
+        f"{user}@{ip}",
+    ]
+
+
+def get_pins_path():
+    return os.path.expanduser(os.getenv("SSH_PROXY_PINS_PATH", "~/proxy_pins.json"))
+
+
+def load_pins():
+    """Load the machine -> pod id pins file read by nginx_pods.py."""
+    pins_path = get_pins_path()
+    if not os.path.exists(pins_path):
+        return {}
+    with open(pins_path) as f:
+        return json.load(f)
+
+
+def update_pins(updates):
+    """Merge machine -> pod id pins into the pins file read by nginx_pods.py."""
+    pins_path = get_pins_path()
+    pins = load_pins()
+    pins.update(updates)
+    tmp_path = pins_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(pins, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, pins_path)
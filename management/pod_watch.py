@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from mydotenv import load_env
+load_env()
+
+from inventory import get_accounts, get_account_pods
+from pod_model import Pod
+from vm_scheduler import update_nginx
+
+# Only what routing (and spot_supervisor.py) depends on, so each poll is a small request per account
+WATCH_QUERY = """
+query Pods {
+    myself {
+        pods {
+            id
+            name
+            desiredStatus
+            lastStatusChange
+            podType
+            runtime {
+                ports {
+                    ip
+                    isIpPublic
+                    privatePort
+                    publicPort
+                    type
+                }
+            }
+        }
+    }
+}
+"""
+
+CREATED = "created"
+STARTED = "started"
+PORTS_CHANGED = "ports_changed"
+IP_CHANGED = "ip_changed"
+STOPPED = "stopped"
+TERMINATED = "terminated"
+
+PodEvent = namedtuple("PodEvent", ["type", "pod_id", "name", "account", "old", "new"])
+
+
+def pod_state(pod):
+    """Reduce a pod to the fields the proxy and ssh configs depend on."""
+    # The SSH endpoint as the proxy sees it, not e.g. an exposed Jupyter port
+    record = Pod.from_api(pod)
+    return {
+        "id": pod["id"],
+        "name": pod.get("name", ""),
+        "account": pod.get("account"),
+        "status": pod.get("desiredStatus"),
+        "status_change": pod.get("lastStatusChange"),
+        "interruptible": pod.get("podType") == "INTERRUPTABLE",
+        "ip": record.ssh_ip,
+        "port": record.ssh_port,
+    }
+
+
+def diff_snapshots(old, new):
+    """
+    Compare two {pod id: pod_state} snapshots.
+
+    Returns:
+        list: PodEvents, in the order created, changed, terminated.
+    """
+    events = []
+    for pod_id, state in new.items():
+        before = old.get(pod_id)
+        if before is None:
+            events.append(PodEvent(CREATED, pod_id, state["name"], state["account"], None, state))
+            continue
+        if before["status"] != state["status"]:
+            event_type = STARTED if state["status"] == "RUNNING" else STOPPED
+            events.append(PodEvent(event_type, pod_id, state["name"], state["account"], before, state))
+            if event_type == STOPPED:
+                continue
+        # A stopped pod loses its runtime; only report endpoints that can be routed to
+        if state["ip"] is None:
+            continue
+        if before["ip"] != state["ip"]:
+            events.append(PodEvent(IP_CHANGED, pod_id, state["name"], state["account"], before, state))
+        elif before["port"] != state["port"]:
+            events.append(PodEvent(PORTS_CHANGED, pod_id, state["name"], state["account"], before, state))
+    for pod_id, before in old.items():
+        if pod_id not in new:
+            events.append(PodEvent(TERMINATED, pod_id, before["name"], before["account"], before, None))
+    return events
+
+
+def format_event(event):
+    def endpoint(state):
+        return f"{state['ip']}:{state['port']}" if state and state["ip"] else "-"
+    return f"{event.type:<14} {event.name:<20} {event.pod_id:<16} {endpoint(event.old)} -> {endpoint(event.new)}"
+
+
+class InventoryWatcher:
+    """
+    Poll the pod inventory of all accounts and notify subscribers of changes.
+
+    Subscribers are called once per poll with the list of PodEvents from that
+    poll, so e.g. nginx is reloaded once even if many pods changed.
+    """
+
+    def __init__(self, accounts, interval=15, fast_interval=5):
+        self.accounts = accounts
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.snapshot = None
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def fetch(self):
+        """
+        Fetch a new snapshot. An account that fails to answer keeps its pods
+        from the previous snapshot, so an API hiccup is not mistaken for
+        every pod being terminated.
+        """
+        def fetch_account(account):
+            try:
+                return account, get_account_pods(account, query=WATCH_QUERY)
+            except Exception as e:
+                print(f"Error fetching pods for account '{account['name']}': {str(e)}", file=sys.stderr)
+                return account, None
+
+        with ThreadPoolExecutor(max_workers=len(self.accounts)) as executor:
+            results = list(executor.map(fetch_account, self.accounts))
+
+        snapshot = {}
+        for account, pods in results:
+            if pods is None:
+                if self.snapshot is None:
+                    raise RuntimeError(f"could not fetch the initial inventory of account '{account['name']}'")
+                snapshot.update({pod_id: state for pod_id, state in self.snapshot.items()
+                                 if state["account"] == account["name"]})
+                continue
+            for pod in pods:
+                snapshot[pod["id"]] = pod_state(pod)
+        return snapshot
+
+    def poll(self):
+        """Fetch the inventory once and notify subscribers. Returns the events."""
+        snapshot = self.fetch()
+        first = self.snapshot is None
+        events = [] if first else diff_snapshots(self.snapshot, snapshot)
+        self.snapshot = snapshot
+        # The first poll calls subscribers with no events, to bring them up to date
+        if events or first:
+            for callback in self.subscribers:
+                try:
+                    callback(events)
+                except Exception as e:
+                    print(f"Error in subscriber {getattr(callback, '__name__', callback)}: {str(e)}")
+        return events
+
+    def next_interval(self):
+        """Poll faster while a running pod is still waiting for its public port."""
+        settling = any(state["status"] == "RUNNING" and state["ip"] is None
+                       for state in (self.snapshot or {}).values())
+        return self.fast_interval if settling else self.interval
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Error polling inventory: {str(e)}")
+            time.sleep(self.next_interval())
+
+
+def log_events(events):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for event in events:
+        print(f"[{timestamp}] {format_event(event)}")
+
+
+def make_nginx_updater(dry_run=False):
+    def update_proxy(events):
+        update_nginx(dry_run, reload=True, only_if_changed=True)
+    return update_proxy
+
+
+def make_ssh_config_writer(path, dry_run=False):
+    """Rewrite the direct-connection ssh config (ssh_config_manual.py) when it changes."""
+    path = os.path.expanduser(path)
+    script = Path(__file__).parent / "ssh_config_manual.py"
+
+    def write_ssh_config(events):
+        if dry_run:
+            print(f"[DRY RUN] Would update {path}")
+            return
+        result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, cwd=script.parent)
+        if result.returncode != 0:
+            print(f"Failed to generate ssh config: {result.stderr.strip()}")
+            return
+        if os.path.exists(path):
+            with open(path) as f:
+                if f.read() == result.stdout:
+                    return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(result.stdout)
+        os.replace(tmp_path, path)
+        print(f"Updated {path}")
+    return write_ssh_config
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Watch the pod inventory and fix proxy routes as soon as pods change. "
+                    "Run this on the proxy machine when using --nginx.")
+    parser.add_argument("--interval", type=float, default=float(os.getenv("WATCH_INTERVAL", "15")),
+                        help="Seconds between polls (overrides WATCH_INTERVAL env var)")
+    parser.add_argument("--fast-interval", type=float, default=5,
+                        help="Seconds between polls while a pod is waiting for its public port")
+    parser.add_argument("--nginx", action="store_true", help="Regenerate and reload the nginx config on changes")
+    parser.add_argument("--ssh-config", help="Keep this file updated with the direct ssh config (ssh_config_manual.py)")
+    parser.add_argument("--once", action="store_true", help="Poll twice, print the changes in between and exit")
+    parser.add_argument("--dry-run", action="store_true", help="Print what would be updated without doing it")
+    args = parser.parse_args()
+
+    accounts = get_accounts()
+    if not accounts:
+        print("Error: RUNPOD_API_KEY environment variable not set")
+        sys.exit(1)
+
+    watcher = InventoryWatcher(accounts, interval=args.interval, fast_interval=args.fast_interval)
+    watcher.subscribe(log_events)
+    if args.nginx:
+        watcher.subscribe(make_nginx_updater(args.dry_run))
+    if args.ssh_config:
+        watcher.subscribe(make_ssh_config_writer(args.ssh_config, args.dry_run))
+
+    print(f"Watching {len(accounts)} account(s) every {args.interval:g}s...")
+    if args.once:
+        watcher.poll()
+        time.sleep(watcher.next_interval())
+        watcher.poll()
+    else:
+        watcher.run()
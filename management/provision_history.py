@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import os
+import json
+import threading
+
+DEFAULT_LEAD_SECONDS = 600
+_lock = threading.Lock()
+
+
+def get_history_path():
+    return os.path.expanduser(os.getenv("PROVISION_HISTORY_PATH", "~/.arena_provision_history.jsonl"))
+
+
+def record(pod_id, pod_name, gpu_type_id, created_at, ready_at):
+    """Append one create-to-reachable measurement (timestamps in unix seconds)."""
+    entry = {
+        "pod_id": pod_id,
+        "name": pod_name,
+        "gpu_type": gpu_type_id,
+        "created_at": created_at,
+        "ready_at": ready_at,
+        "seconds": round(ready_at - created_at, 1),
+    }
+    with _lock:
+        with open(get_history_path(), "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def load(gpu_type_id=None, max_entries=200):
+    """Load the most recent measurements, optionally only for one GPU type."""
+    path = get_history_path()
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if gpu_type_id is None or entry.get("gpu_type") == gpu_type_id:
+                entries.append(entry)
+    return entries[-max_entries:]
+
+
+def estimate_lead_time(gpu_type_id, percentile=0.9, default=DEFAULT_LEAD_SECONDS):
+    """
+    Estimate how long pods of this GPU type take from create to reachable.
+
+    Uses the given percentile of past measurements so most runs finish in
+    time, falling back to `default` seconds when there is no history.
+    """
+    durations = sorted(entry["seconds"] for entry in load(gpu_type_id))
+    if not durations:
+        return default
+    index = min(len(durations) - 1, int(round(percentile * (len(durations) - 1))))
+    return durations[index]
+
+
+def format_delta(seconds):
+    """Format a positive or negative number of seconds as e.g. "3m12s"."""
+    seconds = int(abs(seconds))
+    minutes, seconds = divmod(seconds, 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Measure how good the connection to a pod is, so pods on slow community
+hosts can be rejected right after creation (create_new_pods.py --qualify).
+
+RTT is the TCP connect time to the pod's public SSH port, and throughput is
+measured by pushing and pulling QUALIFY_TEST_MB through an ssh session, so
+it reflects what participants get with ssh and scp. Every result is appended
+to QUALIFY_HISTORY_PATH with the RunPod host (machineId), and pods that land
+on a host whose last qualification failed are rejected without measuring.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import subprocess
+from statistics import median
+
+from mydotenv import load_env
+load_env()
+
+from pod_utils import ssh_args
+
+BUFFER_SIZE = 1024 * 1024
+_lock = threading.Lock()
+
+
+def get_history_path():
+    return os.path.expanduser(os.getenv("QUALIFY_HISTORY_PATH", "~/.arena_host_quality.jsonl"))
+
+
+def get_thresholds():
+    return {
+        "max_rtt_ms": float(os.getenv("QUALIFY_MAX_RTT_MS", "150")),
+        "min_upload_mbps": float(os.getenv("QUALIFY_MIN_UPLOAD_MBPS", "50")),
+        "min_download_mbps": float(os.getenv("QUALIFY_MIN_DOWNLOAD_MBPS", "50")),
+        "test_mb": int(os.getenv("QUALIFY_TEST_MB", "32")),
+    }
+
+
+def measure_rtt(ip, port, samples=5, timeout=5):
+    """Median TCP connect time to ip:port in milliseconds, or None if it never connects."""
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        try:
+            with socket.create_connection((ip, port), timeout=timeout):
+                times.append((time.perf_counter() - start) * 1000)
+        except OSError:
+            continue
+    return median(times) if times else None
+
+
+def time_ssh(ip, port, command, send_bytes=0, timeout=120):
+    """
+    Run `command` over ssh, optionally streaming `send_bytes` into it.
+
+    Returns:
+        (seconds, bytes received)
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(ssh_args(ip, port) + [command], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    # Incompressible data, in case ssh compression is turned on
+    block = os.urandom(BUFFER_SIZE)
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    received = 0
+    try:
+        sent = 0
+        while sent < send_bytes:
+            piece = block[:send_bytes - sent]
+            process.stdin.write(piece)
+            sent += len(piece)
+        process.stdin.close()
+        while True:
+            chunk = process.stdout.read1(BUFFER_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+        process.wait()
+    except BrokenPipeError:
+        process.wait()
+    finally:
+        timer.cancel()
+    if process.returncode != 0:
+        raise RuntimeError(f"ssh command failed with exit code {process.returncode}")
+    return time.perf_counter() - start, received
+
+
+def measure_throughput(ip, port, test_mb):
+    """
+    Upload and download throughput in Mbit/s over ssh. The time of a plain
+    ssh session is subtracted, so the handshake doesn't count as slow transfer.
+    """
+    size = test_mb * 1024 * 1024
+    handshake, _ = time_ssh(ip, port, "true")
+    upload_seconds, _ = time_ssh(ip, port, "cat > /dev/null", send_bytes=size)
+    # Random like the upload, as ssh compression would make zeros look fast
+    download_seconds, received = time_ssh(ip, port, f"head -c {size} /dev/urandom")
+    if received != size:
+        raise RuntimeError(f"download was cut short ({received}/{size} bytes)")
+
+    def mbps(seconds):
+        return size * 8 / 1e6 / max(seconds - handshake, 1e-3)
+    return mbps(upload_seconds), mbps(download_seconds)
+
+
+def load_results():
+    """All recorded qualification results, oldest first."""
+    path = get_history_path()
+    if not os.path.exists(path):
+        return []
+    results = []
+    with open(path) as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                continue
+    return results
+
+
+def record(result):
+    with _lock:
+        with open(get_history_path(), "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+
+def get_bad_hosts():
+    """Hosts (machineIds) whose most recent qualification failed -> that result."""
+    latest = {}
+    for result in load_results():
+        if result.get("host"):
+            latest[result["host"]] = result
+    return {host: result for host, result in latest.items() if not result["passed"]}
+
+
+def qualify(ip, port, host=None, name=None, thresholds=None, bad_hosts=None):
+    """
+    Measure one pod against the thresholds and record the result.
+
+    Returns:
+        dict: {"name", "pod_ip", "host", "rtt_ms", "upload_mbps", "download_mbps",
+        "passed", "reasons", "time"}
+    """
+    thresholds = thresholds or get_thresholds()
+    bad_hosts = get_bad_hosts() if bad_hosts is None else bad_hosts
+    result = {"name": name, "pod_ip": ip, "host": host, "rtt_ms": None, "upload_mbps": None,
+              "download_mbps": None, "passed": False, "reasons": [], "time": time.time()}
+    if host and host in bad_hosts:
+        result["reasons"].append(f"host {host} failed before: {', '.join(bad_hosts[host]['reasons'])}")
+        return result
+
+    result["rtt_ms"] = measure_rtt(ip, port)
+    if result["rtt_ms"] is None:
+        result["reasons"].append("SSH port does not accept connections")
+    else:
+        if result["rtt_ms"] > thresholds["max_rtt_ms"]:
+            result["reasons"].append(f"RTT {result['rtt_ms']:.0f} ms > {thresholds['max_rtt_ms']:g} ms")
+        try:
+            result["upload_mbps"], result["download_mbps"] = measure_throughput(ip, port, thresholds["test_mb"])
+            if result["upload_mbps"] < thresholds["min_upload_mbps"]:
+                result["reasons"].append(
+                    f"upload {result['upload_mbps']:.0f} Mbit/s < {thresholds['min_upload_mbps']:g} Mbit/s")
+            if result["download_mbps"] < thresholds["min_download_mbps"]:
+                result["reasons"].append(
+                    f"download {result['download_mbps']:.0f} Mbit/s < {thresholds['min_download_mbps']:g} Mbit/s")
+        except Exception as e:
+            result["reasons"].append(f"throughput test failed: {str(e)}")
+    result["passed"] = not result["reasons"]
+    record(result)
+    return result
+
+
+def format_result(result):
+    def value(key, unit):
+        return f"{result[key]:.0f} {unit}" if result[key] is not None else "-"
+    status = "✓ passed" if result["passed"] else f"✗ failed ({'; '.join(result['reasons'])})"
+    return (f"RTT {value('rtt_ms', 'ms')}, up {value('upload_mbps', 'Mbit/s')}, "
+            f"down {value('download_mbps', 'Mbit/s')}: {status}")
+
+
+if __name__ == "__main__":
+    import ast
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+    parser = argparse.ArgumentParser(
+        description="Measure RTT and ssh throughput to pods from this machine (run it on the proxy) "
+                    "and record the results per RunPod host.")
+    parser.add_argument("machine_names", nargs="*", help="Machines to measure (default: all of MACHINE_NAME_LIST)")
+    parser.add_argument("--bad-hosts", action="store_true", help="List hosts whose last qualification failed and exit")
+    parser.add_argument("--parallel", type=int, default=4,
+                        help="Pods to measure at the same time (too many skew the throughput results)")
+    args = parser.parse_args()
+
+    if args.bad_hosts:
+        bad_hosts = get_bad_hosts()
+        for host, result in sorted(bad_hosts.items()):
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(result["time"]))
+            print(f"{host:<24} {when}  {result['name'] or '-':<20} {'; '.join(result['reasons'])}")
+        print(f"{len(bad_hosts)} known bad hosts")
+        sys.exit(0)
+
+    from distribute import get_target_pods
+    pods = get_target_pods(args.machine_names or ast.literal_eval(os.environ["MACHINE_NAME_LIST"]))
+    thresholds = get_thresholds()
+
+    def run(pod):
+        # Measure every pod, even if its host failed before, so hosts can recover
+        result = qualify(pod.ssh_ip, pod.ssh_port, pod.machine_id, pod.name, thresholds, bad_hosts={})
+        print(f"{pod.name}: {format_result(result)}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        results = list(executor.map(run, pods))
+    failed = [r for r in results if not r["passed"]]
+    print(f"\n{len(results) - len(failed)}/{len(results)} pods passed")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+import os
+import sys
+import ast
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import runpod
+
+from mydotenv import load_env
+load_env()
+
+from resilience import retry_call, CircuitOpenError
+from inventory import get_accounts, get_all_pods, use_account_of
+from pod_utils import get_ssh_endpoint, wait_until_reachable, load_pins, update_pins
+from create_new_pods import create_pod_for_machine, load_public_key
+from vm_scheduler import update_nginx
+
+
+def create_replacement(machine_name, old_pod, pod_config, public_key_content, ready_timeout):
+    """
+    Create the replacement pod for one machine and wait until it accepts SSH.
+
+    Returns:
+        dict: {"machine", "old_id", "new_id", "error", "seconds"}
+    """
+    pod_name = f"{os.environ['MACHINE_NAME_PREFIX']}-{machine_name}"
+    start = time.monotonic()
+    outcome = {"machine": machine_name, "old_id": old_pod["id"], "new_id": None, "error": None}
+    try:
+        result = create_pod_for_machine(
+            pod_name,
+            public_key_content=public_key_content,
+            ignore_pod_ids=(old_pod["id"],),
+            **pod_config,
+        )
+        outcome["new_id"] = result["id"]
+        print(f"[{machine_name}] Created replacement pod {result['id']}, waiting for SSH...")
+        pod = wait_until_reachable(result["id"], timeout=ready_timeout)
+        if pod is None:
+            outcome["error"] = f"not reachable after {ready_timeout}s"
+        else:
+            ip, port = get_ssh_endpoint(pod)
+            print(f"[{machine_name}] Replacement ready at {ip}:{port}")
+    except CircuitOpenError:
+        raise
+    except Exception as e:
+        outcome["error"] = str(e)
+    outcome["seconds"] = time.monotonic() - start
+    return outcome
+
+
+def terminate(pod_id, label, pod=None, accounts=None):
+    """Terminate a pod; given its API dict `pod`, the call goes to the account that owns it."""
+    return remove_pod(runpod.terminate_pod, ("Terminated", "terminating"), pod_id, label, pod, accounts)
+
+
+def stop(pod_id, label, pod=None, accounts=None):
+    """Stop a pod; given its API dict `pod`, the call goes to the account that owns it."""
+    return remove_pod(runpod.stop_pod, ("Stopped", "stopping"), pod_id, label, pod, accounts)
+
+
+def remove_pod(action, verbs, pod_id, label, pod, accounts):
+    api_key = runpod.api_key
+    try:
+        if pod is not None:
+            use_account_of(pod, accounts)
+        retry_call(action, pod_id)
+        print(f"[{label}] {verbs[0]} pod {pod_id}")
+        return True
+    except Exception as e:
+        print(f"[{label}] Error {verbs[1]} pod {pod_id}: {str(e)}")
+        return False
+    finally:
+        # Keep the key the new pods are created (and cleaned up) with
+        runpod.api_key = api_key
+
+
+def use_first_account():
+    """
+    Point the runpod library at the first account, where the new pods are
+    created under its prefix, and return all accounts (exits if there are none).
+    """
+    accounts = get_accounts()
+    if not accounts:
+        print("Error: RUNPOD_API_KEY environment variable not set")
+        sys.exit(1)
+    runpod.api_key = accounts[0]["api_key"]
+    os.environ["MACHINE_NAME_PREFIX"] = accounts[0]["prefix"]
+    return accounts
+
+
+def find_current_pods(machine_names, accounts):
+    """
+    The pod currently serving each machine, across all accounts: its pinned pod
+    (e.g. a swapped-in standby pod), else the pod named after it.
+
+    Returns:
+        list: (machine_name, pod) for the machines that have a pod, in order.
+    """
+    pods = get_all_pods(accounts)
+    pods_by_name = {pod["name"]: pod for pod in pods}
+    pods_by_id = {pod["id"]: pod for pod in pods}
+    pins = load_pins()
+
+    found = []
+    for machine_name in machine_names:
+        pod = pods_by_id.get(pins.get(machine_name)) or next(
+            (pods_by_name[f"{a['prefix']}-{machine_name}"] for a in accounts
+             if f"{a['prefix']}-{machine_name}" in pods_by_name), None)
+        if pod is None:
+            print(f"- {machine_name}: no existing pod, skipping")
+            continue
+        found.append((machine_name, pod))
+    return found
+
+
+def rolling_replace(machine_names, pod_config, max_unavailable=5, parallelism=10,
+                    max_failures=3, ready_timeout=900, dry_run=False, skip_confirm=False):
+    """
+    Replace the pods of the given machines wave by wave.
+
+    For each machine a new pod is created alongside the old one. Once the new
+    pod answers on SSH, the machine's proxy port is pinned to it and nginx is
+    reloaded, and only then is the old pod terminated. At most
+    `max_unavailable` machines are mid-replacement at any time.
+    """
+    accounts = use_first_account()
+    plan = find_current_pods(machine_names, accounts)
+    old_pods = {old_pod["id"]: old_pod for _, old_pod in plan}
+
+    if not plan:
+        print("No pods to replace.")
+        return
+
+    print(f"\nReplacing {len(plan)} pods with:")
+    for key, value in pod_config.items():
+        print(f"  {key}: {value}")
+    print(f"  max unavailable: {max_unavailable}, parallelism: {parallelism}")
+    for machine_name, old_pod in plan:
+        print(f"- {machine_name} (old pod: {old_pod['id']}, image: {old_pod.get('imageName', 'N/A')})")
+
+    if dry_run:
+        print("\n[DRY RUN] No pods were created or terminated.")
+        return
+    if not skip_confirm:
+        confirmation = input("\nProceed with the rolling replace? (y/N): ")
+        if confirmation.lower() != "y":
+            print("Operation cancelled")
+            return
+
+    public_key_content = load_public_key()
+    start = time.monotonic()
+    replaced, failed = [], []
+    waves = [plan[i:i + max_unavailable] for i in range(0, len(plan), max_unavailable)]
+
+    for wave_index, wave in enumerate(waves, start=1):
+        print(f"\n--- Wave {wave_index}/{len(waves)}: {', '.join(m for m, _ in wave)} ---")
+        try:
+            with ThreadPoolExecutor(max_workers=min(parallelism, len(wave))) as executor:
+                outcomes = list(executor.map(
+                    lambda item: create_replacement(item[0], item[1], pod_config, public_key_content, ready_timeout),
+                    wave,
+                ))
+        except CircuitOpenError as e:
+            print(f"\nRunPod API appears to be down, stopping the rollout: {str(e)}")
+            print("Check list_pods.py for replacement pods that may have been created in this wave.")
+            break
+
+        ready = [o for o in outcomes if o["error"] is None]
+        for o in outcomes:
+            if o["error"] is not None:
+                print(f"[{o['machine']}] Replacement failed: {o['error']} (old pod kept)")
+                if o["new_id"]:
+                    terminate(o["new_id"], o["machine"])
+                failed.append(o)
+
+        if ready:
+            # Swap all ready machines of this wave with a single nginx reload
+            update_pins({o["machine"]: o["new_id"] for o in ready})
+            if not update_nginx(dry_run=False, reload=True):
+                print("Error: could not update the proxy, keeping old pods and stopping here.")
+                failed.extend(ready)
+                break
+            for o in ready:
+                terminate(o["old_id"], o["machine"], pod=old_pods[o["old_id"]], accounts=accounts)
+                replaced.append(o)
+
+        if len(failed) > max_failures:
+            print(f"\nAborting: {len(failed)} replacements failed (max {max_failures}).")
+            break
+
+    print("\n--- Rolling Replace Summary ---")
+    print(f"Replaced: {len(replaced)}/{len(plan)}")
+    if replaced:
+        slowest = max(o["seconds"] for o in replaced)
+        print(f"Slowest replacement: {slowest:.0f}s")
+    print(f"Failed: {len(failed)}")
+    for o in failed:
+        print(f"  - {o['machine']}: {o['error'] or 'proxy update failed'}")
+    print(f"Total time: {time.monotonic() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Replace pods with a new image/GPU type without taking the whole cohort offline. "
+                    "Run this on the proxy machine, as it updates the nginx config.")
+    parser.add_argument("machine_names", nargs="*", default=[],
+                        help="Machines to replace (default: all machines in MACHINE_NAME_LIST that have a pod)")
+    parser.add_argument("--exclude", nargs="+", default=[], help="Machines to leave alone")
+    parser.add_argument("--gpu-type", help="GPU type for the new pods (overrides RUNPOD_GPU_TYPE env var)")
+    parser.add_argument("--gpu-count", type=int, help="GPUs per new pod (overrides RUNPOD_NUM_GPUS env var)")
+    parser.add_argument("--cloud-type", choices=["COMMUNITY", "SECURE"],
+                        help="RunPod cloud type (overrides RUNPOD_CLOUD_TYPE env var)")
+    parser.add_argument("--docker-image", help="Docker image for the new pods (overrides RUNPOD_DOCKER_IMAGE env var)")
+    parser.add_argument("--disk-space-in-gb", type=int, help="Disk space in GB (overrides RUNPOD_DISK_SPACE_IN_GB env var)")
+    parser.add_argument("--volume-space-in-gb", type=int, help="Volume space in GB (overrides RUNPOD_VOLUME_SPACE_IN_GB env var)")
+    parser.add_argument("--max-unavailable", type=int, default=5,
+                        help="Maximum number of machines being replaced at the same time (wave size)")
+    parser.add_argument("--parallelism", type=int, default=int(os.getenv("MAX_PARALLEL", "10")),
+                        help="Maximum number of concurrent create/wait operations within a wave")
+    parser.add_argument("--max-failures", type=int, default=3, help="Abort after this many failed replacements")
+    parser.add_argument("--ready-timeout", type=int, default=900, help="Seconds to wait for a new pod to accept SSH")
+    parser.add_argument("--dry-run", action="store_true", help="Only show what would be replaced")
+    parser.add_argument("--yes", "-y", action="store_true", help="Skip confirmation prompts")
+    args = parser.parse_args()
+
+    machine_names = args.machine_names or ast.literal_eval(os.environ["MACHINE_NAME_LIST"])
+    machine_names = [m for m in machine_names if m not in args.exclude]
+
+    pod_config = {
+        "gpu_type_id": args.gpu_type or os.environ["RUNPOD_GPU_TYPE"],
+        "gpu_count": args.gpu_count or int(os.environ["RUNPOD_NUM_GPUS"]),
+        "runpod_cloud_type": args.cloud_type or os.environ["RUNPOD_CLOUD_TYPE"],
+        "docker_image": args.docker_image or os.environ["RUNPOD_DOCKER_IMAGE"],
+        "disk_space_in_gb": args.disk_space_in_gb or int(os.environ["RUNPOD_DISK_SPACE_IN_GB"]),
+        "volume_space_in_gb": args.volume_space_in_gb or int(os.environ["RUNPOD_VOLUME_SPACE_IN_GB"]),
+    }
+
+    rolling_replace(
+        machine_names,
+        pod_config,
+        max_unavailable=max(1, args.max_unavailable),
+        parallelism=max(1, args.parallelism),
+        max_failures=args.max_failures,
+        ready_timeout=args.ready_timeout,
+        dry_run=args.dry_run,
+        skip_confirm=args.yes,
+    )
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+import os
+import sys
+import ast
+import json
+import time
+import zlib
+import shlex
+import struct
+import hashlib
+import tarfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mydotenv import load_env
+load_env()
+
+from pod_utils import ssh_args, load_pins
+from snapshot_pod import MISSING_CHUNK
+
+# Same marker as migrate.py: files older than this came with the image and are not stored
+IMAGE_BASELINE_MARKER = "/root/.arena_infra/.image_baseline"
+CHUNK_SIZE = 4 * 1024 * 1024
+POD_SCRIPT = (Path(__file__).parent / "snapshot_pod.py").read_text()
+
+
+def get_store_path():
+    return os.path.expanduser(os.getenv("SNAPSHOT_STORE_PATH", "~/snapshots"))
+
+
+def get_snapshot_paths():
+    return ast.literal_eval(os.getenv("MIGRATE_PATHS", "['/root/ARENA_3.0', '/workspace']"))
+
+
+def chunk_path(store, digest):
+    return os.path.join(store, "chunks", digest[:2], digest)
+
+
+class ChunkStore:
+    """
+    Content-addressed chunk store: each chunk is kept once, zlib-compressed,
+    under chunks/<first 2 hex digits>/<sha256>, however many snapshots use it.
+
+    Chunks being fetched by one pod's snapshot are claimed, so pods sharing
+    the same new files (e.g. the same git pull) only upload them once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.condition = threading.Condition()
+        self.in_flight = set()
+
+    def has(self, digest):
+        return os.path.exists(chunk_path(self.path, digest))
+
+    def claim(self, digests):
+        """Claim the missing chunks nobody else is fetching. Returns (mine, others')."""
+        mine, others = [], []
+        with self.condition:
+            for digest in digests:
+                if self.has(digest):
+                    continue
+                if digest in self.in_flight:
+                    others.append(digest)
+                else:
+                    self.in_flight.add(digest)
+                    mine.append(digest)
+        return mine, others
+
+    def release(self, digests):
+        with self.condition:
+            self.in_flight.difference_update(digests)
+            self.condition.notify_all()
+
+    def wait_for(self, digests):
+        """Wait until other snapshots are done with these chunks; returns the ones still missing."""
+        with self.condition:
+            self.condition.wait_for(lambda: not any(d in self.in_flight for d in digests))
+        return [d for d in digests if not self.has(d)]
+
+    def put(self, digest, compressed):
+        path = chunk_path(self.path, digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+
+    def read(self, digest):
+        with open(chunk_path(self.path, digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+
+def run_pod_script(pod, args):
+    command = f"python3 -c {shlex.quote(POD_SCRIPT)} {shlex.join(args)}"
+    return subprocess.run(ssh_args(pod.ssh_ip, pod.ssh_port) + [command], capture_output=True)
+
+
+def fetch_chunks(pod, store, manifest, digests):
+    """Download the given chunks from the pod into the store, verifying each one."""
+    if not digests:
+        return 0
+    wanted = set(digests)
+    requests, order = [], []
+    for entry in manifest["files"]:
+        for i, digest in enumerate(entry.get("chunks", [])):
+            if digest in wanted:
+                wanted.discard(digest)
+                requests.append([entry["path"], i * manifest["chunk_size"], manifest["chunk_size"]])
+                order.append(digest)
+
+    command = f"python3 -c {shlex.quote(POD_SCRIPT)} send"
+    sender = subprocess.Popen(ssh_args(pod.ssh_ip, pod.ssh_port) + [command],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    sender.stdin.write(json.dumps(requests).encode())
+    sender.stdin.close()
+    received = 0
+    try:
+        for digest in order:
+            header = sender.stdout.read(4)
+            if len(header) < 4:
+                break
+            (length,) = struct.unpack(">I", header)
+            if length == MISSING_CHUNK:
+                continue
+            compressed = sender.stdout.read(length)
+            # A file that changed since the scan no longer matches; it is left out of this snapshot
+            if hashlib.sha256(zlib.decompress(compressed)).hexdigest() != digest:
+                continue
+            store.put(digest, compressed)
+            received += len(compressed)
+    finally:
+        sender.stdout.close()
+        sender.wait()
+    if sender.returncode != 0:
+        raise RuntimeError(f"reading chunks failed: {sender.stderr.read().decode().strip()}")
+    return received
+
+
+def machine_for_pod(pod, pins):
+    """Machine a pod serves: its pin, or its name without MACHINE_NAME_PREFIX."""
+    for machine, pod_id in pins.items():
+        if pod_id == pod.id:
+            return machine
+    prefix = f"{os.environ['MACHINE_NAME_PREFIX']}-"
+    return pod.name[len(prefix):] if pod.name.startswith(prefix) else pod.name
+
+
+def take_snapshot(pod, machine, store, paths):
+    """
+    Snapshot one pod: scan it, upload only the chunks the store doesn't have
+    yet, and save the manifest.
+
+    Returns:
+        dict: {"machine", "files", "bytes" (compressed bytes uploaded), "seconds", "manifest"}
+    """
+    start = time.monotonic()
+    result = run_pod_script(pod, ["scan", IMAGE_BASELINE_MARKER, str(CHUNK_SIZE)] + paths)
+    if result.returncode != 0:
+        raise RuntimeError(f"scan failed: {result.stderr.decode().strip()}")
+    manifest = json.loads(result.stdout)
+
+    digests = list(dict.fromkeys(d for entry in manifest["files"] for d in entry.get("chunks", [])))
+    mine, others = store.claim(digests)
+    try:
+        uploaded = fetch_chunks(pod, store, manifest, mine)
+    finally:
+        store.release(mine)
+    # Chunks another pod was fetching may have failed there; fetch whatever is still missing
+    uploaded += fetch_chunks(pod, store, manifest, store.wait_for(others))
+
+    # Only keep files whose chunks all made it (files that changed mid-snapshot are skipped)
+    manifest["files"] = [entry for entry in manifest["files"]
+                         if all(store.has(d) for d in entry.get("chunks", []))]
+    manifest.update({
+        "machine": machine,
+        "pod_id": pod.id,
+        "pod_name": pod.name,
+        "paths": paths,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+    snapshot_dir = os.path.join(store.path, "snapshots", machine)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    snapshot_file = os.path.join(snapshot_dir, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    with open(snapshot_file, "w") as f:
+        json.dump(manifest, f)
+    return {"machine": machine, "files": len(manifest["files"]), "bytes": uploaded,
+            "seconds": time.monotonic() - start, "manifest": snapshot_file}
+
+
+def take_snapshots(pods, parallel=10, paths=None):
+    """
+    Snapshot several pods (pod_model.Pod records) at the same time.
+
+    Returns:
+        dict: pod name -> (result, error); error is None on success.
+    """
+    store = ChunkStore(get_store_path())
+    paths = paths or get_snapshot_paths()
+    pins = load_pins()
+
+    def run(pod):
+        machine = machine_for_pod(pod, pins)
+        try:
+            if not pod.reachable:
+                raise RuntimeError("pod has no public SSH port")
+            result = take_snapshot(pod, machine, store, paths)
+            print(f"[{machine}] ✓ snapshot: {result['files']} files, "
+                  f"{result['bytes'] / 1e6:.1f} MB new in {result['seconds']:.0f}s")
+            return pod.name, (result, None)
+        except Exception as e:
+            print(f"[{machine}] ✗ snapshot failed: {str(e)}")
+            return pod.name, (None, str(e))
+
+    if not pods:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        return dict(executor.map(run, pods))
+
+
+def list_snapshots(store_path, machine=None):
+    snapshots_dir = os.path.join(store_path, "snapshots")
+    if not os.path.isdir(snapshots_dir):
+        return {}
+    machines = [machine] if machine else sorted(os.listdir(snapshots_dir))
+    return {m: sorted(os.listdir(os.path.join(snapshots_dir, m)))
+            for m in machines if os.path.isdir(os.path.join(snapshots_dir, m))}
+
+
+class ChunkReader:
+    """Read a stored file back, chunk by chunk, for tarfile.addfile."""
+
+    def __init__(self, store, chunks):
+        self.store = store
+        self.chunks = list(chunks)
+        self.next_chunk = 0
+        self.current = b""
+        # Position in the current chunk; slicing the rest off on every read would copy it each time
+        self.offset = 0
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if self.offset == len(self.current):
+                if self.next_chunk == len(self.chunks):
+                    break
+                self.current = self.store.read(self.chunks[self.next_chunk])
+                self.next_chunk += 1
+                self.offset = 0
+                continue
+            end = len(self.current) if size < 0 else min(len(self.current), self.offset + size)
+            parts.append(self.current[self.offset:end])
+            if size > 0:
+                size -= end - self.offset
+            self.offset = end
+        return b"".join(parts)
+
+
+def restore(manifest_path, pod):
+    """Stream the files of a snapshot onto a pod as a tar, straight from the chunk store."""
+    store = ChunkStore(get_store_path())
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    unpack = subprocess.Popen(ssh_args(pod.ssh_ip, pod.ssh_port) + ["tar -xpf - -C /"],
+                              stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        with tarfile.open(fileobj=unpack.stdin, mode="w|") as tar:
+            for entry in manifest["files"]:
+                info = tarfile.TarInfo(entry["path"].lstrip("/"))
+                info.mtime = entry["mtime"]
+                if "link" in entry:
+                    info.type = tarfile.SYMTYPE
+                    info.linkname = entry["link"]
+                    tar.addfile(info)
+                else:
+                    info.size = entry["size"]
+                    info.mode = entry["mode"]
+                    tar.addfile(info, ChunkReader(store, entry["chunks"]))
+    finally:
+        unpack.stdin.close()
+        unpack.wait()
+    if unpack.returncode != 0:
+        raise RuntimeError(f"unpacking on the pod failed: {unpack.stderr.read().decode().strip()}")
+    return len(manifest["files"])
+
+
+def prune(store_path, keep):
+    """Keep the newest `keep` snapshots per machine and delete chunks no snapshot uses."""
+    removed = 0
+    for machine, names in list_snapshots(store_path).items():
+        for name in names[:-keep] if keep > 0 else names:
+            os.remove(os.path.join(store_path, "snapshots", machine, name))
+            removed += 1
+
+    used = set()
+    for machine, names in list_snapshots(store_path).items():
+        for name in names:
+            with open(os.path.join(store_path, "snapshots", machine, name)) as f:
+                for entry in json.load(f)["files"]:
+                    used.update(entry.get("chunks", []))
+    freed = 0
+    chunks_dir = os.path.join(store_path, "chunks")
+    for root, _, names in os.walk(chunks_dir):
+        for name in names:
+            if name not in used:
+                path = os.path.join(root, name)
+                freed += os.path.getsize(path)
+                os.remove(path)
+    return removed, freed
+
+
+def get_pods_for_machines(machine_names):
+    """Reachable Pod records serving the given machines."""
+    from distribute import get_target_pods
+    return get_target_pods(machine_names)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Deduplicated workspace snapshots in a content-addressed store (SNAPSHOT_STORE_PATH). "
+                    "Run this on the proxy machine so the store lives there.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    take_parser = subparsers.add_parser("take", help="Snapshot pods (default: all of MACHINE_NAME_LIST)")
+    take_parser.add_argument("machine_names", nargs="*")
+    take_parser.add_argument("--parallel", type=int, default=int(os.getenv("MAX_PARALLEL", "10")))
+    list_parser = subparsers.add_parser("list", help="List stored snapshots")
+    list_parser.add_argument("machine_name", nargs="?")
+    restore_parser = subparsers.add_parser("restore", help="Restore a machine's snapshot onto a pod")
+    restore_parser.add_argument("machine_name", help="Machine whose snapshot to restore")
+    restore_parser.add_argument("--to", help="Machine to restore onto (default: the same machine)")
+    restore_parser.add_argument("--at", help="Snapshot to restore, e.g. 20250113T102030Z (default: latest)")
+    prune_parser = subparsers.add_parser("prune", help="Delete old snapshots and unused chunks")
+    prune_parser.add_argument("--keep", type=int, default=3, help="Snapshots to keep per machine")
+    args = parser.parse_args()
+
+    store_path = get_store_path()
+    if args.command == "take":
+        machine_names = args.machine_names or ast.literal_eval(os.environ["MACHINE_NAME_LIST"])
+        start = time.monotonic()
+        results = take_snapshots(get_pods_for_machines(machine_names), parallel=args.parallel)
+        failed = [name for name, (_, error) in results.items() if error is not None]
+        uploaded = sum(result["bytes"] for result, _ in results.values() if result)
+        print(f"\nSnapshotted {len(results) - len(failed)}/{len(results)} pods, "
+              f"{uploaded / 1e6:.1f} MB new in {time.monotonic() - start:.0f}s")
+        sys.exit(1 if failed else 0)
+    elif args.command == "list":
+        for machine, names in list_snapshots(store_path, args.machine_name).items():
+            print(f"{machine}: {', '.join(name[:-len('.json')] for name in names)}")
+    elif args.command == "restore":
+        names = list_snapshots(store_path, args.machine_name).get(args.machine_name)
+        if not names:
+            print(f"Error: no snapshots of {args.machine_name}")
+            sys.exit(1)
+        name = f"{args.at}.json" if args.at else names[-1]
+        if name not in names:
+            print(f"Error: snapshot {args.at} of {args.machine_name} not found")
+            sys.exit(1)
+        pods = get_pods_for_machines([args.to or args.machine_name])
+        if not pods:
+            sys.exit(1)
+        count = restore(os.path.join(store_path, "snapshots", args.machine_name, name), pods[0])
+        print(f"✓ Restored {count} files of {args.machine_name} ({name[:-len('.json')]}) onto {pods[0].name}")
+    elif args.command == "prune":
+        removed, freed = prune(store_path, args.keep)
+        print(f"Removed {removed} snapshots and {freed / 1e6:.1f} MB of unused chunks")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Pod side of snapshot.py. Its source is sent over ssh and run with the pod's
+python3, so it only uses the standard library and needs nothing installed.
+
+    scan <baseline marker> <chunk size> <path>...
+        Print a JSON manifest of every file under the paths changed since the
+        image baseline, with the sha256 of each fixed-size chunk. Hashes are
+        cached by (size, mtime), so unchanged files are not read again.
+    send
+        Read a JSON list of [path, offset, length] from stdin and write each
+        chunk to stdout as a 4-byte big-endian length and zlib-compressed data,
+        or only MISSING_CHUNK as the length if the file can no longer be read.
+"""
+import os
+import sys
+import json
+import stat
+import zlib
+import struct
+import hashlib
+
+CACHE_PATH = os.path.expanduser("~/.arena_snapshot_cache.json")
+MISSING_CHUNK = 0xFFFFFFFF
+
+
+def load_cache():
+    try:
+        with open(CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def hash_chunks(path, chunk_size):
+    chunks = []
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            chunks.append(hashlib.sha256(data).hexdigest())
+    return chunks
+
+
+def scan(baseline, chunk_size, paths):
+    baseline_mtime = os.stat(baseline).st_mtime if os.path.exists(baseline) else 0
+    cache = load_cache()
+    new_cache = {}
+    files = []
+    for top in paths:
+        for root, dirs, names in os.walk(top):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                # Temp and lock files come and go on a live pod
+                try:
+                    st = os.lstat(path)
+                    if st.st_mtime <= baseline_mtime:
+                        continue
+                    if stat.S_ISLNK(st.st_mode):
+                        files.append({"path": path, "link": os.readlink(path), "mtime": st.st_mtime})
+                        continue
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                key = [st.st_size, st.st_mtime_ns]
+                cached = cache.get(path)
+                if cached and cached[0] == key:
+                    chunks = cached[1]
+                else:
+                    try:
+                        chunks = hash_chunks(path, chunk_size)
+                    except OSError:
+                        continue
+                new_cache[path] = [key, chunks]
+                files.append({"path": path, "mode": st.st_mode & 0o7777, "mtime": st.st_mtime,
+                              "size": st.st_size, "chunks": chunks})
+
+    tmp_path = CACHE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(new_cache, f)
+    os.replace(tmp_path, CACHE_PATH)
+    json.dump({"chunk_size": chunk_size, "files": files}, sys.stdout)
+
+
+def send():
+    out = sys.stdout.buffer
+    for path, offset, length in json.load(sys.stdin):
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = zlib.compress(f.read(length), 1)
+        except OSError:
+            # Deleted since the scan
+            out.write(struct.pack(">I", MISSING_CHUNK))
+            continue
+        out.write(struct.pack(">I", len(data)))
+        out.write(data)
+    out.flush()
+
+
+if __name__ == "__main__":
+    if sys.argv[1] == "scan":
+        scan(sys.argv[2], int(sys.argv[3]), sys.argv[4:])
+    elif sys.argv[1] == "send":
+        send()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Keep interruptible (spot) machines available when RunPod preempts them.
+
+Watches the inventory like pod_watch.py. When an interruptible pod serving a
+machine is stopped by RunPod (rather than by stop_pods.py, which RunPod
+records as stopped "by user"), a new pod is created under the same machine
+name, the machine's latest snapshot is restored onto it, and the proxy is
+pointed at it. Running interruptible pods are snapshotted every
+SPOT_SNAPSHOT_INTERVAL minutes, so there is always a recent workspace to
+restore. Run this on the proxy machine, as it updates the nginx config.
+"""
+import os
+import sys
+import ast
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import runpod
+
+from mydotenv import load_env
+load_env()
+
+from resilience import retry_call, CircuitOpenError
+from inventory import get_accounts, get_account_pods
+from pod_model import Pod, PodStatus, parse_pods, filter_pods
+from pod_utils import load_pins, update_pins
+from pod_watch import InventoryWatcher, STOPPED, log_events
+from create_new_pods import load_public_key
+from rolling_replace import create_replacement, terminate
+from snapshot import take_snapshots, restore, list_snapshots, get_store_path
+from vm_scheduler import update_nginx
+
+
+def get_pod_config(interruptible=True):
+    bid = os.getenv("RUNPOD_BID_PER_GPU")
+    return {
+        "gpu_type_id": os.environ["RUNPOD_GPU_TYPE"],
+        "gpu_count": int(os.environ["RUNPOD_NUM_GPUS"]),
+        "runpod_cloud_type": os.environ["RUNPOD_CLOUD_TYPE"],
+        "docker_image": os.environ["RUNPOD_DOCKER_IMAGE"],
+        "disk_space_in_gb": int(os.environ["RUNPOD_DISK_SPACE_IN_GB"]),
+        "volume_space_in_gb": int(os.environ["RUNPOD_VOLUME_SPACE_IN_GB"]),
+        "interruptible": interruptible,
+        "bid_per_gpu": float(bid) if bid and interruptible else None,
+    }
+
+
+def is_preempted(state):
+    """An interruptible pod that was stopped, but not by a user (stop_pods.py, the website)."""
+    reason = (state.get("status_change") or "").partition(": ")[0]
+    return state["interruptible"] and state["status"] == "EXITED" and "user" not in reason.lower()
+
+
+def serving_machine(pod_id, pod_name, pins, prefix, machine_names):
+    """
+    Machine a pod is currently serving, or None: its pin, or its name without
+    the prefix as long as no pin points the machine at another pod.
+    """
+    for machine, pinned_id in pins.items():
+        if pinned_id == pod_id:
+            return machine
+    if not pod_name.startswith(f"{prefix}-"):
+        return None
+    machine = pod_name[len(prefix) + 1:]
+    if machine not in machine_names or pins.get(machine, pod_id) != pod_id:
+        return None
+    return machine
+
+
+class SpotSupervisor:
+    """
+    Recover preempted machines in the background while the inventory keeps
+    being polled, so one slow recovery doesn't delay noticing the next.
+    """
+
+    def __init__(self, account, machine_names, parallel=5, ready_timeout=900,
+                 on_demand_fallback=False, keep_old=False, dry_run=False):
+        self.account = account
+        self.prefix = account["prefix"]
+        self.machine_names = set(machine_names)
+        self.ready_timeout = ready_timeout
+        self.on_demand_fallback = on_demand_fallback
+        self.keep_old = keep_old
+        self.dry_run = dry_run
+        self.public_key_content = load_public_key()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, parallel))
+        self.recovering = set()
+        self.snapshotting = False
+        self.lock = threading.Lock()
+        # Pins and the nginx config are shared by all recoveries
+        self.proxy_lock = threading.Lock()
+
+    def handle_events(self, events):
+        pins = load_pins()
+        for event in events:
+            if event.type != STOPPED or not is_preempted(event.new):
+                continue
+            machine = serving_machine(event.pod_id, event.name, pins, self.prefix, self.machine_names)
+            if machine is None:
+                continue
+            self.submit_recovery(machine, event.pod_id)
+
+    def submit_recovery(self, machine, old_id):
+        with self.lock:
+            if machine in self.recovering:
+                return
+            self.recovering.add(machine)
+        print(f"[{machine}] Pod {old_id} was preempted, recovering...")
+        self.executor.submit(self.recover_safely, machine, old_id)
+
+    def recover_safely(self, machine, old_id):
+        try:
+            self.recover(machine, old_id)
+        except Exception as e:
+            print(f"[{machine}] ✗ Recovery failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.recovering.discard(machine)
+
+    def create_pod(self, machine, old_id):
+        """Create the new pod, falling back to on-demand if allowed and no spot pod can be had."""
+        outcome = create_replacement(machine, {"id": old_id}, get_pod_config(), self.public_key_content,
+                                     self.ready_timeout)
+        if outcome["error"] is not None and self.on_demand_fallback:
+            print(f"[{machine}] No interruptible pod ({outcome['error']}), falling back to on-demand")
+            if outcome["new_id"]:
+                terminate(outcome["new_id"], machine)
+            outcome = create_replacement(machine, {"id": old_id}, get_pod_config(interruptible=False),
+                                         self.public_key_content, self.ready_timeout)
+        return outcome
+
+    def recover(self, machine, old_id):
+        """Recreate one preempted machine, restore its workspace and route the proxy to it."""
+        start = time.monotonic()
+        store_path = get_store_path()
+        snapshots = list_snapshots(store_path, machine).get(machine)
+        if self.dry_run:
+            print(f"[DRY RUN] [{machine}] Would create a new pod, restore "
+                  f"{snapshots[-1] if snapshots else 'no snapshot'} and update nginx")
+            return
+
+        outcome = self.create_pod(machine, old_id)
+        if outcome["error"] is not None:
+            if outcome["new_id"]:
+                terminate(outcome["new_id"], machine)
+            raise RuntimeError(f"could not create a new pod: {outcome['error']}")
+        new_pod = Pod.from_api(retry_call(runpod.get_pod, outcome["new_id"]))
+
+        restored = False
+        if snapshots:
+            try:
+                count = restore(os.path.join(store_path, "snapshots", machine, snapshots[-1]), new_pod)
+                print(f"[{machine}] Restored {count} files from snapshot {snapshots[-1][:-len('.json')]}")
+                restored = True
+            except Exception as e:
+                print(f"[{machine}] Restoring the snapshot failed: {str(e)}")
+        else:
+            print(f"[{machine}] No snapshot to restore, the new pod starts from the image")
+
+        with self.proxy_lock:
+            update_pins({machine: new_pod.id})
+            routed = update_nginx(dry_run=False, reload=True)
+        if not routed:
+            raise RuntimeError("could not update the proxy; re-run nginx_pods.py to apply the pins")
+
+        # Without a restored snapshot the old pod is kept (stopped), in case its volume has anything left
+        if restored and not self.keep_old:
+            terminate(old_id, machine)
+        print(f"[{machine}] ✓ Recovered onto {new_pod.id} in {time.monotonic() - start:.0f}s")
+
+    def get_interruptible_pods(self):
+        """Running, reachable interruptible pods of this account that serve a machine."""
+        pods = filter_pods(parse_pods(get_account_pods(self.account)), status=PodStatus.RUNNING, reachable=True)
+        pins = load_pins()
+        return [pod for pod in pods if pod.interruptible
+                and serving_machine(pod.id, pod.name, pins, self.prefix, self.machine_names)]
+
+    def submit_snapshots(self, parallel):
+        """Snapshot the running interruptible pods in the background, unless a round is still going."""
+        with self.lock:
+            if self.snapshotting:
+                return
+            self.snapshotting = True
+
+        def run():
+            try:
+                pods = self.get_interruptible_pods()
+                if self.dry_run:
+                    print(f"[DRY RUN] Would snapshot {len(pods)} interruptible pods")
+                    return
+                results = take_snapshots(pods, parallel=parallel)
+                failed = sum(1 for _, error in results.values() if error is not None)
+                print(f"Snapshotted {len(results) - failed}/{len(results)} interruptible pods")
+            except Exception as e:
+                print(f"Error snapshotting interruptible pods: {str(e)}")
+            finally:
+                with self.lock:
+                    self.snapshotting = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Recreate preempted interruptible pods under the same machine name, restore their "
+                    "latest snapshot and update the proxy. Run this on the proxy machine.")
+    parser.add_argument("--recover", nargs="+", metavar="MACHINE",
+                        help="Recover these machines now (e.g. preempted while the supervisor wasn't running) and exit")
+    parser.add_argument("--account", help="RUNPOD_ACCOUNTS account to supervise (default: the first one)")
+    parser.add_argument("--interval", type=float, default=float(os.getenv("WATCH_INTERVAL", "15")),
+                        help="Seconds between inventory polls (overrides WATCH_INTERVAL env var)")
+    parser.add_argument("--snapshot-interval", type=float, default=float(os.getenv("SPOT_SNAPSHOT_INTERVAL", "30")),
+                        help="Minutes between snapshots of the interruptible pods, 0 to disable "
+                             "(overrides SPOT_SNAPSHOT_INTERVAL env var)")
+    parser.add_argument("--parallel", type=int, default=int(os.getenv("MAX_PARALLEL", "10")),
+                        help="Number of machines to recover (and pods to snapshot) at the same time")
+    parser.add_argument("--on-demand-fallback", action="store_true",
+                        help="Create an on-demand pod if no interruptible pod is available at the bid")
+    parser.add_argument("--keep-old", action="store_true", help="Keep the preempted pods instead of terminating them")
+    parser.add_argument("--ready-timeout", type=int, default=900, help="Seconds to wait for a new pod to accept SSH")
+    parser.add_argument("--dry-run", action="store_true", help="Print what would be done without doing it")
+    args = parser.parse_args()
+
+    accounts = get_accounts()
+    if args.account:
+        accounts = [a for a in accounts if a["name"] == args.account]
+    if not accounts:
+        print(f"Error: account '{args.account}' not found in RUNPOD_ACCOUNTS (or its API key is not set)"
+              if args.account else "Error: RUNPOD_API_KEY environment variable not set")
+        sys.exit(1)
+    # New pods are created in this account, under its prefix
+    account = accounts[0]
+    runpod.api_key = account["api_key"]
+    os.environ["MACHINE_NAME_PREFIX"] = account["prefix"]
+
+    supervisor = SpotSupervisor(
+        account, ast.literal_eval(os.environ["MACHINE_NAME_LIST"]), parallel=args.parallel,
+        ready_timeout=args.ready_timeout, on_demand_fallback=args.on_demand_fallback,
+        keep_old=args.keep_old, dry_run=args.dry_run,
+    )
+
+    if args.recover:
+        pods_by_name = {pod["name"]: pod for pod in get_account_pods(account)}
+        pins = load_pins()
+        for machine in args.recover:
+            pod = pods_by_name.get(f"{account['prefix']}-{machine}")
+            old_id = pins.get(machine) or (pod["id"] if pod else None)
+            if old_id is None:
+                print(f"- {machine}: no existing pod, skipping")
+                continue
+            supervisor.submit_recovery(machine, old_id)
+        supervisor.executor.shutdown(wait=True)
+        sys.exit(0)
+
+    watcher = InventoryWatcher([account], interval=args.interval)
+    watcher.subscribe(log_events)
+    watcher.subscribe(supervisor.handle_events)
+    print(f"Supervising interruptible pods of account '{account['name']}' every {args.interval:g}s...")
+    next_snapshot = time.monotonic()
+    while True:
+        try:
+            watcher.poll()
+        except CircuitOpenError as e:
+            print(f"RunPod API appears to be down: {str(e)}")
+        except Exception as e:
+            print(f"Error polling inventory: {str(e)}")
+        if args.snapshot_interval > 0 and time.monotonic() >= next_snapshot:
+            supervisor.submit_snapshots(args.parallel)
+            next_snapshot = time.monotonic() + args.snapshot_interval * 60
+        time.sleep(watcher.next_interval())
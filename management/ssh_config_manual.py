@@ -1,62 +1,52 @@
 #!/usr/bin/env python3
-import runpod
 import os
-from datetime import datetime
 
 from mydotenv import load_env
 load_env()
 
+from inventory import get_accounts, get_pools, get_all_pods
+from pod_model import parse_pods, sort_pods, filter_pods
+
 def generate_ssh_config(verbose=False):
-    # Get API key from environment
-    api_key = os.getenv("RUNPOD_API_KEY")
-    if not api_key:
+    # Get API keys from environment (RUNPOD_ACCOUNTS, or just RUNPOD_API_KEY)
+    accounts = get_accounts()
+    if not accounts:
         print("# Error: RUNPOD_API_KEY environment variable not set")
         return
-    runpod.api_key = api_key
 
     # Get SSH configuration from environment
-    machine_name_prefix: str = os.getenv("MACHINE_NAME_PREFIX")
     ssh_user: str = os.getenv("SSH_USER")
     ssh_key_path: str = os.getenv("SHARED_SSH_KEY_PATH")
 
     try:
-        # Get all pods
+        # Get all pods, from all accounts
         if verbose:
-            print("# Fetching pods...")
-        pods = runpod.get_pods()
+            print(f"# Fetching pods from {len(accounts)} account(s)...")
+        pods = get_all_pods(accounts)
 
         if not pods:
             print("# No pods found")
             return
 
         # Sort pods by name
-        pods = sorted(pods, key=lambda x: x['name'])
+        pods = sort_pods(parse_pods(pods), "name")
 
-        # Generate SSH config header
-        ssh_config = f"""Host {machine_name_prefix}*
+        # Generate SSH config header, one per machine name prefix
+        ssh_config = ""
+        for machine_name_prefix, _ in get_pools(accounts):
+            ssh_config += f"""Host {machine_name_prefix}*
     User {ssh_user}
     StrictHostKeyChecking no
     UserKnownHostsFile /dev/null
     IdentityFile {ssh_key_path}
 """
 
-        # Generate SSH config for each pod
-        for pod in pods:
-            try:
-                # Get the public IP and port for SSH (type 'tcp')
-                ssh_port = next((str(p['publicPort']) for p in pod['runtime']['ports']
-                               if p['type'] == 'tcp' and p['isIpPublic']), None)
-                public_ip = next((p['ip'] for p in pod['runtime']['ports']
-                                if p['type'] == 'tcp' and p['isIpPublic']), None)
-
-                if ssh_port and public_ip:
-                    ssh_config += f"""
-Host {pod['name']}
-    HostName {public_ip}
-    Port {ssh_port}"""
-
-            except Exception as e:
-                print(f"# Error processing pod {pod.get('name', 'unknown')}: {e}")
+        # Generate SSH config for each pod with a public SSH endpoint
+        for pod in filter_pods(pods, reachable=True):
+            ssh_config += f"""
+Host {pod.name}
+    HostName {pod.ssh_ip}
+    Port {pod.ssh_port}"""
 
         print(ssh_config)
 
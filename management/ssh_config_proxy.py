@@ -3,24 +3,39 @@ import ast
 from mydotenv import load_env
 load_env()
 
-machine_name_prefix: str = os.getenv("MACHINE_NAME_PREFIX")
+from inventory import get_pools
+from sharding import get_proxy_hosts, assign
+
 machine_name_list: list[str] = ast.literal_eval(os.getenv("MACHINE_NAME_LIST"))
-proxy_starting_port: int = int(os.getenv("SSH_PROXY_STARTING_PORT"))
 ssh_user: str = os.getenv("SSH_PROXY_USER")
-ssh_host: str = os.getenv("SSH_PROXY_HOST")
+proxy_hosts: list[str] = get_proxy_hosts()
 ssh_key_path: str = os.getenv("SHARED_SSH_KEY_PATH")
 
-ssh_config = f"""Host {machine_name_prefix}*
+# With several proxies each machine gets the HostName of the proxy it is hashed to
+# (ssh uses the first value it finds, so then the shared block must not set one)
+sharded = len(proxy_hosts) > 1
+hostname_line = "" if sharded else f"  HostName {proxy_hosts[0]}\n"
+
+# One block of ports per pool (machine name prefix + starting port), see RUNPOD_ACCOUNTS
+ssh_config = ""
+for machine_name_prefix, proxy_starting_port in get_pools():
+    ssh_config += f"""Host {machine_name_prefix}*
   User {ssh_user}
-  HostName {ssh_host}
-  StrictHostKeyChecking no
+{hostname_line}  StrictHostKeyChecking no
   UserKnownHostsFile /dev/null
   IdentityFile {ssh_key_path}
 """
 
-for i, machine_name in enumerate(machine_name_list):
-    ssh_config += f"""
-Host {machine_name_prefix}-{machine_name}
+    pod_names = [f"{machine_name_prefix}-{machine_name}" for machine_name in machine_name_list]
+    proxy_by_pod_name = assign(pod_names, proxy_hosts)
+    for i, pod_name in enumerate(pod_names):
+        ssh_config += f"""
+Host {pod_name}"""
+        if sharded:
+            ssh_config += f"""
+    HostName {proxy_by_pod_name[pod_name]}"""
+        ssh_config += f"""
     Port {proxy_starting_port + i}"""
+    ssh_config += "\n\n"
 
-print(ssh_config)
+print(ssh_config.rstrip())
\ No newline at end of file
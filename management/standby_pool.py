@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import ast
+import shlex
+import subprocess
+
+from mydotenv import load_env
+load_env()
+
+from inventory import get_all_pods
+from pod_utils import get_ssh_endpoint, check_ssh_banner, ssh_args, load_pins, update_pins
+from create_new_pods import create_pod_for_machine, load_public_key
+from vm_scheduler import update_nginx
+from rolling_replace import terminate, stop, use_first_account
+
+# Restart the pod's Jupyter (started by RunPod's /start.sh) with the same arguments, so it
+# re-reads its base_url; ARENA_JUPYTER_PROXY is set as pods created before path mode lack it
+JUPYTER_RESTART_COMMAND = r"""
+pid=$(pgrep -o -f '/jupyter-lab( |$)') || exit 0
+readarray -d '' -t cmd < /proc/$pid/cmdline
+cd "$(readlink /proc/$pid/cwd)" || exit 1
+kill $pid
+while kill -0 $pid 2>/dev/null; do sleep 0.2; done
+ARENA_JUPYTER_PROXY=path nohup "${cmd[@]}" > /jupyter.log 2>&1 < /dev/null &
+"""
+
+
+def get_standby_prefix():
+    """Standby pods are named <MACHINE_NAME_PREFIX>-standby-<n>, outside MACHINE_NAME_LIST."""
+    return f"{os.environ['MACHINE_NAME_PREFIX']}-standby-"
+
+
+def get_pod_config():
+    return {
+        "gpu_type_id": os.environ["RUNPOD_GPU_TYPE"],
+        "gpu_count": int(os.environ["RUNPOD_NUM_GPUS"]),
+        "runpod_cloud_type": os.environ["RUNPOD_CLOUD_TYPE"],
+        "docker_image": os.environ["RUNPOD_DOCKER_IMAGE"],
+        "disk_space_in_gb": int(os.environ["RUNPOD_DISK_SPACE_IN_GB"]),
+        "volume_space_in_gb": int(os.environ["RUNPOD_VOLUME_SPACE_IN_GB"]),
+    }
+
+
+def get_standby_pods(pods):
+    """
+    Split standby pods into free ones and ones already swapped onto a machine.
+
+    Returns:
+        (free, assigned): lists of pods; assigned pods are pinned in SSH_PROXY_PINS_PATH.
+    """
+    prefix = get_standby_prefix()
+    pinned_ids = {pod_id: machine for machine, pod_id in load_pins().items()}
+    free, assigned = [], []
+    for pod in pods:
+        if not pod["name"].startswith(prefix):
+            continue
+        if pod["id"] in pinned_ids:
+            assigned.append(pod)
+        else:
+            free.append(pod)
+    return free, assigned
+
+
+def is_ready(pod):
+    """A standby pod is ready when it is running and answers on SSH."""
+    if pod.get("desiredStatus") != "RUNNING":
+        return False
+    ip, port = get_ssh_endpoint(pod)
+    return bool(ip and port and check_ssh_banner(ip, port))
+
+
+def next_standby_names(pods, count):
+    """Pick `count` unused standby pod names."""
+    prefix = get_standby_prefix()
+    used = set()
+    for pod in pods:
+        match = re.fullmatch(re.escape(prefix) + r"(\d+)", pod["name"])
+        if match:
+            used.add(int(match.group(1)))
+    names, n = [], 1
+    while len(names) < count:
+        if n not in used:
+            names.append(f"{prefix}{n}")
+        n += 1
+    return names
+
+
+def show_status(pods):
+    free, assigned = get_standby_pods(pods)
+    pinned_ids = {pod_id: machine for machine, pod_id in load_pins().items()}
+    pool_size = int(os.getenv("STANDBY_POOL_SIZE", "0"))
+    print(f"Standby pool: {len(free)} free / {pool_size} wanted")
+    print("=" * 80)
+    print(f"{'Name':<22} {'ID':<16} {'Status':<10} {'Ready':<7} {'Serving'}")
+    print("=" * 80)
+    for pod in free + assigned:
+        ready = "yes" if is_ready(pod) else "no"
+        serving = pinned_ids.get(pod["id"], "-")
+        print(f"{pod['name']:<22} {pod['id']:<16} {pod.get('desiredStatus', 'N/A'):<10} {ready:<7} {serving}")
+    print("=" * 80)
+
+
+def top_up(pods, pool_size, accounts, skip_confirm=False):
+    """Create standby pods until `pool_size` free ones exist, replacing dead ones."""
+    free, _ = get_standby_pods(pods)
+
+    # Standby pods that stopped or lost their host are useless, replace them
+    dead = [pod for pod in free if pod.get("desiredStatus") != "RUNNING"]
+    for pod in dead:
+        print(f"Terminating dead standby pod {pod['name']} ({pod['id']}, status {pod.get('desiredStatus')})")
+        terminate(pod["id"], pod["name"], pod=pod, accounts=accounts)
+    alive = len(free) - len(dead)
+
+    missing = pool_size - alive
+    if missing <= 0:
+        print(f"Standby pool is full ({alive}/{pool_size}).")
+        return
+
+    names = next_standby_names(pods, missing)
+    print(f"Standby pool has {alive}/{pool_size} pods, creating: {', '.join(names)}")
+    if not skip_confirm:
+        confirmation = input("\nProceed with creation? (y/N): ")
+        if confirmation.lower() != "y":
+            print("Operation cancelled")
+            return
+
+    public_key_content = load_public_key()
+    pod_config = get_pod_config()
+    for name in names:
+        try:
+            result = create_pod_for_machine(name, public_key_content=public_key_content, **pod_config)
+            print(f"✓ Created standby pod '{name}' ({result['id']})")
+        except Exception as e:
+            print(f"Error creating standby pod '{name}': {str(e)}")
+
+
+def swap(pods, machine_name, accounts, keep_old=False, skip_confirm=False):
+    """
+    Move a ready standby pod onto `machine_name`: pin the machine's proxy port
+    to it, reload nginx, then terminate (or stop, with keep_old) the old pod.
+    """
+    machine_name_list = ast.literal_eval(os.environ["MACHINE_NAME_LIST"])
+    if machine_name not in machine_name_list:
+        print(f"Error: {machine_name} is not in MACHINE_NAME_LIST")
+        return False
+
+    # The machine may currently be served by a pod with its name, or by an earlier standby swap
+    pins = load_pins()
+    pods_by_id = {pod["id"]: pod for pod in pods}
+    old_pods = [pod for pod in pods if pod["name"] in {f"{a['prefix']}-{machine_name}" for a in accounts}]
+    if pins.get(machine_name) in pods_by_id:
+        old_pods = [pods_by_id[pins[machine_name]]]
+
+    free, _ = get_standby_pods(pods)
+    standby = next((pod for pod in free if is_ready(pod)), None)
+    if standby is None:
+        print("Error: no ready standby pod available. Run `standby_pool.py topup` and try again shortly.")
+        return False
+
+    print(f"Swapping {machine_name} onto standby pod {standby['name']} ({standby['id']})")
+    for pod in old_pods:
+        print(f"  old pod: {pod['name']} ({pod['id']}) will be {'stopped' if keep_old else 'terminated'}")
+    if not skip_confirm:
+        confirmation = input("\nProceed with the swap? (y/N): ")
+        if confirmation.lower() != "y":
+            print("Operation cancelled")
+            return False
+
+    # Give the pod its new identity for the prompt and MOTD
+    ip, port = get_ssh_endpoint(standby)
+    try:
+        result = subprocess.run(
+            ssh_args(ip, port) + [f"echo \"export MACHINE_NAME='{machine_name}'\" > /root/.name"],
+            capture_output=True, text=True, timeout=30,
+        )
+    except subprocess.TimeoutExpired:
+        result = None
+    if result is None or result.returncode != 0:
+        error = "ssh timed out" if result is None else (result.stderr.strip() or f"exit status {result.returncode}")
+        print(f"Error: could not set the machine name on {standby['name']} ({error}). Nothing was changed.")
+        return False
+
+    # With Jupyter routed by path, the pod's Jupyter must move to /<machine>/ (scripts/jupyter_base_url.py)
+    if os.getenv("JUPYTER_PROXY") == "path":
+        try:
+            result = subprocess.run(ssh_args(ip, port) + [f"bash -c {shlex.quote(JUPYTER_RESTART_COMMAND)}"],
+                                    capture_output=True, text=True, timeout=60)
+            if result.returncode != 0:
+                print(f"Warning: could not restart Jupyter on {standby['name']}: {result.stderr.strip()}")
+        except subprocess.TimeoutExpired:
+            print(f"Warning: restarting Jupyter on {standby['name']} timed out")
+
+    update_pins({machine_name: standby["id"]})
+    if not update_nginx(dry_run=False, reload=True):
+        print("Error: could not update the proxy. The pin is saved, re-run vm_scheduler/nginx_pods to apply it.")
+        return False
+    print(f"✓ {machine_name} now routes to {standby['name']} ({ip}:{port})")
+
+    for pod in old_pods:
+        (stop if keep_old else terminate)(pod["id"], pod["name"], pod=pod, accounts=accounts)
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Manage a pool of warm standby pods for instant machine replacement. "
+                    "Run this on the proxy machine, as swapping updates the nginx config.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show standby pods and which machines they serve")
+    topup_parser = subparsers.add_parser("topup", help="Create standby pods until the pool is full")
+    topup_parser.add_argument("--size", type=int, help="Pool size (overrides STANDBY_POOL_SIZE env var)")
+    topup_parser.add_argument("--yes", "-y", action="store_true", help="Skip confirmation prompts")
+    swap_parser = subparsers.add_parser("swap", help="Move a standby pod onto a failing machine")
+    swap_parser.add_argument("machine_name", help="Machine to replace (e.g. apple)")
+    swap_parser.add_argument("--keep-old", action="store_true", help="Stop the old pod instead of terminating it")
+    swap_parser.add_argument("--no-topup", action="store_true", help="Don't refill the pool after swapping")
+    swap_parser.add_argument("--yes", "-y", action="store_true", help="Skip confirmation prompts")
+    args = parser.parse_args()
+
+    # Standby pods are created in the first account; the machines' pods may be in any
+    accounts = use_first_account()
+    pods = get_all_pods(accounts)
+    pool_size = int(os.getenv("STANDBY_POOL_SIZE", "0"))
+
+    if args.command == "status":
+        show_status(pods)
+    elif args.command == "topup":
+        top_up(pods, args.size if args.size is not None else pool_size, accounts, skip_confirm=args.yes)
+    elif args.command == "swap":
+        swapped = swap(pods, args.machine_name, accounts, keep_old=args.keep_old, skip_confirm=args.yes)
+        if swapped and not args.no_topup:
+            top_up(get_all_pods(accounts), pool_size, accounts, skip_confirm=True)
+        sys.exit(0 if swapped else 1)
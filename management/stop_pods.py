@@ -2,24 +2,47 @@
 import runpod
 import os
 import sys
-import time
 
 from mydotenv import load_env
 load_env()
 
-def stop_all_pods(include_list, exclude_list, skip_confirm=False):
-    # Get API key from environment
-    api_key = os.getenv("RUNPOD_API_KEY")
-    if not api_key:
+from resilience import retry_call, CircuitOpenError
+from inventory import get_accounts, get_all_pods, use_account_of
+from pod_model import Pod
+from snapshot import take_snapshots
+
+def stop_pods(pods, accounts):
+    """
+    Stop the given pods (API dicts, with their "account"), aborting the rest if
+    the RunPod API is down. Returns the ids of the pods that were stopped.
+    """
+    stopped = []
+    for pod in pods:
+        try:
+            print(f"Stopping {pod['name']} (ID: {pod['id']})...", end=' ')
+            # Route the call to the account that owns the pod
+            use_account_of(pod, accounts)
+            retry_call(runpod.stop_pod, pod['id'])
+            stopped.append(pod['id'])
+            print("✓")
+        except CircuitOpenError as e:
+            print(f"\nRunPod API appears to be down, aborting remaining stops: {str(e)}")
+            break
+        except Exception as e:
+            print(f"\nError stopping pod {pod['name']}: {str(e)}")
+    return stopped
+
+def stop_all_pods(include_list, exclude_list, skip_confirm=False, snapshot=False, parallel=10):
+    # Get API keys from environment (RUNPOD_ACCOUNTS, or just RUNPOD_API_KEY)
+    accounts = get_accounts()
+    if not accounts:
         print("Error: RUNPOD_API_KEY environment variable not set")
         sys.exit(1)
 
-    runpod.api_key = api_key
-
     try:
         # Get all pods
         print("Fetching all pods...")
-        pods = runpod.get_pods()
+        pods = get_all_pods(accounts)
 
         if not pods:
             print("No pods found")
@@ -59,16 +82,18 @@ def stop_all_pods(include_list, exclude_list, skip_confirm=False):
                 print("Operation cancelled")
                 return
 
+        # Save each workspace to the snapshot store first; pods whose snapshot failed keep running
+        if snapshot:
+            print(f"\nSnapshotting {len(running_pods)} pods...")
+            results = take_snapshots([Pod.from_api(pod) for pod in running_pods], parallel=parallel)
+            failed = {name for name, (_, error) in results.items() if error is not None}
+            if failed:
+                print(f"\nNot stopping {len(failed)} pods whose snapshot failed: {', '.join(sorted(failed))}")
+            running_pods = [pod for pod in running_pods if pod["name"] not in failed]
+
         # Stop each pod
         print("\nStopping pods...")
-        for pod in running_pods:
-            try:
-                print(f"Stopping {pod['name']} (ID: {pod['id']})...", end=' ')
-                runpod.stop_pod(pod['id'])
-                print("✓")
-                time.sleep(1)  # Small delay between stops to avoid rate limiting
-            except Exception as e:
-                print(f"\nError stopping pod {pod['name']}: {str(e)}")
+        stop_pods(running_pods, accounts)
 
         print("\nAll stop commands sent successfully")
         print("\nNote: Pods may take a few moments to fully stop")
@@ -83,6 +108,10 @@ if __name__ == "__main__":
     parser.add_argument('--include', nargs='+', help='Include specific pods by name', default=[])
     parser.add_argument('--exclude', nargs='+', help='Exclude specific pods by name', default=[])
     parser.add_argument('--yes', '-y', action='store_true', help='Skip confirmation prompts')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='Snapshot each workspace to SNAPSHOT_STORE_PATH before stopping (see snapshot.py)')
+    parser.add_argument('--parallel', type=int, default=int(os.getenv("MAX_PARALLEL", "10")),
+                        help='Number of pods to snapshot at the same time')
     args = parser.parse_args()
 
-    stop_all_pods(args.include, args.exclude, skip_confirm=args.yes)
+    stop_all_pods(args.include, args.exclude, skip_confirm=args.yes, snapshot=args.snapshot, parallel=args.parallel)
@@ -1,39 +1,301 @@
 #!/usr/bin/env python3
+import os
 import json
+import shlex
+import signal
 import subprocess
 import sys
-from datetime import datetime, timezone
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from mydotenv import load_env
+load_env()
+
+import provision_history
+
+NGINX_CONFIG_PATH = "/etc/nginx/streams-enabled/proxy.conf"
+# Written when JUPYTER_PROXY is set (http block, see nginx_pods.py --jupyter)
+JUPYTER_NGINX_CONFIG_PATH = "/etc/nginx/conf.d/jupyter_proxy.conf"
+# Extra time allowed for the nginx update after the pods are reachable
+NGINX_UPDATE_SECONDS = 60
+# How long after a missed ready_by target the job is still started
+READY_BY_GRACE = timedelta(minutes=30)
+# Commands that change which pods exist or run, so the proxy config must follow
+ROUTING_COMMANDS = ["create_new_pods", "stop_pods", "delete_pods", "idle_policy"]
+
+# Jobs of one tick run in threads; these serialise the nginx config and the state file
+_nginx_lock = threading.Lock()
+_state_lock = threading.Lock()
+_print_lock = threading.Lock()
 
 def should_run(schedule):
+    if "ready_by" in schedule:
+        return False
     now = datetime.now(timezone.utc)
-    time_match = schedule.get("time") == now.strftime("%H:%M")
+    if "every_minutes" in schedule:
+        time_match = (now.hour * 60 + now.minute) % schedule["every_minutes"] == 0
+    else:
+        time_match = schedule.get("time") == now.strftime("%H:%M")
     day_match = now.strftime("%A").lower() in [d.lower() for d in schedule.get("days", [])]
     return time_match and day_match and schedule.get("enabled", True)
 
-def run_command(cmd, dry_run):
-    if dry_run:
-        print(f"[DRY RUN] {cmd}")
+def get_gpu_type(command):
+    """GPU type a create command will use: its --gpu-type argument or RUNPOD_GPU_TYPE."""
+    args = shlex.split(command)
+    if "--gpu-type" in args and args.index("--gpu-type") + 1 < len(args):
+        return args[args.index("--gpu-type") + 1]
+    return os.getenv("RUNPOD_GPU_TYPE")
+
+def get_lead_time(schedule):
+    """How long before the ready_by time provisioning has to start."""
+    gpu_type = get_gpu_type(schedule["command"])
+    provisioning = provision_history.estimate_lead_time(gpu_type)
+    margin = schedule.get("lead_margin_minutes", 2) * 60
+    return timedelta(seconds=provisioning + NGINX_UPDATE_SECONDS + margin)
+
+def ready_by_target(schedule, state):
+    """
+    Return the target datetime if a "ready_by" schedule should start now.
+
+    The job starts once `now` is within the learned lead time of the target,
+    and at most once per target (tracked in the state file).
+    """
+    if "ready_by" not in schedule or not schedule.get("enabled", True):
+        return None
+    now = datetime.now(timezone.utc)
+    hour, minute = map(int, schedule["ready_by"].split(":"))
+    days = [d.lower() for d in schedule.get("days", [])]
+    lead_time = get_lead_time(schedule)
+    # Tomorrow's target may need to start today if the lead time crosses midnight
+    for offset in (0, 1):
+        target = (now + timedelta(days=offset)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if target.strftime("%A").lower() not in days:
+            continue
+        if state.get("fired", {}).get(schedule["name"]) == target.isoformat():
+            continue
+        if target - lead_time <= now < target + READY_BY_GRACE:
+            return target
+    return None
+
+def with_wait_ready(command):
+    """Make create commands block until the pods are reachable, so readiness can be measured."""
+    if "create_new_pods" in command and "--wait-ready" not in command:
+        return command + " --wait-ready"
+    return command
+
+def report_ready_by(schedule, target, state, error=None):
+    """Record whether a ready_by target was met; with `error`, the pods never became usable and it was missed."""
+    if error is not None:
+        print(f"Ready-by '{schedule['name']}': target {target.strftime('%H:%M')} missed ({error})")
+        state.setdefault("results", []).append({
+            "name": schedule["name"],
+            "target": target.isoformat(),
+            "ready_at": None,
+            "error": error,
+        })
+        state["results"] = state["results"][-100:]
         return
-    print(f"Running: {cmd}")
-    subprocess.run(cmd, shell=True, cwd=Path(__file__).parent)
+    finished = datetime.now(timezone.utc)
+    delta = (target - finished).total_seconds()
+    verdict = "early" if delta >= 0 else "late"
+    print(f"Ready-by '{schedule['name']}': target {target.strftime('%H:%M')}, "
+          f"ready at {finished.strftime('%H:%M:%S')} ({provision_history.format_delta(delta)} {verdict})")
+    state.setdefault("results", []).append({
+        "name": schedule["name"],
+        "target": target.isoformat(),
+        "ready_at": finished.isoformat(),
+        "seconds_early": round(delta),
+    })
+    state["results"] = state["results"][-100:]
+
+def load_state(state_path):
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_state(state_path, state):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+def log(message):
+    """print() for jobs running in threads: one write per line, so lines of concurrent jobs don't interleave."""
+    with _print_lock:
+        sys.stdout.write(f"{message}\n")
+        sys.stdout.flush()
 
-def update_nginx(dry_run):
+def run_command(cmd, dry_run, timeout=None, label=None):
+    """
+    Run a schedule's command, prefixing its output with `label` so concurrent
+    jobs can be told apart in the log. The command (and anything it started)
+    is killed after `timeout` seconds.
+
+    Returns:
+        bool: True if the command exited with status 0 in time.
+    """
+    prefix = f"[{label}] " if label else ""
     if dry_run:
-        print("[DRY RUN] Would update nginx config")
-        return
+        log(f"{prefix}[DRY RUN] {cmd}")
+        return True
+    log(f"{prefix}Running: {cmd}")
+    # Own process group, so a timeout also kills the python script the shell started
+    process = subprocess.Popen(cmd, shell=True, cwd=Path(__file__).parent, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, start_new_session=True,
+                               env={**os.environ, "PYTHONUNBUFFERED": "1"})
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        for line in process.stdout:
+            log(f"{prefix}{line.rstrip()}")
+        process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+    if timed_out.is_set():
+        log(f"{prefix}Timed out after {provision_history.format_delta(timeout)}, killed")
+        return False
+    if process.returncode != 0:
+        log(f"{prefix}Exited with status {process.returncode}")
+    return process.returncode == 0
+
+def update_nginx(dry_run, reload=False, only_if_changed=False):
+    """
+    Regenerate the proxy config with nginx_pods.py and apply it.
+
+    With reload=True nginx is reloaded instead of restarted, so established
+    SSH sessions on unchanged routes are kept alive. With only_if_changed=True
+    nginx is left alone when the generated config is the same as before.
+    If nginx_pods.py fails (e.g. an account's pods could not be fetched), the
+    current config is kept rather than replaced by a partial one.
+    """
+    if dry_run:
+        log("[DRY RUN] Would update nginx config")
+        return True
     script = Path(__file__).parent.parent / "proxy/nginx_pods.py"
-    result = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, cwd=script.parent)
-    if result.returncode == 0:
-        with open("/etc/nginx/streams-enabled/proxy.conf", "w") as f:
-            f.write(result.stdout)
-        subprocess.run(["sudo", "systemctl", "restart", "nginx"])
-        print("Nginx updated")
+    targets = [([], NGINX_CONFIG_PATH)]
+    if os.getenv("JUPYTER_PROXY"):
+        targets.append((["--jupyter", os.environ["JUPYTER_PROXY"]], JUPYTER_NGINX_CONFIG_PATH))
+
+    configs = []
+    for extra_args, path in targets:
+        result = subprocess.run([sys.executable, str(script)] + extra_args, capture_output=True, text=True,
+                                cwd=script.parent)
+        if result.returncode != 0:
+            log(f"Failed to generate nginx config, keeping the current one: {result.stderr.strip()}")
+            return False
+        configs.append((path, result.stdout))
+
+    def unchanged(path, config):
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            return f.read() == config
+    if only_if_changed and all(unchanged(path, config) for path, config in configs):
+        return True
+    for path, config in configs:
+        with open(path, "w") as f:
+            f.write(config)
+    subprocess.run(["sudo", "systemctl", "reload" if reload else "restart", "nginx"])
+    log("Nginx updated")
+    return True
+
+def refresh_nginx(dry_run):
+    """update_nginx for scheduler jobs: one at a time, and only restarting nginx when routes changed."""
+    with _nginx_lock:
+        return update_nginx(dry_run, only_if_changed=True)
+
+def affects_routing(command):
+    return any(x in command for x in ROUTING_COMMANDS)
+
+class Job:
+    """One unit of work in a scheduler tick: a schedule's command, or a follow-up like an nginx refresh."""
+
+    def __init__(self, name, action, depends_on=(), schedule=None, run_after_failure=False):
+        self.name = name
+        self.action = action
+        self.depends_on = list(depends_on)
+        self.schedule = schedule
+        # Follow-ups like the nginx refresh run whatever the outcome of the jobs they wait for
+        self.run_after_failure = run_after_failure
+        self.status = "pending"  # then "running", and finally "ok", "failed" or "skipped"
+
+def run_jobs(jobs):
+    """
+    Run the jobs of a tick concurrently. Each job starts as soon as every job
+    it depends on has succeeded, and is skipped if one of them failed (jobs
+    with run_after_failure start once those jobs have finished, however).
+    Dependencies on schedules that are not due in this tick are ignored.
+    """
+    by_name = {job.name: job for job in jobs}
+    for job in jobs:
+        job.depends_on = [name for name in job.depends_on if name in by_name]
+    pending = list(jobs)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as executor:
+        while pending or running:
+            # Repeat until stable, as skipping one job can make its dependents skippable
+            changed = True
+            while changed:
+                changed = False
+                for job in list(pending):
+                    states = [by_name[name].status for name in job.depends_on]
+                    finished = all(state in ("ok", "failed", "skipped") for state in states)
+                    if job.run_after_failure:
+                        if not finished:
+                            continue
+                        job.status = "running"
+                        running[executor.submit(job.action)] = job
+                    elif any(state in ("failed", "skipped") for state in states):
+                        job.status = "skipped"
+                        log(f"Skipping {job.name}: a job it depends on did not succeed")
+                    elif all(state == "ok" for state in states):
+                        job.status = "running"
+                        running[executor.submit(job.action)] = job
+                    else:
+                        continue
+                    pending.remove(job)
+                    changed = True
+            if not running:
+                # Only jobs waiting on each other are left
+                for job in pending:
+                    job.status = "skipped"
+                    log(f"Skipping {job.name}: circular depends_on ({', '.join(job.depends_on)})")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    log(f"[{job.name}] Error: {str(e)}")
+                    ok = False
+                job.status = "ok" if ok is not False else "failed"
+    return jobs
+
+def get_timeout(schedule):
+    minutes = schedule.get("timeout_minutes")
+    return minutes * 60 if minutes else None
 
 def main():
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="/etc/vm_scheduler/schedule.json")
+    parser.add_argument("--state", default="/etc/vm_scheduler/state.json",
+                        help="Where to remember which ready_by targets have been started")
     parser.add_argument("--dry-run", action="store_true")
     args = parser.parse_args()
     
@@ -44,21 +306,65 @@ def main():
         print(f"Config file {args.config} not found")
         return
     
-    executed = 0
-    needs_nginx_update = False
-    
+    jobs = []
     for schedule in config.get("schedules", []):
         if should_run(schedule):
             print(f"Executing: {schedule['name']}")
-            run_command(schedule["command"], args.dry_run)
-            executed += 1
-            if any(x in schedule["command"] for x in ["create_new_pods", "stop_pods", "delete_pods"]):
-                needs_nginx_update = True
-    
-    if needs_nginx_update:
-        update_nginx(args.dry_run)
-    
-    print(f"Executed {executed} tasks")
+            jobs.append(Job(
+                schedule["name"],
+                lambda s=schedule: run_command(s["command"], args.dry_run, get_timeout(s), s["name"]),
+                schedule.get("depends_on", []), schedule,
+            ))
+            # Each routing change gets its own refresh, so a slow create doesn't hold up a stop's
+            if affects_routing(schedule["command"]):
+                # Also after a failure or timeout: the command may have created or stopped pods before that
+                jobs.append(Job(f"nginx refresh after {schedule['name']}",
+                                lambda: refresh_nginx(args.dry_run), [schedule["name"]], run_after_failure=True))
+
+    # "ready_by" schedules start early enough for the pods to be usable at the target time
+    state = load_state(args.state)
+    for schedule in config.get("schedules", []):
+        target = ready_by_target(schedule, state)
+        if target is None:
+            continue
+        print(f"Executing: {schedule['name']} (ready by {target.strftime('%H:%M')}, "
+              f"lead time {provision_history.format_delta(get_lead_time(schedule).total_seconds())})")
+        # Other scheduler runs (one per minute) may update the state meanwhile, so always re-read it
+        if not args.dry_run:
+            state = load_state(args.state)
+            state.setdefault("fired", {})[schedule["name"]] = target.isoformat()
+            save_state(args.state, state)
+
+        create_job = Job(
+            schedule["name"],
+            lambda s=schedule: run_command(with_wait_ready(s["command"]), args.dry_run, get_timeout(s), s["name"]),
+            schedule.get("depends_on", []), schedule,
+        )
+
+        def refresh_and_report(schedule=schedule, target=target, create_job=create_job):
+            # Refresh even if the create failed, as some pods may have been created. The target
+            # only counts as met once the create succeeded and nginx routes to the new pods.
+            ok = refresh_nginx(args.dry_run)
+            if not args.dry_run:
+                error = None
+                if create_job.status != "ok":
+                    error = f"create job {create_job.status}"
+                elif not ok:
+                    error = "nginx refresh failed"
+                with _state_lock:
+                    state = load_state(args.state)
+                    report_ready_by(schedule, target, state, error=error)
+                    save_state(args.state, state)
+            return ok
+        jobs.append(create_job)
+        jobs.append(Job(f"nginx refresh after {schedule['name']}", refresh_and_report, [schedule["name"]],
+                        run_after_failure=True))
+
+    run_jobs(jobs)
+    executed = [job for job in jobs if job.schedule is not None]
+    for job in executed:
+        print(f"{job.name}: {job.status}")
+    print(f"Executed {sum(job.status != 'skipped' for job in executed)} tasks")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,235 +3,266 @@ import json
 import os
 import sys
 import ast
-import urllib.request
-import urllib.error
-import urllib.parse
 from datetime import datetime
 
 from mydotenv import load_env
 load_env()
 
-def make_graphql_request(query, api_key):
-    """Make a GraphQL request to RunPod API"""
-    # URL encode the API key to handle special characters
-    encoded_api_key = urllib.parse.quote(api_key, safe='')
-    url = f"https://api.runpod.io/graphql?api_key={encoded_api_key}"
-
-    data = json.dumps({"query": query}).encode('utf-8')
-    headers = {
-        'Content-Type': 'application/json',
-        'Content-Length': str(len(data)),
-        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'application/json',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Cache-Control': 'no-cache',
-        'Pragma': 'no-cache'
-    }
-
-    request = urllib.request.Request(url, data=data, headers=headers, method='POST')
+from inventory import get_accounts, get_pools, get_all_pods
+from pod_model import parse_pods, sort_pods, index_pods, JUPYTER_PORT
+from sharding import get_proxy_hosts, get_this_proxy, build_ring, proxy_for
 
-    try:
-        with urllib.request.urlopen(request) as response:
-            return json.loads(response.read().decode('utf-8'))
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8')
-        if 'error code: 1010' in error_body:
-            print("Cloudflare is blocking the request. This might be due to:")
-            print("1. Invalid API key")
-            print("2. API key needs to be URL encoded if it contains special characters")
-            print("3. RunPod API might require specific headers or authentication method")
-            print()
-            print("Debug info:")
-            print(f"URL: {url[:50]}...")  # Show partial URL for security
-            print(f"API Key length: {len(api_key)}")
-        print(f"HTTP Error {e.code}: {error_body}")
-        raise
-    except Exception as e:
-        print(f"Error making request: {str(e)}")
-        raise
-
-def get_pods(api_key):
-    """Get all pods from RunPod API"""
-    query = """
-    query Pods {
-        myself {
-            pods {
-                id
-                name
-                costPerHr
-                lastStatusChange
-                gpuCount
-                imageName
-                machine {
-                    gpuDisplayName
-                }
-                runtime {
-                    ports {
-                        ip
-                        isIpPublic
-                        publicPort
-                        type
-                    }
-                }
-            }
-        }
-    }
+def load_pins(pins_path=None):
     """
+    Load the machine -> pod id pins file (SSH_PROXY_PINS_PATH).
 
-    result = make_graphql_request(query, api_key)
-
-    if 'errors' in result:
-        print(f"GraphQL Errors: {result['errors']}")
-        return []
-
-    return result.get('data', {}).get('myself', {}).get('pods', [])
+    A pin routes a machine's proxy port to a specific pod, even if another pod
+    with the same name exists. Pins whose pod no longer exists are ignored.
+    """
+    pins_path = os.path.expanduser(pins_path or os.getenv("SSH_PROXY_PINS_PATH", "~/proxy_pins.json"))
+    if not os.path.exists(pins_path):
+        return {}
+    try:
+        with open(pins_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"# Warning: could not read pins file {pins_path}: {e}", file=sys.stderr)
+        return {}
 
-def list_pods(verbose=False):
-    # Get API key from environment
-    api_key = os.getenv("RUNPOD_API_KEY")
-    if not api_key:
-        print("# Error: RUNPOD_API_KEY environment variable not set")
-        return
+def format_stream_config(found_pods, log_dir="/var/log/nginx"):
+    """
+    Lines of the stream config: the SSH access log, then one upstream and
+    server block per machine. `found_pods` maps upstream name ->
+    {"ip", "port", "listen_port"}. Also used by proxy_benchmark.py.
+    """
+    lines = [
+        "log_format ssh '$remote_addr [$time_local] $protocol $status $bytes_sent $bytes_received $session_time \"$upstream_addr\"';",
+        f"access_log {log_dir}/ssh_access.log ssh;",
+        f"error_log {log_dir}/ssh_error.log;",
+        "",
+    ]
+    for upstream_name, data in found_pods.items():
+        lines.append(f"upstream {upstream_name} {{ server {data['ip']}:{data['port']}; }}")
+        lines.append(f"server {{ listen {data['listen_port']}; proxy_pass {upstream_name}; }}")
+        lines.append("")
+    return lines
+
+def get_jupyter_upstream(pod):
+    """
+    (server, scheme, host header) for a pod's Jupyter: its public TCP port if
+    8888 is exposed as TCP, otherwise RunPod's HTTP proxy for the pod.
+    """
+    if pod.jupyter_ip and pod.jupyter_port:
+        return f"{pod.jupyter_ip}:{pod.jupyter_port}", "http", "$host"
+    runpod_host = f"{pod.id}-{JUPYTER_PORT}.proxy.runpod.net"
+    return f"{runpod_host}:443", "https", runpod_host
+
+def format_jupyter_location(upstream, scheme, host_header):
+    """Proxy settings shared by every Jupyter location: keepalive, websockets, large uploads."""
+    lines = [
+        f"        proxy_pass {scheme}://{upstream};",
+        "        proxy_http_version 1.1;",
+        f"        proxy_set_header Host {host_header};",
+        "        proxy_set_header Upgrade $http_upgrade;",
+        "        proxy_set_header Connection $jupyter_connection;",
+        "        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;",
+        "        proxy_set_header X-Forwarded-Proto $scheme;",
+        # Kernel websockets can sit idle for a long time
+        "        proxy_read_timeout 1d;",
+        "        proxy_send_timeout 1d;",
+        "        client_max_body_size 0;",
+    ]
+    if scheme == "https":
+        lines += ["        proxy_ssl_server_name on;", f"        proxy_ssl_name {host_header};"]
+    return lines
+
+def jupyter_upstream_name(upstream_name):
+    """nginx upstream of a machine's Jupyter; also how it appears in the Jupyter access log."""
+    return f"jupyter_{upstream_name}".replace("-", "_")
+
+def format_jupyter_config(found_pods, mode="host", domain=None, listen=80,
+                          cache_path="/var/cache/nginx/jupyter", log_dir="/var/log/nginx"):
+    """
+    Lines of an http config routing each machine to its pod's Jupyter, to be
+    included from the http block (e.g. /etc/nginx/conf.d/jupyter_proxy.conf).
+
+    mode "host" serves http://<machine>.<domain>/, mode "path" serves
+    http://<domain>/<machine>/ (Jupyter then runs with base_url /<machine>/,
+    set by scripts/jupyter_base_url.py in the image). Static assets are the same on every
+    pod, so they are cached once for all machines. Requests other than static
+    assets are logged per machine to jupyter_access.log, for idle_policy.py.
+    """
+    lines = [
+        f"proxy_cache_path {cache_path} levels=1:2 keys_zone=jupyter_static:10m max_size=2g inactive=7d use_temp_path=off;",
+        "log_format jupyter '$proxy_host [$time_local] \"$request\" $status $request_time';",
+        "",
+        "# Upgrade websocket requests, and keep other upstream connections alive",
+        "map $http_upgrade $jupyter_connection {",
+        "    default upgrade;",
+        "    ''      '';",
+        "}",
+        "",
+    ]
+    static_paths = "(static|lab/extensions|nbextensions)/"
+    locations = {}
+    for upstream_name, data in found_pods.items():
+        server, scheme, host_header = get_jupyter_upstream(data["pod"])
+        upstream = jupyter_upstream_name(upstream_name)
+        lines += [f"upstream {upstream} {{", f"    server {server};", "    keepalive 16;", "}", ""]
+        prefix = "" if mode == "host" else f"/{upstream_name}"
+        locations[upstream_name] = [
+            f"    location ~ ^{prefix}/{static_paths}(.*)$ {{",
+            *format_jupyter_location(upstream, scheme, host_header),
+            "        proxy_cache jupyter_static;",
+            # Without the machine in the key, an asset fetched from one pod serves all of them
+            "        proxy_cache_key $1$2$is_args$args;",
+            "        proxy_cache_valid 200 1d;",
+            "        proxy_cache_lock on;",
+            "        proxy_cache_use_stale error timeout updating;",
+            "        proxy_ignore_headers Set-Cookie;",
+            "        proxy_hide_header Set-Cookie;",
+            "        add_header X-Cache-Status $upstream_cache_status;",
+            "        access_log off;",
+            "    }",
+            f"    location {prefix}/ {{",
+            *format_jupyter_location(upstream, scheme, host_header),
+            "    }",
+        ]
+
+    if mode == "host":
+        for upstream_name, location_lines in locations.items():
+            lines += ["server {", f"    listen {listen};", f"    server_name {upstream_name}.{domain};",
+                      f"    access_log {log_dir}/jupyter_access.log jupyter;", *location_lines, "}", ""]
+    else:
+        lines += ["server {", f"    listen {listen};", f"    server_name {domain};",
+                  f"    access_log {log_dir}/jupyter_access.log jupyter;"]
+        for location_lines in locations.values():
+            lines += location_lines
+        lines += ["}", ""]
+    return lines
+
+def list_pods(verbose=False, pins_path=None, proxy_host=None, jupyter_mode=None):
+    """
+    Print the config. Returns False if the pods could not all be fetched, in
+    which case the output must not replace the current config (it would drop
+    the missing pods' routes and their live sessions).
+    """
+    # Get API keys from environment (RUNPOD_ACCOUNTS, or just RUNPOD_API_KEY)
+    accounts = get_accounts()
+    if not accounts:
+        print("# Error: RUNPOD_API_KEY environment variable not set", file=sys.stderr)
+        return False
 
     try:
-        # Get all pods
+        # Get all pods, from all accounts; one failed account fails the whole config
         if verbose:
-            print("# Fetching pods...")
-        pods = get_pods(api_key)
+            print(f"# Fetching pods from {len(accounts)} account(s)...", file=sys.stderr)
+        pods = get_all_pods(accounts, strict=True)
 
         if not pods:
             if verbose:
-                print("# No pods found")
-            return
+                print("# No pods found", file=sys.stderr)
+            return True
 
         # Sort pods by name
-        pods = sorted(pods, key=lambda x: x.get('name', ''))
+        pods = sort_pods(parse_pods(pods), "name")
+
+        # With several proxy hosts, each one only routes the machines hashed to it
+        proxy_hosts = get_proxy_hosts()
+        ring = build_ring(proxy_hosts) if proxy_host and len(proxy_hosts) > 1 else None
+        if ring is not None and proxy_host not in proxy_hosts:
+            print(f"# Warning: {proxy_host} is not in SSH_PROXY_HOSTS, no machines are routed here", file=sys.stderr)
 
         # Generate Nginx configuration first
         print("# Nginx Configuration")
         print("# -----------------")
-        print()
-        print("log_format ssh '$remote_addr [$time_local] $protocol $status $bytes_sent $bytes_received $session_time \"$upstream_addr\"';")
-        print("access_log /var/log/nginx/ssh_access.log ssh;")
-        print("error_log /var/log/nginx/ssh_error.log;")
+        if ring is not None:
+            print(f"# Shard for proxy {proxy_host} ({len(proxy_hosts)} proxies)")
         print()
 
         # NATO phonetic alphabet for pod names
-        machine_name_prefix: str = os.getenv("MACHINE_NAME_PREFIX")
+        default_prefix: str = os.getenv("MACHINE_NAME_PREFIX")
         machine_name_list: list[str] = ast.literal_eval(os.getenv("MACHINE_NAME_LIST"))
-        proxy_starting_port: int = int(os.getenv("SSH_PROXY_STARTING_PORT"))
-        # print(f"{machine_name_list=}", len(machine_name_list))
-        # Map for storing found pods
+        # Map for storing found pods, keyed by upstream name
         found_pods = {}
 
-        # Find pods that match the NATO naming pattern
-        for pod in pods:
-            pod_name = pod.get('name', '')
+        # Pods pinned to a machine (e.g. replacement pods during a rolling upgrade)
+        # take precedence over pods that merely have the machine's name
+        pins = load_pins(pins_path)
+        pods_by_id = {pod.id: pod for pod in pods}
+        pods_by_name = index_pods(pods, "name")
+
+        # Each pool (prefix + starting port) gets its own block of listen ports
+        for machine_name_prefix, proxy_starting_port in get_pools(accounts):
+            # Find pods that match the NATO naming pattern
             for i, machine_name in enumerate(machine_name_list):
                 pod_name_to_check = f"{machine_name_prefix}-{machine_name}"
-                if pod_name == pod_name_to_check:
-                    try:
-                        # Get runtime ports
-                        runtime = pod.get('runtime', {})
-                        ports = runtime.get('ports', [])
-
-                        # Find SSH port and IP
-                        ssh_port = None
-                        public_ip = None
-
-                        for port in ports:
-                            if port.get('type') == 'tcp' and port.get('isIpPublic'):
-                                ssh_port = str(port.get('publicPort'))
-                                public_ip = port.get('ip')
-                                break
-
-                        if public_ip and ssh_port:
-                            found_pods[machine_name] = {
-                                "ip": public_ip,
-                                "port": ssh_port,
-                                "listen_port": proxy_starting_port + i  # 12000 + index for consistent port numbering
-                            }
-                    except Exception as e:
-                        if verbose:
-                            print(f"# Error processing pod {pod_name}: {e}")
+                if ring is not None and proxy_for(pod_name_to_check, ring=ring) != proxy_host:
+                    continue
+                # Keep the short upstream names for the main pool
+                upstream_name = machine_name if machine_name_prefix == default_prefix else pod_name_to_check
+                candidates = pods_by_name.get(pod_name_to_check, [])
+                pinned_pod = pods_by_id.get(pins.get(upstream_name))
+                if pinned_pod is not None:
+                    candidates = [pinned_pod]
+                for pod in candidates:
+                    if pod.reachable:
+                        found_pods[upstream_name] = {
+                            "pod": pod,
+                            "ip": pod.ssh_ip,
+                            "port": pod.ssh_port,
+                            "listen_port": proxy_starting_port + i  # 12000 + index for consistent port numbering
+                        }
 
         # Generate Nginx configuration for found pods
-        for machine_name in sorted(found_pods.keys(), key=lambda x: machine_name_list.index(x)):
-            data = found_pods[machine_name]
-            print(f"upstream {machine_name} {{ server {data['ip']}:{data['port']}; }}")
-            print(f"server {{ listen {data['listen_port']}; proxy_pass {machine_name}; }}")
-            print()
+        if jupyter_mode:
+            lines = format_jupyter_config(
+                found_pods, jupyter_mode,
+                domain=os.getenv("JUPYTER_PROXY_DOMAIN") or proxy_host or os.getenv("SSH_PROXY_HOST"),
+                listen=int(os.getenv("JUPYTER_PROXY_LISTEN_PORT", "80")),
+                cache_path=os.getenv("JUPYTER_PROXY_CACHE_PATH", "/var/cache/nginx/jupyter"),
+            )
+        else:
+            lines = format_stream_config(found_pods)
+        for line in lines:
+            print(line)
 
         # Print table if verbose mode (after nginx config)
         if verbose:
-            print("\n" + "="*140)
-            print(f"{'IP':<16} {'SSH Port':<10} {'Cost/hr':<10} {'Last Status Change':<28} {'Name':<15} {'Status':<15} {'GPUs':<6} {'GPU Type':<20} {'Image':<30}")
-            print("="*140)
+            print("\n" + "="*151)
+            print(f"{'IP':<16} {'SSH Port':<10} {'Cost/hr':<10} {'Last Status Change':<28} {'Name':<15} {'Status':<15} {'GPUs':<6} {'GPU Type':<20} {'Image':<30} {'Account':<10}")
+            print("="*151)
 
             for pod in pods:
-                try:
-                    # Get SSH port and IP
-                    runtime = pod.get('runtime', {})
-                    ports = runtime.get('ports', [])
-
-                    ssh_port = 'N/A'
-                    public_ip = 'N/A'
-
-                    for port in ports:
-                        if port.get('type') == 'tcp' and port.get('isIpPublic'):
-                            ssh_port = str(port.get('publicPort', 'N/A'))
-                            public_ip = port.get('ip', 'N/A')
-                            break
-
-                    # Format the status time (remove year)
-                    status_time = pod.get('lastStatusChange', '')
-                    if ': ' in status_time:
-                        # Extract date and time, remove year
-                        date_time = status_time.split(': ')[1].split(' GMT')[0]
-                        # Parse and reformat without year
-                        if ' 2025 ' in date_time or ' 2024 ' in date_time:
-                            parts = date_time.split()
-                            if len(parts) >= 5:
-                                # Remove year (index 3)
-                                status_time = f"{parts[0]} {parts[1]} {parts[2]} {parts[4]}"
-                            else:
-                                status_time = date_time
-                        else:
-                            status_time = date_time
-
-                    # Get the status
-                    status = pod.get('lastStatusChange', '')
-                    if ': ' in status:
-                        status = status.split(': ')[0]
-
-                    # Format cost
-                    cost = f"${pod.get('costPerHr', 0)}"
-
-                    # Get GPU count
-                    gpu_count = pod.get('gpuCount', 0)
-                    gpu_count_str = f"{gpu_count}x" if gpu_count > 0 else "0"
-
-                    # Get GPU name
-                    gpu_name = 'N/A'
-                    if pod.get('machine'):
-                        gpu_name = pod['machine'].get('gpuDisplayName', 'N/A')
-
-                    # Get image name (truncate if too long)
-                    image_name = pod.get('imageName', 'N/A')
-                    if len(image_name) > 29:
-                        image_name = image_name[:26] + "..."
-
-                    print(f"{public_ip:<16} {ssh_port:<10} {cost:<10} {status_time:<28} {pod.get('name', 'N/A'):<15} {status:<15} {gpu_count_str:<6} {gpu_name:<20} {image_name:<30}")
-                except Exception as e:
-                    print(f"# Error processing pod: {e}")
-                    print(pod)
-
-            print("="*140 + "\n")
+                public_ip = pod.ssh_ip or 'N/A'
+                ssh_port = str(pod.ssh_port or 'N/A')
+                cost = f"${pod.cost_per_hr}"
+                gpu_count_str = f"{pod.gpu_count}x" if pod.gpu_count > 0 else "0"
+
+                # Truncate the image name if too long
+                image_name = pod.image or 'N/A'
+                if len(image_name) > 29:
+                    image_name = image_name[:26] + "..."
+
+                print(f"{public_ip:<16} {ssh_port:<10} {cost:<10} {pod.format_status_time():<28} {pod.name:<15} {pod.status_reason or pod.status.value:<15} {gpu_count_str:<6} {pod.gpu_name or 'N/A':<20} {image_name:<30} {pod.account or 'N/A':<10}")
+
+            print("="*151 + "\n")
 
     except Exception as e:
-        print(f"# Error: {str(e)}")
+        print(f"# Error: {str(e)}", file=sys.stderr)
+        return False
+    return True
 
 if __name__ == "__main__":
-    # Check for -v flag
-    verbose = '-v' in sys.argv
-    list_pods(verbose=verbose)
+    import argparse
+    parser = argparse.ArgumentParser(description="Print the nginx stream config for the RunPod pods")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Also print a table of all pods")
+    parser.add_argument("--pins", help="Path to the machine -> pod id pins file (default: SSH_PROXY_PINS_PATH)")
+    parser.add_argument("--proxy", default=get_this_proxy(),
+                        help="Only route the machines assigned to this proxy host (default: SSH_PROXY_NAME)")
+    parser.add_argument("--jupyter", nargs="?", const=os.getenv("JUPYTER_PROXY") or "host", choices=["host", "path"],
+                        help="Print the http config routing each machine to its pod's Jupyter instead "
+                             "(by hostname or by path, default: JUPYTER_PROXY or host)")
+    args = parser.parse_args()
+    ok = list_pods(verbose=args.verbose, pins_path=args.pins, proxy_host=args.proxy, jupyter_mode=args.jupyter)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Compact, typed view of the pods returned by the RunPod API.
+
+Pod.from_api() walks a raw pod dict once, pre-extracting the public SSH
+endpoint, the status and the time of the last status change, so scripts that
+print tables or configs don't each re-parse the nested runtime ports and
+lastStatusChange strings. An identical copy lives in management/ and proxy/,
+like mydotenv.py.
+"""
+from datetime import datetime
+from enum import Enum
+from operator import attrgetter
+
+JUPYTER_PORT = 8888
+
+
+class PodStatus(Enum):
+    CREATED = "CREATED"
+    RUNNING = "RUNNING"
+    RESTARTING = "RESTARTING"
+    EXITED = "EXITED"
+    PAUSED = "PAUSED"
+    DEAD = "DEAD"
+    TERMINATED = "TERMINATED"
+    UNKNOWN = "UNKNOWN"
+
+    @classmethod
+    def parse(cls, value):
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.UNKNOWN
+
+
+def parse_status_change(value):
+    """
+    Split lastStatusChange, e.g.
+    "Rented by User: Mon Jan 13 2025 10:20:30 GMT+0000 (Coordinated Universal Time)",
+    into ("Rented by User", datetime). Parts that can't be parsed are None.
+    """
+    if not value or ": " not in value:
+        return value or None, None
+    reason, _, timestamp = value.partition(": ")
+    date_part, _, offset_part = timestamp.partition(" GMT")
+    try:
+        return reason, datetime.strptime(f"{date_part} {offset_part[:5]}", "%a %b %d %Y %H:%M:%S %z")
+    except ValueError:
+        return reason, None
+
+
+class Pod:
+    __slots__ = (
+        "id", "name", "account", "status", "status_reason", "last_status_change",
+        "ssh_ip", "ssh_port", "cost_per_hr", "gpu_count", "gpu_name", "image",
+        "machine_id", "uptime_seconds", "interruptible", "jupyter_ip", "jupyter_port",
+    )
+
+    def __init__(self, id, name, account=None, status=PodStatus.UNKNOWN, status_reason=None,
+                 last_status_change=None, ssh_ip=None, ssh_port=None, cost_per_hr=0.0,
+                 gpu_count=0, gpu_name=None, image=None, machine_id=None, uptime_seconds=None,
+                 interruptible=False, jupyter_ip=None, jupyter_port=None):
+        self.id = id
+        self.name = name
+        self.account = account
+        self.status = status
+        self.status_reason = status_reason
+        self.last_status_change = last_status_change
+        self.ssh_ip = ssh_ip
+        self.ssh_port = ssh_port
+        self.cost_per_hr = cost_per_hr
+        self.gpu_count = gpu_count
+        self.gpu_name = gpu_name
+        self.image = image
+        self.machine_id = machine_id
+        self.uptime_seconds = uptime_seconds
+        self.interruptible = interruptible
+        self.jupyter_ip = jupyter_ip
+        self.jupyter_port = jupyter_port
+
+    @classmethod
+    def from_api(cls, pod):
+        """Build a Pod from one pod dict of runpod.get_pods() or the GraphQL pods query."""
+        runtime = pod.get("runtime") or {}
+        public_ports = [port for port in runtime.get("ports") or []
+                        if port.get("type") == "tcp" and port.get("isIpPublic")]
+        # SSH is the public TCP port for 22 (or the only one); Jupyter only has
+        # a public endpoint when 8888 is exposed as TCP instead of through RunPod's HTTP proxy
+        ssh = next((p for p in public_ports if p.get("privatePort") == 22), None)
+        ssh = ssh or next((p for p in public_ports if p.get("privatePort") != JUPYTER_PORT), None)
+        jupyter = next((p for p in public_ports if p.get("privatePort") == JUPYTER_PORT), None)
+        status_reason, last_status_change = parse_status_change(pod.get("lastStatusChange"))
+        return cls(
+            id=pod["id"],
+            name=pod.get("name", ""),
+            account=pod.get("account"),
+            status=PodStatus.parse(pod.get("desiredStatus")),
+            status_reason=status_reason,
+            last_status_change=last_status_change,
+            ssh_ip=ssh["ip"] if ssh else None,
+            ssh_port=int(ssh["publicPort"]) if ssh else None,
+            cost_per_hr=float(pod.get("costPerHr") or 0),
+            gpu_count=pod.get("gpuCount") or 0,
+            gpu_name=(pod.get("machine") or {}).get("gpuDisplayName"),
+            image=pod.get("imageName"),
+            machine_id=pod.get("machineId"),
+            uptime_seconds=runtime.get("uptimeInSeconds"),
+            interruptible=pod.get("podType") == "INTERRUPTABLE",
+            jupyter_ip=jupyter["ip"] if jupyter else None,
+            jupyter_port=int(jupyter["publicPort"]) if jupyter else None,
+        )
+
+    @property
+    def reachable(self):
+        """True if the pod has a public SSH endpoint."""
+        return self.ssh_ip is not None and self.ssh_port is not None
+
+    def format_status_time(self, now=None):
+        """Last status change without the year (unless it's from another year)."""
+        if self.last_status_change is None:
+            return "N/A"
+        now = now or datetime.now(self.last_status_change.tzinfo)
+        if self.last_status_change.year == now.year:
+            return self.last_status_change.strftime("%a %b %d %H:%M:%S")
+        return self.last_status_change.strftime("%a %b %d %Y %H:%M:%S")
+
+    def __repr__(self):
+        return f"Pod(id={self.id!r}, name={self.name!r}, status={self.status.value}, ssh={self.ssh_ip}:{self.ssh_port})"
+
+
+def parse_pods(pods):
+    """Convert raw API pod dicts into Pod records."""
+    return [Pod.from_api(pod) for pod in pods]
+
+
+def sort_pods(pods, *fields, reverse=False):
+    """Sort pods by one or more attributes (default: name), e.g. sort_pods(pods, "account", "name")."""
+    return sorted(pods, key=attrgetter(*(fields or ("name",))), reverse=reverse)
+
+
+def filter_pods(pods, status=None, account=None, prefix=None, reachable=None):
+    """
+    Filter pods in one pass. `status` may be a PodStatus or a collection of
+    them; other arguments that are None are ignored.
+    """
+    if isinstance(status, PodStatus):
+        status = {status}
+    return [
+        pod for pod in pods
+        if (status is None or pod.status in status)
+        and (account is None or pod.account == account)
+        and (prefix is None or pod.name.startswith(prefix))
+        and (reachable is None or pod.reachable == reachable)
+    ]
+
+
+def index_pods(pods, field="name"):
+    """Group pods by an attribute, e.g. {name: [pods with that name]}."""
+    index = {}
+    for pod in pods:
+        index.setdefault(getattr(pod, field), []).append(pod)
+    return index
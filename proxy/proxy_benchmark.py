@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Benchmark what the SSH stream proxy adds to the data path, on this machine.
+
+Local TCP servers stand in for the pods, and a temporary nginx is started
+with the stream config nginx_pods.py would generate for them, under the
+worker settings of proxy/nginx.conf (or the ones given on the command line).
+Many concurrent connections are then driven at the pods directly and through
+the proxy ports, and the script reports connect latency, round-trip latency
+percentiles per message size, and aggregate upload/download throughput for
+both, so the proxy VM can be sized and tuning changes compared.
+
+Each backend speaks a tiny protocol, chosen by the first byte a client sends:
+    E   echo everything back
+    S   read an 8-byte length, discard that many bytes, reply with the count
+    D   read an 8-byte length, send that many bytes
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import struct
+import asyncio
+import tempfile
+import subprocess
+import multiprocessing
+from pathlib import Path
+
+from nginx_pods import format_stream_config
+
+BLOCK_SIZE = 256 * 1024
+NGINX_CONF_PATH = Path(__file__).parent / "nginx.conf"
+
+
+# --- Backends (stand-in pods) ---
+
+async def handle_backend(reader, writer):
+    try:
+        mode = await reader.readexactly(1)
+        if mode == b"E":
+            while True:
+                data = await reader.read(BLOCK_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        elif mode == b"S":
+            remaining = total = struct.unpack(">Q", await reader.readexactly(8))[0]
+            while remaining > 0:
+                data = await reader.read(min(BLOCK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+            writer.write(struct.pack(">Q", total - remaining))
+            await writer.drain()
+        elif mode == b"D":
+            remaining = struct.unpack(">Q", await reader.readexactly(8))[0]
+            block = bytes(BLOCK_SIZE)
+            while remaining > 0:
+                writer.write(block[:remaining])
+                remaining -= min(BLOCK_SIZE, remaining)
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def serve_backends(ports):
+    """Serve the given backend ports until killed (run in a child process)."""
+    async def main():
+        servers = [await asyncio.start_server(handle_backend, "127.0.0.1", port, backlog=1024) for port in ports]
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    asyncio.run(main())
+
+
+def start_backends(ports, processes):
+    """Spread the backend ports over a few processes, so they don't limit the proxy."""
+    workers = []
+    for i in range(processes):
+        share = ports[i::processes]
+        if share:
+            worker = multiprocessing.Process(target=serve_backends, args=(share,), daemon=True)
+            worker.start()
+            workers.append(worker)
+    return workers
+
+
+# --- The proxy under test ---
+
+def read_worker_settings(path=NGINX_CONF_PATH):
+    """worker_processes and worker_connections of the real proxy config."""
+    text = path.read_text() if path.exists() else ""
+    processes = re.search(r"^\s*worker_processes\s+(\S+);", text, re.M)
+    connections = re.search(r"^\s*worker_connections\s+(\d+);", text, re.M)
+    return (processes.group(1) if processes else "auto",
+            int(connections.group(1)) if connections else 768)
+
+
+def build_nginx_config(routes, work_dir, worker_processes, worker_connections, stream_directives):
+    """A standalone nginx.conf with just the stream block that nginx_pods.py would generate."""
+    modules = "include /etc/nginx/modules-enabled/*.conf;" if os.path.isdir("/etc/nginx/modules-enabled") else ""
+    stream_lines = list(stream_directives) + format_stream_config(routes, log_dir=work_dir)
+    return "\n".join([
+        f"worker_processes {worker_processes};",
+        f"worker_rlimit_nofile {max(4 * worker_connections, 1024)};",
+        f"pid {work_dir}/nginx.pid;",
+        f"error_log {work_dir}/error.log;",
+        modules,
+        f"events {{ worker_connections {worker_connections}; }}",
+        "stream {",
+        *(f"    {line}" if line else "" for line in stream_lines),
+        "}",
+        "",
+    ])
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_nginx(config, work_dir, nginx_bin):
+    config_path = os.path.join(work_dir, "nginx.conf")
+    with open(config_path, "w") as f:
+        f.write(config)
+    check = subprocess.run([nginx_bin, "-t", "-p", work_dir, "-c", config_path], capture_output=True, text=True)
+    if check.returncode != 0:
+        raise RuntimeError(f"nginx rejected the benchmark config:\n{check.stderr.strip()}")
+    return subprocess.Popen([nginx_bin, "-p", work_dir, "-c", config_path, "-g", "daemon off;"],
+                            stderr=subprocess.DEVNULL)
+
+
+# --- Clients ---
+
+async def latency_connection(port, sizes, round_trips):
+    """Connect, wait for the first echoed byte (so the upstream is connected), then ping-pong."""
+    result = {"connect_ms": None, "rtt_ms": {size: [] for size in sizes}, "error": None}
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"E\x00")
+        await writer.drain()
+        await reader.readexactly(1)
+        result["connect_ms"] = (time.perf_counter() - start) * 1000
+        for size in sizes:
+            payload = b"x" * size
+            for _ in range(round_trips):
+                sent = time.perf_counter()
+                writer.write(payload)
+                await writer.drain()
+                await reader.readexactly(size)
+                result["rtt_ms"][size].append((time.perf_counter() - sent) * 1000)
+        writer.close()
+    except (OSError, asyncio.IncompleteReadError) as e:
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+
+async def transfer_connection(port, mode, size):
+    """Upload (S) or download (D) `size` bytes. Returns (bytes, start, end, error) in wall-clock time."""
+    start = time.time()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(mode + struct.pack(">Q", size))
+        if mode == b"S":
+            block = bytes(BLOCK_SIZE)
+            remaining = size
+            while remaining > 0:
+                writer.write(block[:remaining])
+                remaining -= min(BLOCK_SIZE, remaining)
+                await writer.drain()
+            moved = struct.unpack(">Q", await reader.readexactly(8))[0]
+        else:
+            await writer.drain()
+            moved = 0
+            while moved < size:
+                data = await reader.read(BLOCK_SIZE)
+                if not data:
+                    break
+                moved += len(data)
+        writer.close()
+        return moved, start, time.time(), None if moved == size else "short transfer"
+    except (OSError, asyncio.IncompleteReadError) as e:
+        return 0, start, time.time(), str(e) or type(e).__name__
+
+
+def run_client_share(phase, ports, params):
+    """Run one client process's share of the connections for a phase (all at the same time)."""
+    async def main():
+        if phase == "latency":
+            coroutines = [latency_connection(port, params["sizes"], params["round_trips"]) for port in ports]
+        else:
+            mode = b"S" if phase == "upload" else b"D"
+            coroutines = [transfer_connection(port, mode, params["transfer_bytes"]) for port in ports]
+        return await asyncio.gather(*coroutines)
+    return asyncio.run(main())
+
+
+def run_phase(pool, phase, ports, params, processes):
+    shares = [ports[i::processes] for i in range(processes)]
+    results = pool.starmap(run_client_share, [(phase, share, params) for share in shares if share])
+    return [r for share in results for r in share]
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def measure(pool, target, ports, params, processes):
+    """Run all phases against one set of ports and summarise them."""
+    latency = run_phase(pool, "latency", ports, params, processes)
+    summary = {
+        "target": target,
+        "connections": len(ports),
+        "errors": sum(1 for r in latency if r["error"]),
+        "connect_ms": {},
+        "rtt_ms": {},
+    }
+    connects = [r["connect_ms"] for r in latency if r["connect_ms"] is not None]
+    for p in (50, 90, 99):
+        summary["connect_ms"][f"p{p}"] = percentile(connects, p)
+    for size in params["sizes"]:
+        samples = [ms for r in latency for ms in r["rtt_ms"][size]]
+        summary["rtt_ms"][size] = {f"p{p}": percentile(samples, p) for p in (50, 90, 99)}
+
+    for phase in ("upload", "download"):
+        transfers = run_phase(pool, phase, ports, params, processes)
+        moved = sum(t[0] for t in transfers)
+        elapsed = max(t[2] for t in transfers) - min(t[1] for t in transfers)
+        summary[f"{phase}_mb_s"] = moved / 1e6 / max(elapsed, 1e-6)
+        summary["errors"] += sum(1 for t in transfers if t[3])
+    return summary
+
+
+def format_ms(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def print_report(summaries, sizes):
+    header = f"{'target':<8} {'conns':>6} {'connect p50/p99 ms':>20}"
+    for size in sizes:
+        header += f" {f'rtt {size}B p50/p99 ms':>24}"
+    header += f" {'up MB/s':>9} {'down MB/s':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for s in summaries:
+        line = f"{s['target']:<8} {s['connections']:>6} "
+        line += f"{format_ms(s['connect_ms']['p50']) + ' / ' + format_ms(s['connect_ms']['p99']):>20}"
+        for size in sizes:
+            rtt = s["rtt_ms"][size]
+            line += f" {format_ms(rtt['p50']) + ' / ' + format_ms(rtt['p99']):>24}"
+        line += f" {s['upload_mb_s']:>9.1f} {s['download_mb_s']:>9.1f} {s['errors']:>7}"
+        print(line)
+
+    # Proxy overhead next to the direct run with the same number of connections
+    direct = {s["connections"]: s for s in summaries if s["target"] == "direct"}
+    print()
+    for s in summaries:
+        base = direct.get(s["connections"])
+        if s["target"] != "proxy" or base is None:
+            continue
+        parts = []
+        for size in sizes:
+            if s["rtt_ms"][size]["p50"] is not None and base["rtt_ms"][size]["p50"] is not None:
+                parts.append(f"rtt {size}B p50 +{s['rtt_ms'][size]['p50'] - base['rtt_ms'][size]['p50']:.2f} ms")
+        for phase in ("upload", "download"):
+            if base[f"{phase}_mb_s"]:
+                parts.append(f"{phase} {s[f'{phase}_mb_s'] / base[f'{phase}_mb_s'] * 100:.0f}% of direct")
+        print(f"Proxy overhead at {s['connections']} connections: {', '.join(parts)}")
+
+
+if __name__ == "__main__":
+    import argparse
+    default_processes, default_connections = read_worker_settings()
+    parser = argparse.ArgumentParser(
+        description="Benchmark latency and throughput through the nginx stream proxy against local stand-in pods.")
+    parser.add_argument("--connections", type=int, nargs="+", default=[10, 100],
+                        help="Concurrent connections to run (several values run a sweep)")
+    parser.add_argument("--pods", type=int, default=55, help="Number of stand-in pods (proxy routes)")
+    parser.add_argument("--message-sizes", type=int, nargs="+", default=[64, 4096, 65536],
+                        help="Message sizes in bytes for the round-trip test")
+    parser.add_argument("--round-trips", type=int, default=50, help="Round trips per connection and message size")
+    parser.add_argument("--transfer-mb", type=float, default=16, help="MB uploaded and downloaded per connection")
+    parser.add_argument("--backend-port", type=int, default=20000, help="First port of the stand-in pods")
+    parser.add_argument("--listen-port", type=int, default=21000, help="First proxy port (kept away from real ones)")
+    parser.add_argument("--worker-processes", default=default_processes,
+                        help="nginx worker_processes (default: from proxy/nginx.conf)")
+    parser.add_argument("--worker-connections", type=int, default=default_connections,
+                        help="nginx worker_connections (default: from proxy/nginx.conf)")
+    parser.add_argument("--stream-directive", action="append", default=[],
+                        help="Extra directive for the stream block, e.g. 'proxy_buffer_size 64k;' (repeatable)")
+    parser.add_argument("--client-processes", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="Processes driving the client connections")
+    parser.add_argument("--direct-only", action="store_true", help="Only measure the stand-in pods directly (no nginx)")
+    parser.add_argument("--nginx", default=shutil.which("nginx") or "/usr/sbin/nginx", help="nginx binary")
+    parser.add_argument("--print-config", action="store_true", help="Print the generated nginx config and exit")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    routes = {f"bench{i}": {"ip": "127.0.0.1", "port": args.backend_port + i, "listen_port": args.listen_port + i}
+              for i in range(args.pods)}
+    work_dir = tempfile.mkdtemp(prefix="proxy_benchmark_")
+    config = build_nginx_config(routes, work_dir, args.worker_processes, args.worker_connections,
+                                args.stream_directive)
+    if args.print_config:
+        print(config)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        sys.exit(0)
+
+    params = {
+        "sizes": args.message_sizes,
+        "round_trips": args.round_trips,
+        "transfer_bytes": int(args.transfer_mb * 1024 * 1024),
+    }
+    backend_ports = [route["port"] for route in routes.values()]
+    listen_ports = [route["listen_port"] for route in routes.values()]
+    backends = start_backends(backend_ports, args.client_processes)
+    nginx = None
+    try:
+        if not wait_for_port(backend_ports[-1]):
+            print("Error: the stand-in pods did not start (are the backend ports free?)")
+            sys.exit(1)
+        if not args.direct_only:
+            if not os.path.exists(args.nginx):
+                print(f"Error: nginx not found at {args.nginx} (install nginx-full, or use --direct-only)")
+                sys.exit(1)
+            nginx = start_nginx(config, work_dir, args.nginx)
+            if not wait_for_port(listen_ports[-1]):
+                print(f"Error: nginx did not start, see {work_dir}/error.log")
+                sys.exit(1)
+
+        summaries = []
+        with multiprocessing.Pool(args.client_processes) as pool:
+            for connections in args.connections:
+                # Connections are spread over the pods round-robin, like participants over machines
+                for target, ports in (("direct", backend_ports), ("proxy", listen_ports)):
+                    if target == "proxy" and nginx is None:
+                        continue
+                    print(f"Running {connections} connections {target}...", file=sys.stderr)
+                    summaries.append(measure(pool, target, [ports[i % len(ports)] for i in range(connections)],
+                                             params, args.client_processes))
+    finally:
+        if nginx is not None:
+            nginx.terminate()
+            nginx.wait()
+        for backend in backends:
+            backend.terminate()
+
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        if nginx is not None:
+            print(f"\nnginx: worker_processes {args.worker_processes}, worker_connections {args.worker_connections}"
+                  + (f", {' '.join(args.stream_directive)}" if args.stream_directive else ""))
+        print_report(summaries, args.message_sizes)
+    shutil.rmtree(work_dir, ignore_errors=True)
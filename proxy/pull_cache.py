@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Pull-through cache on the proxy for the downloads every pod makes: pip
+wheels, conda packages and Hugging Face hub files. The first pod to fetch a
+file fills the cache, and every other pod gets it from the proxy.
+
+Prints an nginx http config (written to /etc/nginx/conf.d/pull_cache.conf by
+setup_nginx.sh) serving, on PULL_CACHE_LISTEN_PORT:
+    /pypi/simple/   PyPI index, with file links rewritten to /pypi/files/
+    /conda/         conda channels (conda.anaconda.org), for CONDA_CHANNEL_ALIAS
+    /anaconda/      the "defaults" channels (repo.anaconda.com)
+    /hf/            the Hugging Face hub, for HF_ENDPOINT; redirects to the
+                    hub's CDN are rewritten to /hf-cdn/, so the weights are
+                    cached too
+Pods use it when created with ARENA_CACHE_URL set (scripts/pull_cache_env.sh).
+
+Index pages are only cached briefly, so new releases show up. Package files
+and hub CDN objects are immutable (their URLs contain the version or the
+content hash), so they are kept until unused for PULL_CACHE_INACTIVE, and
+fetched in slices, so other pods asking for a large file that is still being
+downloaded start getting it right away instead of waiting for all of it.
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import urllib.request
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mydotenv import load_env
+load_env()
+
+DEFAULT_UPSTREAMS = {
+    "pypi": "https://pypi.org",
+    "pypi_files": "https://files.pythonhosted.org",
+    "conda": "https://conda.anaconda.org",
+    "anaconda": "https://repo.anaconda.com",
+    "hf": "https://huggingface.co",
+}
+# Hosts the hub redirects downloads to (cdn-lfs.hf.co, cas-bridge.xethub.hf.co, ...); only these are proxied
+DEFAULT_HF_CDN_PATTERN = r"[a-z0-9.-]+\.hf\.co"
+SLICE_SIZE = "16m"
+
+
+def get_upstreams():
+    """Upstream base URLs, overridable with PULL_CACHE_<NAME>_UPSTREAM (e.g. PULL_CACHE_PYPI_UPSTREAM)."""
+    return {name: os.getenv(f"PULL_CACHE_{name.upper()}_UPSTREAM", url).rstrip("/")
+            for name, url in DEFAULT_UPSTREAMS.items()}
+
+
+def get_resolver():
+    """First nameserver of this machine, for the CDN hosts nginx only learns about at request time."""
+    try:
+        with open("/etc/resolv.conf") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    return f"[{parts[1]}]" if ":" in parts[1] else parts[1]
+    except OSError:
+        pass
+    return "1.1.1.1"
+
+
+def format_proxy_headers(host):
+    # proxy_set_header in a location replaces all the inherited ones, so every location sets the full list
+    return [
+        f"        proxy_set_header Host {host};",
+        "        proxy_set_header Connection \"\";",
+    ]
+
+
+def format_index_location(path, upstream, valid="10m"):
+    """Lines of a location whose answers change over time (index pages, API calls)."""
+    return [
+        f"    location {path} {{",
+        f"        proxy_pass {upstream}/;",
+        *format_proxy_headers(urlsplit(upstream).netloc),
+        f"        proxy_cache_valid 200 {valid};",
+        "        proxy_cache_use_stale error timeout updating http_500 http_502 http_503 http_504;",
+        "        proxy_cache_background_update on;",
+    ]
+
+
+def format_file_cache(key):
+    """Lines caching an immutable file in slices, keyed by `key`."""
+    return [
+        f"        slice {SLICE_SIZE};",
+        f"        proxy_cache_key {key}$slice_range;",
+        "        proxy_set_header Range $slice_range;",
+        "        proxy_cache_valid 200 206 1y;",
+        "        proxy_ignore_headers Cache-Control Expires Set-Cookie;",
+        "        proxy_hide_header Set-Cookie;",
+    ]
+
+
+def format_cache_config(upstreams=None, listen=3142, cache_path="/var/cache/nginx/pull_cache", max_size="200g",
+                        inactive="30d", hf_cdn_pattern=DEFAULT_HF_CDN_PATTERN, resolver=None):
+    """
+    Lines of the http config of the pull-through cache, to be included from
+    the http block (e.g. /etc/nginx/conf.d/pull_cache.conf).
+    """
+    upstreams = upstreams or get_upstreams()
+    resolver = resolver or get_resolver()
+    pypi_files = upstreams["pypi_files"]
+    lines = [
+        f"proxy_cache_path {cache_path} levels=1:2 keys_zone=pull_cache:100m max_size={max_size} "
+        f"inactive={inactive} use_temp_path=off;",
+        "",
+        "server {",
+        f"    listen {listen};",
+        "    server_name _;",
+        f"    resolver {resolver} valid=300s ipv6=off;",
+        "",
+        "    proxy_cache pull_cache;",
+        "    proxy_http_version 1.1;",
+        "    proxy_ssl_server_name on;",
+        "    proxy_read_timeout 300s;",
+        "    proxy_cache_lock on;",
+        "    proxy_cache_lock_timeout 30s;",
+        "    proxy_cache_lock_age 30s;",
+        "    add_header X-Cache-Status $upstream_cache_status always;",
+        "",
+        "    # PyPI index pages (HTML or JSON), with the file links pointing back at this cache",
+        *format_index_location("/pypi/simple/", upstreams["pypi"] + "/simple"),
+        "        proxy_set_header Accept-Encoding \"\";",
+        f"        sub_filter '{pypi_files}/' '$scheme://$http_host/pypi/files/';",
+        "        sub_filter_once off;",
+        "        sub_filter_types application/vnd.pypi.simple.v1+json application/vnd.pypi.simple.v1+html;",
+        "    }",
+        "    location /pypi/files/ {",
+        f"        proxy_pass {pypi_files}/;",
+        *format_proxy_headers(urlsplit(pypi_files).netloc),
+        *format_file_cache("$uri"),
+        "    }",
+        "",
+    ]
+    # conda channels: the repodata changes, the package files never do
+    for name in ("conda", "anaconda"):
+        upstream = upstreams[name]
+        lines += [
+            *format_index_location(f"/{name}/", upstream, valid="30m"),
+            "        location ~ \\.(conda|tar\\.bz2)$ {",
+            f"            rewrite ^/{name}/(.*)$ /$1 break;",
+            f"            proxy_pass {upstream};",
+            *["    " + line for line in format_proxy_headers(urlsplit(upstream).netloc)],
+            *["    " + line for line in format_file_cache("$uri")],
+            "        }",
+            "    }",
+        ]
+    lines.append("")
+
+    # The hub answers API calls itself, and redirects file downloads to its CDN with a signed URL
+    hf = upstreams["hf"]
+    lines += [
+        *format_index_location("/hf/", hf, valid="5m"),
+        "        # Gated and private repos: never share answers given to a token",
+        "        proxy_cache_bypass $http_authorization;",
+        "        proxy_no_cache $http_authorization;",
+        f"        proxy_redirect ~^(https?)://({hf_cdn_pattern})/(.*)$ $scheme://$http_host/hf-cdn/$1/$2/$3;",
+        "        proxy_redirect / /hf/;",
+        "    }",
+        f"    location ~ ^/hf-cdn/(https?)/({hf_cdn_pattern})/(.*)$ {{",
+        "        proxy_pass $1://$2/$3$is_args$args;",
+        "        proxy_set_header Host $2;",
+        "        proxy_set_header Connection \"\";",
+        # The query string is a signature that changes every time, the path has the content hash
+        *format_file_cache("$2/$3"),
+        "    }",
+        "}",
+        "",
+    ]
+    return lines
+
+
+# --- Self-test against a local fake upstream ---
+
+class FakeUpstream(BaseHTTPRequestHandler):
+    """
+    Stands in for all the upstreams at once: a PyPI index and its files, a
+    conda channel, and a hub that redirects downloads to a "CDN" with a
+    different signature every time. Counts the requests for each path.
+    """
+    files = {}
+    requests = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+        base = f"http://{self.headers['Host']}"
+        if path == "/simple/demo/":
+            self.respond(200, f'<a href="{base}/files/ab/demo-1.0-py3-none-any.whl#sha256=00">demo</a>'.encode(),
+                         "text/html")
+        elif path == "/hf/demo/model/resolve/main/model.bin":
+            digest = hashlib.sha256(self.files["/cdn/model.bin"]).hexdigest()
+            self.send_response(302)
+            self.send_header("Location", f"{base}/cdn/model.bin?sig={digest[:8]}{time.time_ns()}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif path in self.files:
+            self.respond_file(self.files[path])
+        else:
+            self.respond(404, b"not found", "text/plain")
+
+    def respond(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def respond_file(self, data):
+        # The slices are fetched with Range requests
+        match = re.match(r"bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if not match:
+            self.respond(200, data, "application/octet-stream", [("Accept-Ranges", "bytes")])
+            return
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+        self.respond(206, data[start:end + 1], "application/octet-stream",
+                     [("Accept-Ranges", "bytes"), ("Content-Range", f"bytes {start}-{end}/{len(data)}")])
+
+
+def build_test_nginx_config(cache_lines, work_dir):
+    """A standalone nginx.conf with just the cache server, writing everything under work_dir."""
+    modules = "include /etc/nginx/modules-enabled/*.conf;" if os.path.isdir("/etc/nginx/modules-enabled") else ""
+    temp_paths = [f"{name}_temp_path {work_dir}/{name}_temp;"
+                  for name in ("client_body", "proxy", "fastcgi", "uwsgi", "scgi")]
+    return "\n".join([
+        f"pid {work_dir}/nginx.pid;",
+        f"error_log {work_dir}/error.log;",
+        modules,
+        "events { worker_connections 256; }",
+        "http {",
+        f"    access_log {work_dir}/access.log;",
+        *(f"    {line}" for line in temp_paths),
+        *(f"    {line}" if line else "" for line in cache_lines),
+        "}",
+        "",
+    ])
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read(), response.headers.get("X-Cache-Status")
+
+
+def self_test(nginx_bin, upstream_port, listen_port, file_mb):
+    """Fetch every kind of file twice through a temporary nginx; the second time must come from the cache."""
+    from proxy_benchmark import start_nginx, wait_for_port
+    FakeUpstream.files = {
+        "/files/ab/demo-1.0-py3-none-any.whl": os.urandom(file_mb * 1024 * 1024),
+        "/conda-forge/noarch/repodata.json": b'{"packages": {}}',
+        "/conda-forge/noarch/demo-1.0-0.conda": os.urandom(1024 * 1024),
+        "/cdn/model.bin": os.urandom(file_mb * 1024 * 1024),
+    }
+    upstream = ThreadingHTTPServer(("127.0.0.1", upstream_port), FakeUpstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{upstream_port}"
+    upstreams = {"pypi": base, "pypi_files": f"{base}/files", "conda": base, "anaconda": base, "hf": f"{base}/hf"}
+    work_dir = tempfile.mkdtemp(prefix="pull_cache_test_")
+    # The nginx workers (not root) write the cache and temp files in here
+    os.chmod(work_dir, 0o755)
+    cache_lines = format_cache_config(upstreams, listen=listen_port, cache_path=f"{work_dir}/cache",
+                                      max_size="1g", hf_cdn_pattern=r"127\.0\.0\.1:\d+", resolver="127.0.0.1")
+    nginx = start_nginx(build_test_nginx_config(cache_lines, work_dir), work_dir, nginx_bin)
+    cache = f"http://127.0.0.1:{listen_port}"
+    failed = 0
+    try:
+        if not wait_for_port(listen_port):
+            print(f"Error: nginx did not start, see {work_dir}/error.log")
+            return False
+
+        index, _ = fetch(f"{cache}/pypi/simple/demo/")
+        links = re.findall(rb'href="([^"#]+)', index)
+        checks = [
+            ("pypi index links point at the cache", lambda: links == [f"{cache}/pypi/files/ab/demo-1.0-py3-none-any.whl".encode()]),
+        ]
+        downloads = [
+            ("pip wheel", links[0].decode() if links else f"{cache}/pypi/files/ab/demo-1.0-py3-none-any.whl",
+             "/files/ab/demo-1.0-py3-none-any.whl"),
+            ("conda package", f"{cache}/conda/conda-forge/noarch/demo-1.0-0.conda", "/conda-forge/noarch/demo-1.0-0.conda"),
+            ("hub file (via CDN redirect)", f"{cache}/hf/demo/model/resolve/main/model.bin", "/cdn/model.bin"),
+        ]
+        for name, url, path in downloads:
+            first, _ = fetch(url)
+            upstream_requests = FakeUpstream.requests.get(path, 0)
+            second, status = fetch(url)
+            checks.append((f"{name}: content matches", lambda a=first, b=second, p=path: a == b == FakeUpstream.files[p]))
+            checks.append((f"{name}: second download served from the cache ({status})",
+                           lambda s=status, p=path, n=upstream_requests: s == "HIT" and FakeUpstream.requests[p] == n))
+        for name, check in checks:
+            ok = check()
+            failed += not ok
+            print(f"{'✓' if ok else '✗'} {name}")
+    finally:
+        nginx.terminate()
+        nginx.wait()
+        upstream.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"\n{len(checks) - failed}/{len(checks)} checks passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Print the nginx config of the pull-through cache for pip, conda and Hugging Face downloads.")
+    parser.add_argument("--listen", type=int, default=int(os.getenv("PULL_CACHE_LISTEN_PORT", "3142")),
+                        help="Port the pods download from (overrides PULL_CACHE_LISTEN_PORT env var)")
+    parser.add_argument("--cache-path", default=os.getenv("PULL_CACHE_PATH", "/var/cache/nginx/pull_cache"),
+                        help="Cache directory (overrides PULL_CACHE_PATH env var)")
+    parser.add_argument("--max-size", default=os.getenv("PULL_CACHE_MAX_SIZE", "200g"),
+                        help="Disk space the cache may use (overrides PULL_CACHE_MAX_SIZE env var)")
+    parser.add_argument("--inactive", default=os.getenv("PULL_CACHE_INACTIVE", "30d"),
+                        help="Drop files not downloaded for this long (overrides PULL_CACHE_INACTIVE env var)")
+    parser.add_argument("--resolver", help="DNS server for the hub's CDN hosts (default: from /etc/resolv.conf)")
+    parser.add_argument("--self-test", action="store_true",
+                        help="Check the config against a local fake upstream with a temporary nginx and exit")
+    parser.add_argument("--nginx", default=shutil.which("nginx") or "/usr/sbin/nginx", help="nginx binary for --self-test")
+    parser.add_argument("--test-upstream-port", type=int, default=22000, help="Port of the fake upstream for --self-test")
+    parser.add_argument("--test-listen-port", type=int, default=22001, help="Port of the temporary cache for --self-test")
+    parser.add_argument("--test-file-mb", type=int, default=40, help="Size of the large test files for --self-test")
+    args = parser.parse_args()
+
+    if args.self_test:
+        if not os.path.exists(args.nginx):
+            print(f"Error: nginx not found at {args.nginx} (install nginx-full)")
+            sys.exit(1)
+        sys.exit(0 if self_test(args.nginx, args.test_upstream_port, args.test_listen_port, args.test_file_mb) else 1)
+
+    print("\n".join(format_cache_config(listen=args.listen, cache_path=args.cache_path, max_size=args.max_size,
+                                        inactive=args.inactive, resolver=args.resolver)))
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Retry, backoff and circuit breaking for RunPod API calls.
+
+Wrap any API call with `retry_call(fn, *args, **kwargs)`. Transient errors
+(connection problems, timeouts, 429 and 5xx responses) are retried with
+exponential backoff and full jitter, honouring `Retry-After` when the API
+sends one. Permanent errors (bad API key, invalid request) are raised
+immediately.
+
+All calls share one circuit breaker by default: after several consecutive
+failures the circuit opens and every caller waits for the cooldown before
+trying again, so a batch pauses as a whole instead of burning through its
+retries while the API is down.
+
+Progress messages go to stderr, since some scripts (nginx_pods.py) print
+their actual output to stdout. An identical copy lives in management/ and
+proxy/, like mydotenv.py.
+"""
+import os
+import sys
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 523, 524}
+PERMANENT_STATUS_CODES = {400, 401, 403, 404, 405, 409, 410, 422}
+
+# Substrings in error messages (e.g. GraphQL errors) that indicate a transient problem
+RETRYABLE_MESSAGES = (
+    "rate limit",
+    "too many requests",
+    "try again",
+    "temporarily unavailable",
+    "timed out",
+    "timeout",
+    "connection reset",
+    "bad gateway",
+    "service unavailable",
+    "internal server error",
+)
+# Substrings that mean retrying cannot help (e.g. no GPUs of this type left)
+PERMANENT_MESSAGES = (
+    "unauthorized",
+    "api key",
+    "does not have the resources",
+    "no longer any instances available",
+    "not found",
+    "invalid",
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised when the API still looks down after waiting for the circuit to close."""
+
+
+def get_status_code(exc):
+    """Extract an HTTP status code from urllib, requests or runpod errors, if any."""
+    for attr in ("code", "status", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    if response is not None:
+        value = getattr(response, "status_code", None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def get_retry_after(exc):
+    """Return the server's requested wait in seconds from a Retry-After header, if any."""
+    headers = getattr(exc, "headers", None)
+    if headers is None and getattr(exc, "response", None) is not None:
+        headers = getattr(exc.response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc):
+    """Classify an exception from an API call as transient (True) or permanent (False)."""
+    status = get_status_code(exc)
+    if status is not None:
+        if status in RETRYABLE_STATUS_CODES:
+            return True
+        if status in PERMANENT_STATUS_CODES or 400 <= status < 500:
+            return False
+        if status >= 500:
+            return True
+
+    message = str(exc).lower()
+    if "429" in message:
+        return True
+    if any(s in message for s in PERMANENT_MESSAGES):
+        return False
+    if any(s in message for s in RETRYABLE_MESSAGES):
+        return True
+
+    # Network-level failures: urllib.error.URLError, socket errors and
+    # requests.exceptions.RequestException are all OSError subclasses
+    if isinstance(exc, (ConnectionError, TimeoutError, OSError)):
+        return True
+    # A proxy/Cloudflare error page instead of JSON shows up as a decode error
+    if type(exc).__name__ == "JSONDecodeError":
+        return True
+    return False
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Exponential backoff with full jitter for the given (0-based) attempt."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failures across all callers.
+
+    Once `failure_threshold` failures happen in a row the circuit opens, and
+    every call waits until `reset_timeout` seconds have passed before a
+    single trial call is let through. A success closes the circuit again.
+    If the circuit has opened `max_open_cycles` times without a success in
+    between, CircuitOpenError is raised so the batch can be aborted.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, max_open_cycles=10):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_open_cycles = max_open_cycles
+        self.consecutive_failures = 0
+        self.open_cycles = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """Block while the circuit is open."""
+        while True:
+            with self.lock:
+                if self.opened_at is None:
+                    return
+                if self.open_cycles > self.max_open_cycles:
+                    raise CircuitOpenError(
+                        f"API still failing after {self.open_cycles} cooldowns of {self.reset_timeout}s"
+                    )
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining <= 0:
+                    # Half-open: let this caller try, keep the others waiting
+                    self.opened_at = time.monotonic()
+                    return
+            time.sleep(min(remaining, 1.0))
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            self.open_cycles = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                self.open_cycles += 1
+                print(f"API looks unavailable after {self.consecutive_failures} consecutive failures, "
+                      f"pausing for {self.reset_timeout:.0f}s...", file=sys.stderr)
+            elif self.opened_at is not None:
+                # Failed trial call: stay open for another cooldown
+                self.opened_at = time.monotonic()
+                self.open_cycles += 1
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+default_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("API_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("API_BREAKER_COOLDOWN", "30")),
+)
+
+
+def retry_call(fn, *args, retries=None, base_delay=1.0, max_delay=30.0,
+               breaker=default_breaker, before_retry=None, **kwargs):
+    """
+    Call `fn(*args, **kwargs)`, retrying transient failures.
+
+    Args:
+        retries (int): Maximum number of retries (default API_MAX_RETRIES or 5).
+        base_delay (float): First backoff step in seconds.
+        max_delay (float): Upper bound for a single backoff step.
+        breaker (CircuitBreaker): Shared breaker, or None to disable.
+        before_retry (callable): Called with the last exception before each
+            retry. If it returns anything other than None, that value is
+            returned instead of retrying (e.g. when a create turns out to
+            have succeeded despite the error).
+    """
+    if retries is None:
+        retries = int(os.getenv("API_MAX_RETRIES", "5"))
+    name = getattr(fn, "__name__", "API call")
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            retryable = is_retryable(e)
+            if breaker is not None and retryable:
+                breaker.record_failure()
+            if not retryable or attempt >= retries:
+                raise
+            delay = get_retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+            print(f"  {name} failed ({str(e)[:120]}), retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 1}/{retries})...", file=sys.stderr)
+            time.sleep(delay)
+            attempt += 1
+            if before_retry is not None:
+                recovered = before_retry(e)
+                if recovered is not None:
+                    return recovered
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
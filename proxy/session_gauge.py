@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import os
+import re
+import ast
+import sys
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mydotenv import load_env
+load_env()
+
+PROC_NET_FILES = ("/proc/net/tcp", "/proc/net/tcp6")
+TCP_ESTABLISHED = b"01"
+
+# Matches the `server { listen <port>; proxy_pass <machine>; }` lines written by nginx_pods.py
+LISTEN_RE = re.compile(r"listen\s+(\d+)\s*;\s*proxy_pass\s+([\w.-]+)\s*;")
+
+
+def load_port_map(config_path=None):
+    """
+    Map each proxy listen port to its machine name.
+
+    Reads the stream config generated by nginx_pods.py. If it does not exist,
+    falls back to the same port numbering nginx_pods.py uses
+    (SSH_PROXY_STARTING_PORT + index in MACHINE_NAME_LIST).
+    """
+    config_path = os.path.expanduser(config_path or os.getenv("SSH_PROXY_NGINX_CONFIG_PATH", "~/proxy.conf"))
+    port_map = {}
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            for port, machine_name in LISTEN_RE.findall(f.read()):
+                port_map[int(port)] = machine_name
+        return port_map
+
+    machine_name_list = ast.literal_eval(os.getenv("MACHINE_NAME_LIST", "[]"))
+    proxy_starting_port = int(os.getenv("SSH_PROXY_STARTING_PORT", "12000"))
+    for i, machine_name in enumerate(machine_name_list):
+        port_map[proxy_starting_port + i] = machine_name
+    return port_map
+
+
+def count_established(ports, proc_files=PROC_NET_FILES):
+    """
+    Count established inbound TCP connections per local port.
+
+    Reads /proc/net/tcp{,6} directly in one pass each. Only the first four
+    columns of each row are split, so a pass over thousands of sockets stays
+    in the low milliseconds.
+
+    Returns:
+        (sessions, clients): dicts of port -> connection count and
+        port -> number of distinct remote addresses.
+    """
+    sessions = dict.fromkeys(ports, 0)
+    remotes = {port: set() for port in ports}
+    for path in proc_files:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        # Skip the header row
+        for line in data.split(b"\n")[1:]:
+            fields = line.split(None, 4)
+            if len(fields) < 4 or fields[3] != TCP_ESTABLISHED:
+                continue
+            local = fields[1]
+            port = int(local[local.rindex(b":") + 1:], 16)
+            if port in sessions:
+                sessions[port] += 1
+                remote = fields[2]
+                remotes[port].add(remote[:remote.rindex(b":")])
+    clients = {port: len(addrs) for port, addrs in remotes.items()}
+    return sessions, clients
+
+
+def sample(port_map=None):
+    """Take one snapshot of live sessions per machine."""
+    if port_map is None:
+        port_map = load_port_map()
+    start = time.perf_counter()
+    sessions, clients = count_established(port_map.keys())
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    machines = {}
+    for port, machine_name in sorted(port_map.items()):
+        machines[machine_name] = {
+            "listen_port": port,
+            "sessions": sessions[port],
+            "clients": clients[port],
+        }
+    idle = [name for name, m in machines.items() if m["sessions"] == 0]
+    return {
+        "timestamp": time.time(),
+        "sample_ms": round(elapsed_ms, 3),
+        "total_sessions": sum(sessions.values()),
+        "active_machines": len(machines) - len(idle),
+        "idle_machines": len(idle),
+        "idle": idle,
+        "machines": machines,
+    }
+
+
+def format_prometheus(snapshot):
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = [
+        "# HELP arena_machine_sessions Established SSH sessions through the proxy per machine.",
+        "# TYPE arena_machine_sessions gauge",
+    ]
+    for name, m in snapshot["machines"].items():
+        lines.append(f'arena_machine_sessions{{machine="{name}",listen_port="{m["listen_port"]}"}} {m["sessions"]}')
+    lines += [
+        "# HELP arena_machine_clients Distinct client addresses connected per machine.",
+        "# TYPE arena_machine_clients gauge",
+    ]
+    for name, m in snapshot["machines"].items():
+        lines.append(f'arena_machine_clients{{machine="{name}"}} {m["clients"]}')
+    lines += [
+        "# HELP arena_idle_machines Machines with no established sessions.",
+        "# TYPE arena_idle_machines gauge",
+        f"arena_idle_machines {snapshot['idle_machines']}",
+        "# HELP arena_sessions_total Established sessions across all machines.",
+        "# TYPE arena_sessions_total gauge",
+        f"arena_sessions_total {snapshot['total_sessions']}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def print_table(snapshot, show_idle=True):
+    print("=" * 60)
+    print(f"{'Machine':<15} {'Listen Port':<12} {'Sessions':<10} {'Clients':<10}")
+    print("=" * 60)
+    for name, m in snapshot["machines"].items():
+        if not show_idle and m["sessions"] == 0:
+            continue
+        print(f"{name:<15} {m['listen_port']:<12} {m['sessions']:<10} {m['clients']:<10}")
+    print("=" * 60)
+    print(f"Total sessions: {snapshot['total_sessions']}")
+    print(f"Active machines: {snapshot['active_machines']}")
+    print(f"Idle machines: {snapshot['idle_machines']}")
+    print(f"(sampled in {snapshot['sample_ms']} ms)")
+
+
+class GaugeHandler(BaseHTTPRequestHandler):
+    config_path = None
+
+    def do_GET(self):
+        port_map = load_port_map(self.config_path)
+        snapshot = sample(port_map)
+        if self.path in ("/", "/sessions", "/sessions.json"):
+            body = json.dumps(snapshot).encode("utf-8")
+            content_type = "application/json"
+        elif self.path == "/metrics":
+            body = format_prometheus(snapshot).encode("utf-8")
+            content_type = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(bind, port, config_path=None):
+    GaugeHandler.config_path = config_path
+    server = ThreadingHTTPServer((bind, port), GaugeHandler)
+    print(f"Serving session gauge on http://{bind}:{port}/ (JSON) and /metrics (Prometheus)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Show live SSH sessions per machine on the proxy")
+    parser.add_argument("--config", help="Path to the stream config generated by nginx_pods.py (default: SSH_PROXY_NGINX_CONFIG_PATH)")
+    parser.add_argument("--json", action="store_true", help="Print the snapshot as JSON")
+    parser.add_argument("--active", action="store_true", help="Only show machines with active sessions")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="Repeat every SECONDS")
+    parser.add_argument("--serve", action="store_true", help="Run a small HTTP endpoint instead of printing")
+    parser.add_argument("--bind", default="127.0.0.1", help="Address to bind the HTTP endpoint to")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SESSION_GAUGE_PORT", "9101")), help="Port for the HTTP endpoint")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.bind, args.port, args.config)
+        sys.exit(0)
+
+    while True:
+        snapshot = sample(load_port_map(args.config))
+        if args.json:
+            print(json.dumps(snapshot, indent=2))
+        else:
+            print_table(snapshot, show_idle=not args.active)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+        print()
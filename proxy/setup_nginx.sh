@@ -4,6 +4,17 @@ cp ./update.sh ~/
 cp ./nginx.conf /etc/nginx/nginx.conf
 mkdir /etc/nginx/streams-enabled
 touch /etc/nginx/streams-enabled/proxy.conf
+# Cache for the optional Jupyter reverse proxy (JUPYTER_PROXY, nginx_pods.py --jupyter)
+jupyter_cache_path=$(python3 -c 'import os, mydotenv; mydotenv.load_env(); print(os.getenv("JUPYTER_PROXY_CACHE_PATH") or "/var/cache/nginx/jupyter")')
+mkdir -p "$jupyter_cache_path"
+chown www-data "$jupyter_cache_path"
+# Optional pull-through cache for the pods' pip/conda/Hugging Face downloads (pull_cache.py, ARENA_CACHE_URL)
+if [[ " $* " == *" --pull-cache "* ]]; then
+  python3 ./pull_cache.py > /etc/nginx/conf.d/pull_cache.conf
+  pull_cache_path=$(grep -o '^proxy_cache_path [^ ]*' /etc/nginx/conf.d/pull_cache.conf | cut -d' ' -f2)
+  mkdir -p "$pull_cache_path"
+  chown www-data "$pull_cache_path"
+fi
 cd ~
 ln -s /etc/nginx/streams-enabled/proxy.conf .
 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Assign machines to proxy hosts with consistent hashing.
+
+Proxy hosts come from SSH_PROXY_HOSTS in config.env, falling back to the
+single SSH_PROXY_HOST. Each host gets many points on a hash ring and a machine
+is served by the first host clockwise from the hash of its pod name, so adding
+or removing a proxy only moves the machines on that proxy's share of the ring.
+
+A proxy finds out which host it is from SSH_PROXY_NAME (set in its own
+config.env), so every proxy can run the same nginx_pods.py and only route its
+own machines. An identical copy lives in management/ and proxy/, like mydotenv.py.
+"""
+import os
+import ast
+import bisect
+import hashlib
+
+# Points per host on the ring; more points spread machines more evenly
+RING_REPLICAS = 100
+
+
+def get_proxy_hosts():
+    """Proxy hosts from SSH_PROXY_HOSTS, or [SSH_PROXY_HOST] when it is not set."""
+    hosts = ast.literal_eval(os.getenv("SSH_PROXY_HOSTS", "[]") or "[]")
+    if not hosts and os.getenv("SSH_PROXY_HOST"):
+        hosts = [os.getenv("SSH_PROXY_HOST")]
+    return hosts
+
+
+def get_this_proxy():
+    """The proxy host this machine is (SSH_PROXY_NAME), or None when not sharding."""
+    return os.getenv("SSH_PROXY_NAME") or None
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+def build_ring(hosts, replicas=RING_REPLICAS):
+    """Sorted (point, host) pairs for the given hosts."""
+    return sorted((_hash(f"{host}#{i}"), host) for host in hosts for i in range(replicas))
+
+
+def proxy_for(key, hosts=None, ring=None):
+    """The proxy host that serves `key` (a pod name such as "arena-apple")."""
+    if ring is None:
+        ring = build_ring(get_proxy_hosts() if hosts is None else hosts)
+    if not ring:
+        return None
+    index = bisect.bisect(ring, (_hash(key),)) % len(ring)
+    return ring[index][1]
+
+
+def assign(keys, hosts=None):
+    """Map each key to its proxy host, building the ring only once."""
+    ring = build_ring(get_proxy_hosts() if hosts is None else hosts)
+    return {key: proxy_for(key, ring=ring) for key in keys}
+
+
+if __name__ == "__main__":
+    from mydotenv import load_env
+    load_env()
+
+    from inventory import get_pools
+
+    hosts = get_proxy_hosts()
+    machine_name_list = ast.literal_eval(os.getenv("MACHINE_NAME_LIST"))
+    keys = [f"{prefix}-{machine}" for prefix, _ in get_pools() for machine in machine_name_list]
+    assignment = assign(keys, hosts)
+
+    print(f"{'Machine':<24} {'Proxy'}")
+    print("=" * 60)
+    for key in keys:
+        print(f"{key:<24} {assignment[key]}")
+    print("=" * 60)
+    for host in hosts:
+        count = sum(1 for proxy in assignment.values() if proxy == host)
+        print(f"{host}: {count} machines")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Small agent that runs on each pod and serves many requests over one channel.
+
+The management side starts it once per pod with
+`ssh <pod> python3 /root/.arena_infra/scripts/arena_agent.py --stdio`, so the
+channel is authenticated by the existing SSH key, and then sends any number of
+requests over that one connection instead of paying a new SSH handshake and
+shell startup for each command.
+
+Protocol: one JSON object per line in each direction. The agent first writes
+{"agent": "arena", "version": 1, "pid": ...}. Each request is
+{"id": <any>, "op": <name>, ...params}; requests are handled concurrently and
+each response {"id": ..., "ok": true, "result": ...} or
+{"id": ..., "ok": false, "error": "..."} may arrive in any order.
+
+Ops:
+    ping                                -> {"time"}
+    exec     cmd, timeout, cwd, env     -> {"returncode", "stdout", "stderr"}
+    put      path, data (base64), offset, truncate, mode -> {"written"}
+    stat     path                       -> {"size", "mode", "mtime"}
+    get      path, offset, length       -> {"data" (base64), "eof"}
+    metrics                             -> load, memory, disk and GPU usage
+
+Only uses the standard library, so it runs with the system python3.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import shutil
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+PROTOCOL_VERSION = 1
+MAX_WORKERS = 16
+
+
+def op_ping(request):
+    return {"time": time.time()}
+
+
+def op_exec(request):
+    env = dict(os.environ, **request.get("env", {}))
+    try:
+        result = subprocess.run(
+            ["bash", "-c", request["cmd"]], capture_output=True, text=True,
+            timeout=request.get("timeout"), cwd=request.get("cwd"), env=env,
+        )
+    except subprocess.TimeoutExpired as e:
+        stdout = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else e.stdout or ""
+        return {"returncode": None, "stdout": stdout, "stderr": f"timed out after {e.timeout}s"}
+    return {"returncode": result.returncode, "stdout": result.stdout, "stderr": result.stderr}
+
+
+def op_put(request):
+    path = os.path.expanduser(request["path"])
+    data = base64.b64decode(request.get("data", ""))
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if request.get("truncate") else 0)
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    fd = os.open(path, flags, request.get("mode", 0o644))
+    try:
+        # pwrite lets chunks of one file arrive (and be written) in any order
+        written = os.pwrite(fd, data, request.get("offset", 0))
+    finally:
+        os.close(fd)
+    return {"written": written}
+
+
+def op_stat(request):
+    st = os.stat(os.path.expanduser(request["path"]))
+    return {"size": st.st_size, "mode": st.st_mode & 0o7777, "mtime": st.st_mtime}
+
+
+def op_get(request):
+    path = os.path.expanduser(request["path"])
+    offset = request.get("offset", 0)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(request.get("length", 1024 * 1024))
+        eof = offset + len(data) >= os.fstat(f.fileno()).st_size
+    return {"data": base64.b64encode(data).decode("ascii"), "eof": eof}
+
+
+def read_meminfo():
+    meminfo = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            meminfo[key] = int(value.split()[0]) * 1024
+    return meminfo
+
+
+def read_gpus():
+    if not shutil.which("nvidia-smi"):
+        return []
+    result = subprocess.run(
+        ["nvidia-smi", "--query-gpu=utilization.gpu,memory.used,memory.total", "--format=csv,noheader,nounits"],
+        capture_output=True, text=True, timeout=10,
+    )
+    gpus = []
+    for line in result.stdout.strip().splitlines():
+        util, used, total = (part.strip() for part in line.split(","))
+        gpus.append({"util_percent": float(util), "memory_used_mb": float(used), "memory_total_mb": float(total)})
+    return gpus
+
+
+def op_metrics(request):
+    with open("/proc/loadavg") as f:
+        load = [float(x) for x in f.read().split()[:3]]
+    meminfo = read_meminfo()
+    disks = {}
+    for mount in ("/", "/workspace"):
+        if os.path.exists(mount):
+            usage = shutil.disk_usage(mount)
+            disks[mount] = {"used": usage.used, "total": usage.total}
+    with open("/proc/uptime") as f:
+        uptime = float(f.read().split()[0])
+    return {
+        "load": load,
+        "cpus": os.cpu_count(),
+        "memory": {"used": meminfo["MemTotal"] - meminfo.get("MemAvailable", 0), "total": meminfo["MemTotal"]},
+        "disks": disks,
+        "gpus": read_gpus(),
+        "uptime": uptime,
+    }
+
+
+OPS = {
+    "ping": op_ping,
+    "exec": op_exec,
+    "put": op_put,
+    "stat": op_stat,
+    "get": op_get,
+    "metrics": op_metrics,
+}
+
+
+def serve(instream, outstream):
+    write_lock = threading.Lock()
+
+    def send(message):
+        line = json.dumps(message) + "\n"
+        with write_lock:
+            outstream.write(line)
+            outstream.flush()
+
+    def handle(request):
+        handler = OPS.get(request.get("op"))
+        try:
+            if handler is None:
+                raise ValueError(f"unknown op {request.get('op')!r}")
+            send({"id": request.get("id"), "ok": True, "result": handler(request)})
+        except Exception as e:
+            send({"id": request.get("id"), "ok": False, "error": f"{type(e).__name__}: {e}"})
+
+    send({"agent": "arena", "version": PROTOCOL_VERSION, "pid": os.getpid()})
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for line in instream:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                send({"id": None, "ok": False, "error": f"invalid request: {e}"})
+                continue
+            executor.submit(handle, request)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="ARENA pod agent (JSON lines over stdin/stdout)")
+    parser.add_argument("--stdio", action="store_true", help="Serve requests on stdin/stdout (used over ssh)")
+    args = parser.parse_args()
+    if not args.stdio:
+        parser.error("only --stdio is supported")
+    serve(sys.stdin, sys.stdout)
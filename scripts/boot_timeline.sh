@@ -0,0 +1,48 @@
+#!/bin/bash
+# Container entrypoint: records when each boot phase is reached, then runs
+# RunPod's /start.sh. The timeline (one "<phase> <unix time>" line per phase)
+# is collected from all pods by management/boot_timeline.py.
+#
+#   container_start    this script starts (everything before is image pull/container create)
+#   ssh_key_injected   /start.sh has written PUBLIC_KEY to authorized_keys
+#   sshd_listening     sshd accepts connections on port 22
+#   jupyter_listening  Jupyter accepts connections on port 8888
+#   first_ssh_login    the first ssh login shows the motd (scripts/motd.sh)
+#   first_shell        the first zsh has finished loading .zshrc
+BOOT_LOG="/root/.arena_infra/boot_timeline.log"
+WATCH_SECONDS=1800
+
+mark() {
+  echo "$1 $(date +%s.%N)" >> "$BOOT_LOG"
+}
+
+# Port in LISTEN state (0A) in /proc/net/tcp{,6}; ss/netstat may not be there yet
+listening() {
+  grep -qs ":$(printf '%04X' "$1") [0-9A-F]*:[0-9A-F]* 0A" /proc/net/tcp /proc/net/tcp6
+}
+
+watch_phases() {
+  local key="${PUBLIC_KEY%%$'\n'*}"
+  local key_done="" sshd_done="" jupyter_done=""
+  [ -z "$key" ] && key_done=1
+  while [ "$SECONDS" -lt "$WATCH_SECONDS" ]; do
+    if [ -z "$key_done" ] && grep -qsF "$key" /root/.ssh/authorized_keys; then
+      mark ssh_key_injected; key_done=1
+    fi
+    if [ -z "$sshd_done" ] && listening 22; then
+      mark sshd_listening; sshd_done=1
+    fi
+    if [ -z "$jupyter_done" ] && listening 8888; then
+      mark jupyter_listening; jupyter_done=1
+    fi
+    [ -n "$key_done" ] && [ -n "$sshd_done" ] && [ -n "$jupyter_done" ] && return
+    sleep 0.2
+  done
+}
+
+# A new timeline for every boot
+mkdir -p "$(dirname "$BOOT_LOG")"
+: > "$BOOT_LOG"
+mark container_start
+watch_phases &
+exec /start.sh "$@"
@@ -6,17 +6,25 @@ ARENA_REPO="${1:-styme3279/ARENA_3.0}" # Default if no arg passed
 echo "--- Starting Main Environment Setup ---"
 echo "ARENA Repository: ${ARENA_REPO}"
 
+# Build through the proxy's pull-through cache if ARENA_CACHE_URL is given (see proxy/pull_cache.py)
+if [ -f /usr/local/bin/pull_cache_env.sh ]; then
+    # shellcheck disable=SC1091
+    source /usr/local/bin/pull_cache_env.sh
+    [ -n "${ARENA_CACHE_URL}" ] && echo "Package cache: ${ARENA_CACHE_URL}"
+fi
+MINICONDA_BASE_URL="${ARENA_CACHE_URL:+${ARENA_CACHE_URL}/anaconda}"
+
 # --- System Package Installation (Non-Zsh specific) ---
 echo "Updating and installing system packages..."
 apt-get update -y
 apt-get install -y --no-install-recommends \
     ncdu vim nano htop net-tools iputils-ping tree ffmpeg sudo fzf nvtop \
-    figlet curl wget git ca-certificates btop \
+    figlet curl wget git ca-certificates btop zstd pigz \
     build-essential # For potential pip packages that need compilation
 
 # --- Miniconda Setup ---
 echo "Installing Miniconda..."
-wget --quiet https://repo.anaconda.com/miniconda/Miniconda3-latest-Linux-x86_64.sh -O /tmp/miniconda.sh
+wget --quiet "${MINICONDA_BASE_URL:-https://repo.anaconda.com}/miniconda/Miniconda3-latest-Linux-x86_64.sh" -O /tmp/miniconda.sh
 bash /tmp/miniconda.sh -b -p /opt/conda
 rm /tmp/miniconda.sh
 export PATH="/opt/conda/bin:$PATH" # Add conda to PATH for this script
@@ -0,0 +1,20 @@
+# Appended to ~/.jupyter/jupyter_server_config.py by the Dockerfile.
+#
+# When the proxy routes Jupyter by path (JUPYTER_PROXY="path", see proxy/nginx_pods.py),
+# create_new_pods.py sets ARENA_JUPYTER_PROXY=path and Jupyter must serve under /<machine>/.
+# The machine is read from /root/.name, which standby_pool.py rewrites when it swaps a pod
+# onto a machine, falling back to the MACHINE_NAME the pod was created with.
+import os as _os
+import re as _re
+
+if _os.environ.get("ARENA_JUPYTER_PROXY") == "path":
+    _machine = _os.environ.get("MACHINE_NAME", "")
+    try:
+        with open("/root/.name") as _f:
+            _match = _re.search(r"MACHINE_NAME='([^']*)'", _f.read())
+        if _match:
+            _machine = _match.group(1)
+    except OSError:
+        pass
+    if _machine:
+        c.ServerApp.base_url = f"/{_machine}/"  # noqa: F821 (c is provided by Jupyter)
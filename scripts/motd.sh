@@ -13,6 +13,11 @@ echo '    echo "";' >> $filename
 echo 'fi' >> $filename
 echo "echo 'You are on ARENA machine $MACHINE_NAME';" >> $filename
 echo 'echo "";' >> $filename
+# Boot timeline (scripts/boot_timeline.sh): when the first ssh login came in
+echo 'BOOT_LOG=/root/.arena_infra/boot_timeline.log' >> $filename
+echo 'if [ -w "$BOOT_LOG" ] && ! grep -q "^first_ssh_login " "$BOOT_LOG"; then' >> $filename
+echo '    echo "first_ssh_login $(date +%s.%N)" >> "$BOOT_LOG"' >> $filename
+echo 'fi' >> $filename
 
 chmod +x $filename
 
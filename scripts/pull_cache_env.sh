@@ -0,0 +1,27 @@
+#!/bin/bash
+# Point pip, conda and the Hugging Face hub at the pull-through cache on the
+# proxy (proxy/pull_cache.py), if ARENA_CACHE_URL is set, e.g.
+# "http://swirl.work:3142". Sourced by .zshrc and docker_setup.sh.
+
+# Pods get ARENA_CACHE_URL from create_new_pods.py, but ssh sessions only see
+# the pod's environment through the file RunPod's /start.sh writes
+if [[ -z "$ARENA_CACHE_URL" && -r /etc/rp_environment ]]; then
+  ARENA_CACHE_URL="$(sed -n 's/^export ARENA_CACHE_URL=["'\'']\{0,1\}\([^"'\'']*\).*$/\1/p' /etc/rp_environment)"
+fi
+
+if [[ -n "$ARENA_CACHE_URL" ]]; then
+  export ARENA_CACHE_URL="${ARENA_CACHE_URL%/}"
+  _arena_cache_host="${ARENA_CACHE_URL#*://}"
+  _arena_cache_host="${_arena_cache_host%%[:/]*}"
+
+  export PIP_INDEX_URL="$ARENA_CACHE_URL/pypi/simple/"
+  export PIP_TRUSTED_HOST="$_arena_cache_host" # the cache is plain http
+  export CONDA_CHANNEL_ALIAS="$ARENA_CACHE_URL/conda"
+  export CONDA_DEFAULT_CHANNELS="$ARENA_CACHE_URL/anaconda/pkgs/main,$ARENA_CACHE_URL/anaconda/pkgs/r"
+  export HF_ENDPOINT="$ARENA_CACHE_URL/hf"
+  # Xet downloads talk to the CDN directly instead of following the hub's redirects through the cache
+  export HF_HUB_DISABLE_XET=1
+  # A pod may wait for another pod's download of the same file to reach it
+  export HF_HUB_DOWNLOAD_TIMEOUT=60
+  unset _arena_cache_host
+fi
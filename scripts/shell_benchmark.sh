@@ -0,0 +1,35 @@
+#!/bin/bash
+# Measure how long a new interactive zsh takes to start (what every VS Code or
+# Jupyter terminal pays), and optionally show where the time goes.
+#
+# Usage: shell_benchmark.sh [runs] [--profile]
+#   --profile  also print zsh's per-function profile of one startup (zprof)
+
+RUNS="${1:-20}"
+[[ "$RUNS" =~ ^[0-9]+$ ]] || RUNS=20
+
+times=()
+for ((i = 0; i < RUNS; i++)); do
+  start=$(date +%s%N)
+  zsh -i -c exit > /dev/null 2>&1
+  end=$(date +%s%N)
+  times+=($(( (end - start) / 1000000 )))
+done
+
+sorted=($(printf '%s\n' "${times[@]}" | sort -n))
+sum=0
+for t in "${sorted[@]}"; do sum=$((sum + t)); done
+p90_index=$(( (RUNS * 9 + 9) / 10 - 1 ))
+
+echo "zsh startup over ${RUNS} runs:"
+echo "  min    ${sorted[0]} ms"
+echo "  median ${sorted[$((RUNS / 2))]} ms"
+echo "  mean   $((sum / RUNS)) ms"
+echo "  p90    ${sorted[$p90_index]} ms"
+echo "  max    ${sorted[$((RUNS - 1))]} ms"
+
+if [[ " $* " == *" --profile "* ]]; then
+  echo ""
+  echo "Profile of one startup (slowest functions first):"
+  ARENA_ZPROF=1 zsh -i -c exit 2>/dev/null | head -25
+fi
@@ -0,0 +1,36 @@
+#!/bin/bash
+# Precompute what every new zsh would otherwise ask conda for, so shells start fast.
+# Run at image build time by zsh_setup.sh; re-run it after changing the conda setup.
+set -e
+
+CONDA="/opt/conda/bin/conda"
+CONDA_ENV_NAME="${1:-arena-env}"
+CACHE_DIR="$HOME/.cache/arena-shell"
+mkdir -p "$CACHE_DIR"
+
+# The conda shell functions (only loaded when `conda` is first used, see .zshrc).
+# Never auto-activate base here, it would undo the cached arena-env activation.
+CONDA_AUTO_ACTIVATE_BASE=false CONDA_AUTO_ACTIVATE=false \
+  "$CONDA" shell.zsh hook > "$CACHE_DIR/conda_hook.zsh"
+
+# The environment activation. PATH and PS1 are recomputed at login instead of
+# taking the build-time values, so PATH entries added by e.g. VS Code are kept.
+ENV_PREFIX="/opt/conda/envs/${CONDA_ENV_NAME}"
+{
+  echo "export PATH=\"${ENV_PREFIX}/bin:/opt/conda/condabin:\$PATH\""
+  CONDA_AUTO_ACTIVATE_BASE=false CONDA_AUTO_ACTIVATE=false \
+    "$CONDA" shell.zsh activate "$CONDA_ENV_NAME" | grep -v -e '^export PATH=' -e '^PS1='
+} > "$CACHE_DIR/conda_activate.zsh"
+
+# Start one shell so oh-my-zsh writes its completion dump now, not on first login
+zsh -i -c exit > /dev/null 2>&1 || true
+
+# Compile the startup files so zsh doesn't parse them on every start
+# (zsh uses <file>.zwc when it is newer than <file>; ~/.zshrc.zwc sits next to the symlink)
+for file in "$CACHE_DIR/conda_hook.zsh" "$CACHE_DIR/conda_activate.zsh" \
+            "$HOME/.zshrc" "$HOME/.p10k.zsh" "$HOME"/.zcompdump*; do
+  case "$file" in *.zwc) continue ;; esac
+  if [ -f "$file" ]; then zsh -c "zcompile '$file'"; fi
+done
+
+echo "Shell startup cache written to $CACHE_DIR"
@@ -25,6 +25,9 @@ ln -sf ~/.arena_infra/dotfiles/.zshrc ~/.zshrc
 ln -sf ~/.arena_infra/dotfiles/.vimrc ~/.vimrc
 ln -sf ~/.arena_infra/dotfiles/.p10k.zsh ~/.p10k.zsh
 
+# Cache the conda hook/activation and compile the startup files, so new shells start fast
+bash ~/.arena_infra/scripts/shell_cache.sh arena-env
+
 # Load machine name if present
 MACHINE_NAME="root"
 if [[ -r ~/.name ]]; then